@@ -0,0 +1,267 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 一度に IN 句で問い合わせるキーの数
+_LOOKUP_CHUNK = 500
+# 旧形式のCSVから取り込んだ結果のプロンプトのハッシュ (どのプロンプトの結果か分からないため固定の値にする)
+LEGACY_PROMPT_HASH = "legacy"
+
+class AICache:
+    """
+    Gemini の応答を (入力, プロンプトのハッシュ, モデル) をキーに保存する永続キャッシュ (SQLite)。
+    入力・プロンプト・モデルのいずれかが変わったものだけを再度問い合わせる。
+    キーごとに問い合わせるため全件を読み込まず、複数のスレッドから同時に読み書きできる。
+    最後に使った日時を記録し、古いものの削除 (evict) はその日時で判断する。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                input TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (input, prompt_hash, model)
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(ai_cache)")]
+        if "last_used_at" not in columns:
+            # 以前の形式のファイル (保存した日時だけを記録) は、保存した日時を最後に使った日時とみなす
+            self._conn.execute("ALTER TABLE ai_cache ADD COLUMN last_used_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE ai_cache SET last_used_at = created_at")
+        self._conn.execute("DROP INDEX IF EXISTS ai_cache_created_at")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ai_cache_last_used_at ON ai_cache (last_used_at)")
+        # 累計のヒット・ミス数と、取り込み済みのCSVの記録
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, input_text, prompt_hash, model):
+        """保存済みの出力 (JSONをデコードしたもの) を返す (なければ None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM ai_cache WHERE input = ? AND prompt_hash = ? AND model = ?",
+                (input_text, prompt_hash, model),
+            ).fetchone()
+            if row:
+                self.hits += 1
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE ai_cache SET last_used_at = ? WHERE input = ? AND prompt_hash = ? AND model = ?",
+                        (time.time(), input_text, prompt_hash, model),
+                    )
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def _select(self, inputs, prompt_hash, model):
+        """
+        入力 -> 保存済みの出力 の辞書を返し、見つかったものの最後に使った日時を更新する
+        (ロックを取った状態で呼ぶ)
+        """
+        results = {}
+        now = time.time()
+        with self._conn:
+            for i in range(0, len(inputs), _LOOKUP_CHUNK):
+                chunk = inputs[i:i + _LOOKUP_CHUNK]
+                placeholders = ", ".join("?" for _ in chunk)
+                where = f"prompt_hash = ? AND model = ? AND input IN ({placeholders})"
+                rows = self._conn.execute(
+                    f"SELECT input, output FROM ai_cache WHERE {where}", (prompt_hash, model, *chunk),
+                ).fetchall()
+                if rows:
+                    self._conn.execute(f"UPDATE ai_cache SET last_used_at = ? WHERE {where}",
+                                       (now, prompt_hash, model, *chunk))
+                results.update((input_text, json.loads(output)) for input_text, output in rows)
+        return results
+
+    def get_many(self, inputs, prompt_hash, model, fallback_hashes=()):
+        """
+        入力 -> 保存済みの出力 の辞書を返す (保存されていない入力は含めない)。
+        fallback_hashes を指定すると、prompt_hash で見つからない入力をそのプロンプトの結果から順に探し、
+        見つかったものは prompt_hash の結果として保存し直す (次回からは直接見つかる)
+        """
+        inputs = list(dict.fromkeys(inputs))
+        with self._lock:
+            results = self._select(inputs, prompt_hash, model)
+            carried = {}
+            for fallback_hash in fallback_hashes:
+                missing = [input_text for input_text in inputs if input_text not in results]
+                if not missing:
+                    break
+                found = self._select(missing, fallback_hash, model)
+                results.update(found)
+                carried.update(found)
+            self.hits += len(results)
+            self.misses += len(inputs) - len(results)
+        if carried:
+            self.put_many(carried, prompt_hash, model, replace=False)
+        return results
+
+    def put(self, input_text, prompt_hash, model, output):
+        self.put_many({input_text: output}, prompt_hash, model)
+
+    def put_many(self, outputs, prompt_hash, model, replace=True):
+        """入力 -> 出力 の辞書を1つのトランザクションで保存する (replace=False なら既存のものは残す)"""
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.executemany(
+                    f"{verb} INTO ai_cache (input, prompt_hash, model, output, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((input_text, prompt_hash, model, json.dumps(output, ensure_ascii=False), now, now)
+                     for input_text, output in outputs.items()),
+                )
+        return cursor.rowcount
+
+    def evict(self, max_age, prompt_hash=None, model=None):
+        """
+        最後に使ってから max_age 秒より経ったものを削除し、削除した件数を返す。
+        prompt_hash・model を指定すると、そのプロンプト・モデルのものだけを対象にする。
+        旧形式のCSVから取り込んだものを削除しても取り込みの記録は残るため、同じファイルを取り込み直すことはない
+        """
+        conditions, params = ["last_used_at < ?"], [time.time() - max_age]
+        for column, value in (("prompt_hash", prompt_hash), ("model", model)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(f"DELETE FROM ai_cache WHERE {' AND '.join(conditions)}", params)
+        return cursor.rowcount
+
+    def compact(self, max_age=None, min_free_ratio=0.25, prompt_hash=None, model=None):
+        """
+        max_age を指定すると古いもの (prompt_hash・model の指定は evict と同じ) を削除し、
+        空き領域が全体の min_free_ratio 以上になっていれば VACUUM でファイルを詰める。
+        WAL ファイルも切り詰める。削除した件数を返す
+        """
+        removed = self.evict(max_age, prompt_hash, model) if max_age else 0
+        with self._lock:
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            free_count = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if page_count and free_count / page_count >= min_free_ratio:
+                self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def import_csv(self, csv_path, prompt_hash, model):
+        """
+        旧形式のCSV (元のテキスト, 修正後のテキスト) を取り込み、追加した件数を返す。
+        同じ内容のファイルは再度取り込まず、既に保存されているキーは上書きしない
+        """
+        stat = os.stat(csv_path)
+        marker_key = f"imported:{os.path.abspath(csv_path)}:{prompt_hash}:{model}"
+        marker = f"{stat.st_size}:{stat.st_mtime_ns}"
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (marker_key,)).fetchone()
+        if row and row[0] == marker:
+            return 0
+        with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+            outputs = {row[0]: row[1] for row in csv.reader(f) if len(row) >= 2}
+        added = self.put_many(outputs, prompt_hash, model, replace=False)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (marker_key, marker))
+        return added
+
+    def export_csv(self, csv_path, prompt_hash, model):
+        """指定したプロンプト・モデルの出力を旧形式のCSV (入力, 出力) に書き出し、件数を返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT input, output FROM ai_cache WHERE prompt_hash = ? AND model = ? ORDER BY created_at, input",
+                (prompt_hash, model),
+            ).fetchall()
+        with open(csv_path, mode='w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            for input_text, output in rows:
+                output = json.loads(output)
+                writer.writerow([input_text, output if isinstance(output, str) else json.dumps(output, ensure_ascii=False)])
+        return len(rows)
+
+    def stats(self):
+        """件数・ファイルサイズと、今回および累計のヒット・ミス数を返す"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+            groups = self._conn.execute(
+                "SELECT prompt_hash, model, COUNT(*) FROM ai_cache GROUP BY prompt_hash, model"
+            ).fetchall()
+            totals = dict(self._conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('hits', 'misses')"
+            ).fetchall())
+        size = sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+        return {
+            "entries": entries,
+            "groups": groups,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": int(totals.get("hits", 0)) + self.hits,
+            "total_misses": int(totals.get("misses", 0)) + self.misses,
+        }
+
+    def print_stats(self, label="AIキャッシュ"):
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        rate = stats["hits"] / lookups * 100 if lookups else 0.0
+        print(f"{label}: ヒット {stats['hits']}件 / ミス {stats['misses']}件 (ヒット率 {rate:.1f}%), "
+              f"保存 {stats['entries']}件 ({stats['size'] / 1024:.0f} KB)")
+
+    def close(self):
+        with self._lock:
+            # 今回のヒット・ミス数を累計に加える
+            with self._conn:
+                for key, count in (("hits", self.hits), ("misses", self.misses)):
+                    self._conn.execute(
+                        "INSERT INTO meta VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                        (key, str(count), count),
+                    )
+            self.hits = self.misses = 0
+            self._conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini の応答キャッシュの確認と整理")
+    parser.add_argument("path", nargs="?", default="resource/ai_cache.sqlite")
+    parser.add_argument("--max-age-days", type=float, default=None, help="最後に使ってからこの日数より経ったものを削除する")
+    parser.add_argument("--prompt-hash", default=None, help="削除の対象をこのプロンプトのハッシュのものに限る")
+    parser.add_argument("--model", default=None, help="削除の対象をこのモデルのものに限る")
+    parser.add_argument("--compact", action="store_true", help="古いものの削除後にファイルを詰める")
+    args = parser.parse_args()
+
+    cache = AICache(args.path)
+    try:
+        if args.compact or args.max_age_days:
+            max_age = args.max_age_days * 24 * 60 * 60 if args.max_age_days else None
+            if args.compact:
+                removed = cache.compact(max_age, prompt_hash=args.prompt_hash, model=args.model)
+            else:
+                removed = cache.evict(max_age, args.prompt_hash, args.model)
+            print(f"削除: {removed}件")
+        stats = cache.stats()
+        print(f"保存: {stats['entries']}件 ({stats['size'] / 1024:.0f} KB), "
+              f"累計ヒット {stats['total_hits']}件 / ミス {stats['total_misses']}件")
+        for prompt_hash, model, count in stats["groups"]:
+            print(f"  {model} prompt={prompt_hash}: {count}件")
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
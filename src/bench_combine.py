@@ -0,0 +1,89 @@
+import os
+import re
+import sys
+import tempfile
+import time
+import inflect
+import pandas as pd
+import yaml
+
+import combine_glossary
+import glossary_io
+from combine_glossary import generate_variations
+
+def legacy_variations(combined_df):
+    """旧実装: iterrows で1行ずつ複数形とタグ・カテゴリ除去版を作る"""
+    p = inflect.engine()
+    new_rows = []
+    for index, row in combined_df.iterrows():
+        en_term = str(row['en']).strip()
+        ja_term = str(row['ja']).strip()
+
+        if en_term and len(en_term.split()) <= 4:
+            try:
+                plural_en = p.plural(en_term)
+                if plural_en and plural_en != en_term:
+                    new_rows.append({'en': plural_en, 'ja': ja_term})
+            except Exception:
+                pass
+
+        cleaned_en = re.sub(r'^\[.*?\]\s*', '', en_term)
+        cleaned_ja = re.sub(r'^\[.*?\]\s*', '', ja_term)
+        cleaned_en = re.sub(r'^.+?[:：]\s*', '', cleaned_en)
+        cleaned_ja = re.sub(r'^.+?[:：]\s*', '', cleaned_ja)
+
+        if (cleaned_en != en_term or cleaned_ja != ja_term):
+            if len(cleaned_en) > 1 and len(cleaned_ja) > 0:
+                new_rows.append({'en': cleaned_en, 'ja': cleaned_ja})
+    return pd.DataFrame(new_rows)
+
+def load_sources():
+    with open("resource/data.yml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    frames = []
+    for key in ("scraping_output", "xml_output", "detail_output", "additional_glossary"):
+        path = config.get(key)
+        if path and os.path.exists(path):
+            frames.append(glossary_io.read_glossary(path))
+    return pd.concat(frames, ignore_index=True)
+
+def scale(df, factor):
+    """用語集を factor 倍にする (2つ目以降のコピーは語を変えて、キャッシュが効かないようにする)"""
+    copies = [df]
+    for k in range(1, factor):
+        copy = df.copy()
+        copy['en'] = copy['en'].astype(str) + f" v{k}"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+def timed(func, df):
+    t0 = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - t0, result
+
+def to_csv(df):
+    return df.to_csv(index=False)
+
+def main():
+    factors = [int(arg) for arg in sys.argv[1:]] or [1, 10]
+    base = load_sources()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 実際の複数形キャッシュは使わず、初回 (キャッシュなし) と2回目 (キャッシュあり) を計測する
+        combine_glossary.PLURAL_CACHE_FILE = os.path.join(tmp, "plural_cache.json")
+        for factor in factors:
+            df = scale(base, factor)
+            print(f"\n[{factor}倍] {len(df)}行")
+            legacy_time, legacy = timed(legacy_variations, df)
+            print(f"  旧実装 (iterrows)        : {legacy_time:7.2f}s")
+            if os.path.exists(combine_glossary.PLURAL_CACHE_FILE):
+                os.remove(combine_glossary.PLURAL_CACHE_FILE)
+            cold_time, cold = timed(generate_variations, df)
+            print(f"  新実装 (キャッシュなし)  : {cold_time:7.2f}s  x{legacy_time / cold_time:5.1f}")
+            warm_time, warm = timed(generate_variations, df)
+            print(f"  新実装 (キャッシュあり)  : {warm_time:7.2f}s  x{legacy_time / warm_time:5.1f}")
+            same = to_csv(legacy) == to_csv(cold) == to_csv(warm)
+            print(f"  出力の一致: {'OK' if same else 'NG'} ({len(legacy)}行)")
+
+if __name__ == "__main__":
+    main()
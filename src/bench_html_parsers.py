@@ -0,0 +1,100 @@
+import glob
+import os
+import sqlite3
+import sys
+import time
+import yaml
+from bs4 import BeautifulSoup
+
+from html_parsers import ALLPAGES_CHUNK_CLASS, LANGUAGE_TABLE_CLASS, available_backends, \
+    extract_allpages, extract_language_rows
+
+REPEAT = 3
+
+def load_fixtures(path):
+    """保存済みページを読み込む (.html を含むディレクトリ、または http_cache のSQLite)"""
+    if os.path.isdir(path):
+        pages = []
+        for file in sorted(glob.glob(os.path.join(path, "*.html"))):
+            with open(file, "r", encoding="utf-8") as f:
+                pages.append(f.read())
+        return pages
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT body, encoding FROM responses ORDER BY url").fetchall()
+    finally:
+        conn.close()
+    return [body.decode(encoding or "utf-8", errors="replace") for body, encoding in rows]
+
+def baseline_language_rows(html):
+    """旧実装: ページ全体を html.parser で木にしてからテーブルを探す"""
+    soup = BeautifulSoup(html, "html.parser")
+    rows = []
+    for table in soup.find_all("table", class_=LANGUAGE_TABLE_CLASS):
+        table_rows = []
+        for row in table.find_all("tr"):
+            cols = row.find_all(["th", "td"])
+            if len(cols) >= 2:
+                table_rows.append((cols[0].get_text(strip=True), cols[1].get_text(strip=True)))
+        rows.append(table_rows)
+    return rows
+
+def baseline_allpages(html):
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = []
+    chunk_ul = soup.find("ul", class_=ALLPAGES_CHUNK_CLASS)
+    if chunk_ul:
+        hrefs = [link.get("href") for link in chunk_ul.find_all("a") if link.get("href")]
+    next_link = soup.find("a", string=lambda text: text and "Next page" in text)
+    return hrefs, next_link.get("href") if next_link else None
+
+def measure(func, pages):
+    """best of REPEAT の合計時間と結果を返す"""
+    best = None
+    results = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        results = [func(html) for html in pages]
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def report(label, pages, baseline, candidates):
+    if not pages:
+        return
+    print(f"\n[{label}] {len(pages)}ページ (best of {REPEAT})")
+    base_time, base_results = measure(baseline, pages)
+    print(f"  {'旧実装 (html.parser 全体)':<28}: {base_time * 1000 / len(pages):8.3f} ms/page")
+    for name, func in candidates:
+        elapsed, results = measure(func, pages)
+        mismatches = sum(1 for a, b in zip(base_results, results) if a != b)
+        print(f"  {name:<28}: {elapsed * 1000 / len(pages):8.3f} ms/page  "
+              f"x{base_time / elapsed:5.1f}  (不一致 {mismatches}件)")
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        with open("resource/data.yml", "r") as f:
+            config = yaml.safe_load(f)
+        path = config.get("http_cache")
+
+    if not path or not os.path.exists(path):
+        print(f"エラー: ページのフィクスチャが見つかりません: {path}")
+        print("使い方: python src/bench_html_parsers.py [HTMLディレクトリ または http_cache のパス]")
+        return
+
+    pages = load_fixtures(path)
+    listing = [html for html in pages if ALLPAGES_CHUNK_CLASS in html]
+    articles = [html for html in pages if ALLPAGES_CHUNK_CLASS not in html and "<html" in html[:1000].lower()]
+    backends = available_backends()
+    print(f"利用可能なバックエンド: {', '.join(backends)}")
+
+    report("記事ページ (言語表)", articles, baseline_language_rows,
+           [(name, lambda html, name=name: extract_language_rows(html, name)) for name in backends])
+    report("AllPages", listing, baseline_allpages,
+           [(name, lambda html, name=name: extract_allpages(html, name)) for name in backends])
+
+if __name__ == "__main__":
+    main()
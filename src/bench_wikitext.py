@@ -0,0 +1,117 @@
+import os
+import re
+import sys
+import time
+import yaml
+
+from get_data_xml import open_dump, iter_pages, find_templates, clean_wikitext
+
+# ページ本文のサンプル数 (引数で変更可)
+DEFAULT_SAMPLE_PAGES = 2000
+REPEAT = 5
+
+def legacy_get_template_content(text, template_name):
+    """旧実装: 1文字ずつ走査して {{ }} のバランスを数える"""
+    pattern = re.compile(r'\{\{\s*' + re.escape(template_name) + r'\s*[|}]', re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return None
+
+    start_pos = match.start()
+    balance = 0
+    i = start_pos
+    length = len(text)
+
+    while i < length:
+        if text[i:i+2] == '{{':
+            balance += 1
+            i += 2
+            continue
+        elif text[i:i+2] == '}}':
+            balance -= 1
+            i += 2
+            if balance == 0:
+                return text[start_pos:i]
+            continue
+        i += 1
+    return None
+
+def legacy_parse_template_params(template_text):
+    """旧実装: | で単純に分割する"""
+    content = template_text[2:-2]
+    params = {}
+    for part in content.split('|'):
+        if '=' in part:
+            key, val = part.split('=', 1)
+            params[key.strip()] = val.strip()
+    return params
+
+def run_legacy(bodies):
+    found = 0
+    for text in bodies:
+        template = legacy_get_template_content(text, "Other Languages")
+        if template:
+            params = legacy_parse_template_params(template)
+            if params.get('ja'):
+                found += 1
+    return found
+
+def run_tokenizer(bodies):
+    found = 0
+    for text in bodies:
+        template = find_templates(text, ["Other Languages"]).get("Other Languages")
+        if template and template.params.get('ja'):
+            found += 1
+    return found
+
+def best_of(func, bodies):
+    best = None
+    result = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = func(bodies)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    sample_pages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SAMPLE_PAGES
+
+    with open("resource/data.yml", "r") as f:
+        config = yaml.safe_load(f)
+    xml_file = config.get("xml_file")
+    if not xml_file or not os.path.exists(xml_file):
+        print(f"エラー: XMLファイルが見つかりません: {xml_file}")
+        return
+
+    bodies = []
+    with open_dump(xml_file) as f:
+        for page in iter_pages(f):
+            bodies.append(page['text'])
+            if len(bodies) >= sample_pages:
+                break
+
+    total_chars = sum(len(t) for t in bodies)
+    print(f"サンプル: {len(bodies)}ページ / {total_chars:,}文字 (best of {REPEAT})")
+
+    legacy_time, legacy_found = best_of(run_legacy, bodies)
+    tokenizer_time, tokenizer_found = best_of(run_tokenizer, bodies)
+
+    per_page = 1e6 / max(len(bodies), 1)
+    print(f"旧実装 (1文字走査 + split): {legacy_time * per_page:8.1f} µs/page  (ja検出 {legacy_found}件)")
+    print(f"トークナイザ            : {tokenizer_time * per_page:8.1f} µs/page  (ja検出 {tokenizer_found}件)")
+    print(f"速度比: x{legacy_time / tokenizer_time:.2f}")
+
+    # パラメータ分割の違いで結果が変わったページ数を参考として表示する
+    changed = 0
+    for text in bodies:
+        old = legacy_get_template_content(text, "Other Languages")
+        new = find_templates(text, ["Other Languages"]).get("Other Languages")
+        old_ja = clean_wikitext(legacy_parse_template_params(old).get('ja')) if old else ""
+        new_ja = clean_wikitext(new.params.get('ja')) if new else ""
+        if old_ja != new_ja:
+            changed += 1
+    print(f"ja の抽出結果が変化したページ: {changed}件")
+
+if __name__ == "__main__":
+    main()
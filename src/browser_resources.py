@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+# 抽出するテキストに影響しないため読み込まないリソースの種類
+DEFAULT_BLOCK_TYPES = ["image", "font", "media"]
+# 読み込みを許可するホスト (サブドメインを含む)。これ以外のサードパーティ (解析・広告など) は遮断する
+DEFAULT_ALLOWED_HOSTS = ["hoyolab.com", "hoyoverse.com"]
+# ディスクにキャッシュして再利用するリソースの種類 (JSバンドル・CSS)
+CACHEABLE_TYPES = {"script", "stylesheet"}
+# キャッシュから返す際に除くヘッダー (本文は展開済みで保存しているため)
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+class AssetCache:
+    """
+    JSバンドルなどの静的リソースを保存する永続キャッシュ (SQLite)。
+    Playwright はリクエストのルーティングを有効にするとブラウザのHTTPキャッシュを使わなくなるため、
+    ルーティングの中で自前でキャッシュする。max_age を過ぎたものは再取得する。
+    """
+
+    def __init__(self, path, max_age):
+        self.max_age = max_age
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS assets (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url):
+        """有効期限内のエントリを (status, headers, body) で返す (なければ None)"""
+        row = self._conn.execute(
+            "SELECT status, headers, body FROM assets WHERE url = ? AND fetched_at >= ?",
+            (url, time.time() - self.max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body = row
+        return status, json.loads(headers), body
+
+    def put(self, url, status, headers, body):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?)",
+            (url, status, json.dumps(headers), body, time.time()),
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+def _host_allowed(url, allowed_hosts):
+    host = urlsplit(url).hostname or ""
+    return any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts)
+
+class ResourceBlocker:
+    """
+    ブラウザコンテキストのリクエストを振り分ける。
+    不要な種類のリソースと許可リスト外のホストへのリクエストは遮断し、
+    JS/CSS は AssetCache から返す (なければ取得して保存する)。転送量と件数を集計する。
+    """
+
+    def __init__(self, block_types=None, allowed_hosts=None, cache=None):
+        # allowed_hosts を空リストにするとホストによる遮断を行わない
+        self.block_types = set(DEFAULT_BLOCK_TYPES if block_types is None else block_types)
+        self.allowed_hosts = list(DEFAULT_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts)
+        self.cache = cache
+        self.stats = {"requests": 0, "blocked_type": 0, "blocked_host": 0, "cache_hits": 0,
+                      "fetch_errors": 0, "downloaded_bytes": 0, "cached_bytes": 0}
+        # ルーティング内で処理し、転送量を集計済みのリクエスト
+        self._handled = set()
+
+    async def install(self, context):
+        """コンテキストにルーティングと転送量の集計を設定する"""
+        # 遮断もキャッシュもしない場合はルーティングせず、ブラウザのHTTPキャッシュに任せる
+        if self.block_types or self.allowed_hosts or self.cache:
+            await context.route("**/*", self._handle)
+        context.on("request", self._on_request)
+        context.on("requestfinished", self._on_finished)
+
+    def _block_reason(self, request):
+        if request.resource_type in self.block_types:
+            return "blocked_type"
+        if self.allowed_hosts and request.url.startswith(("http://", "https://")) \
+                and not _host_allowed(request.url, self.allowed_hosts):
+            return "blocked_host"
+        return None
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self._block_reason(request)
+        if reason:
+            self.stats[reason] += 1
+            await route.abort("blockedbyclient")
+            return
+
+        if self.cache is None or request.method != "GET" or request.resource_type not in CACHEABLE_TYPES:
+            await route.continue_()
+            return
+
+        entry = self.cache.get(request.url)
+        if entry:
+            status, headers, body = entry
+            self.stats["cache_hits"] += 1
+            self.stats["cached_bytes"] += len(body)
+        else:
+            try:
+                response = await route.fetch()
+                status = response.status
+                headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+                body = await response.body()
+            except Exception:
+                # 通信の失敗やコンテキストの終了でルートを未処理のまま残すと、ページが読み込みのタイムアウトまで待つ
+                self.stats["fetch_errors"] += 1
+                await self._fall_back(route)
+                return
+            self.stats["downloaded_bytes"] += len(body)
+            if status == 200:
+                self.cache.put(request.url, status, headers, body)
+        self._handled.add(request)
+        await route.fulfill(status=status, headers=headers, body=body)
+
+    @staticmethod
+    async def _fall_back(route):
+        """キャッシュを通さずにブラウザに取得させ、それもできなければリクエストを中止する"""
+        try:
+            await route.continue_()
+        except Exception:
+            try:
+                await route.abort()
+            except Exception:
+                # コンテキストが閉じられている場合は処理するルートも残っていない
+                pass
+
+    def _on_request(self, request):
+        self.stats["requests"] += 1
+
+    async def _on_finished(self, request):
+        if request in self._handled:
+            self._handled.discard(request)
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.stats["downloaded_bytes"] += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+
+    def close(self):
+        if self.cache:
+            self.cache.close()
+
+    def print_stats(self):
+        s = self.stats
+        print(f"リソース: リクエスト {s['requests']}件 / 種類で遮断 {s['blocked_type']}件 / "
+              f"ホストで遮断 {s['blocked_host']}件 / キャッシュ利用 {s['cache_hits']}件 / 取得エラー {s['fetch_errors']}件")
+        print(f"転送量: 受信 {s['downloaded_bytes'] / 1024 / 1024:.1f}MB / "
+              f"キャッシュから {s['cached_bytes'] / 1024 / 1024:.1f}MB")
+
+def create_blocker(config, enabled=True):
+    """
+    data.yml の設定から ResourceBlocker を作成する (detail_asset_cache を空にするとキャッシュしない)
+    enabled=False の場合は遮断・キャッシュを行わず、比較用に転送量だけを集計する
+    """
+    if not enabled:
+        return ResourceBlocker(block_types=[], allowed_hosts=[])
+    cache = None
+    cache_path = config.get("detail_asset_cache", "./resource/browser_cache.sqlite")
+    if cache_path:
+        cache = AssetCache(cache_path, config.get("detail_asset_cache_days", 7) * 24 * 60 * 60)
+    return ResourceBlocker(
+        block_types=config.get("detail_block_types"),
+        allowed_hosts=config.get("detail_allowed_hosts"),
+        cache=cache,
+    )
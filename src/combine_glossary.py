@@ -1,51 +1,80 @@
+import argparse
+import hashlib
 import pandas as pd
 import yaml
 import os
-import re
-import inflect
-import time
-import csv
+import json
 import google.generativeai as genai
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from importlib.metadata import version
 from tqdm import tqdm
 
-# キャッシュファイルのパス
+import gemini_client
+import glossary_io
+from ai_cache import LEGACY_PROMPT_HASH, AICache
+from glossary_resolution import DEFAULT_PRIORITY, MANUAL_SOURCE, resolve_conflicts
+from gemini_client import call_with_backoff, estimate_tokens, is_quota_error, is_transient_error, parse_json_response
+from rate_limit import QuotaLimiter
+
+# 旧形式のキャッシュファイルのパス (AIクリーニングの結果は ai_cache の SQLite に保存し、このCSVは取り込み・書き出しに使う)
 CACHE_FILE = "resource/ai_cleaning_cache.csv"
+# AIクリーニングに使うモデル
+CLEANING_MODEL = "gemini-2.5-flash"
+# 現在のプロンプトの結果がない場合に引き継ぐ、出力が互換のプロンプトのハッシュ (先にあるものを優先する)。
+# 旧形式のCSVの結果はIDを付けない以前のプロンプトによるものだが、クリーニングの規則は同じため引き継ぐ。
+# プロンプトの文言だけを変えた場合は以前のハッシュを加え、規則を変えた場合はすべて外して問い合わせ直す
+# (SQLite に残る以前のプロンプトの結果も、CSVから取り込んだ結果も同じ扱いになる)
+CLEANING_COMPATIBLE_PROMPTS = [LEGACY_PROMPT_HASH]
+# 結合した用語集と、前回からの差分 (追加・削除された en, ja の組)
+OUTPUT_FILE = "resource/zzz_glossary.csv"
+DELTA_FILE = "resource/zzz_glossary_delta.csv"
+# ソースファイル・行ごとの内容のハッシュと、行ごとのクリーニング・バリエーション生成の結果
+MANIFEST_FILE = "resource/combine_manifest.json"
+MANIFEST_VERSION = 2
+# 同じ英語に対して選ばれなかった訳の一覧
+CONFLICT_FILE = "resource/glossary_conflicts.csv"
+# data.yml のキー -> ソース名 (結合する順)。ソース名は source_priority での指定に使う
+SOURCE_KEYS = {"scraping_output": "scraping", "xml_output": "xml", "detail_output": "detail",
+               "additional_glossary": MANUAL_SOURCE}
+# 複数形のキャッシュ (inflect のバージョンが変わると作り直す)
+PLURAL_CACHE_FILE = "resource/plural_cache.json"
+# キャッシュにない語がこの数以上あれば、複数プロセスで複数形を求める
+PLURAL_POOL_THRESHOLD = 2000
+
+# 日本語 (ひらがな・カタカナ・漢字) と英字
+JP_CHAR_PATTERN = r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]'
+EN_CHAR_PATTERN = r'[a-zA-Z]'
+# [Tag] 形式の接頭辞と、Category: 形式 (コロン区切り) の接頭辞
+TAG_PREFIX_PATTERN = r'^\[.*?\]\s*'
+CATEGORY_PREFIX_PATTERN = r'^.+?[:：]\s*'
 
-def load_cache():
-    """キャッシュファイルを読み込み、辞書として返す"""
-    cache = {}
+def open_cleaning_cache(config):
+    """
+    AIクリーニング結果のキャッシュ (SQLite) を開く。
+    ai_cache_max_age_days を指定した場合だけ、長く使っていない結果を削除する (既定では削除しない)。
+    旧形式のCSV (CACHE_FILE) があれば、プロンプトのハッシュを LEGACY_PROMPT_HASH として取り込む
+    (同じ内容なら読み直さない。現在のプロンプトで使うかは CLEANING_COMPATIBLE_PROMPTS で決まる)
+    """
+    cache = AICache(config.get("ai_cache", "./resource/ai_cache.sqlite"))
+    max_age_days = config.get("ai_cache_max_age_days")
+    if max_age_days:
+        # 削除するのは現在のプロンプト・モデルの結果のうち、最後に使ってから max_age_days 日より経ったものだけ
+        # (他のスクリプトの結果や、引き継ぐ以前のプロンプトの結果は残す)
+        removed = cache.compact(max_age_days * 24 * 60 * 60, prompt_hash=cache.prompt_hash(CLEANING_PROMPT),
+                                model=CLEANING_MODEL)
+        if removed:
+            print(f"キャッシュから {max_age_days}日以上使っていない {removed}件を削除しました。")
     if os.path.exists(CACHE_FILE):
         try:
-            with open(CACHE_FILE, mode='r', encoding='utf-8', newline='') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if len(row) >= 2:
-                        cache[row[0]] = row[1]
-            print(f"キャッシュを読み込みました: {len(cache)}件")
+            imported = cache.import_csv(CACHE_FILE, LEGACY_PROMPT_HASH, CLEANING_MODEL)
+            if imported:
+                print(f"{CACHE_FILE} からキャッシュに {imported}件を取り込みました。")
         except Exception as e:
             print(f"キャッシュ読み込みエラー: {e}")
     return cache
 
-def save_to_cache(new_data):
-    """新しいクリーニング結果をキャッシュに追記する"""
-    if not new_data:
-        return
-    try:
-        # 追記モードで開く
-        with open(CACHE_FILE, mode='a', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            for original, cleaned in new_data.items():
-                writer.writerow([original, cleaned])
-        print(f"キャッシュに {len(new_data)} 件追記しました。")
-    except Exception as e:
-        print(f"キャッシュ保存エラー: {e}")
-
-def clean_text_with_ai(model, text_list):
-    """
-    Gemini APIを使ってリスト内のテキストを一括クリーニングする
-    """
-    prompt = """
-    以下のリストは「ゲーム用語の日本語訳」ですが、末尾に不要なローマ字読みや注釈、英語の重複が含まれているものがあります。
+CLEANING_PROMPT = """
+    以下のJSONは「ゲーム用語の日本語訳」のリストで、各要素に "id" が付いています。末尾に不要なローマ字読みや注釈、英語の重複が含まれているものがあります。
     これらを削除し、正しい日本語の名称のみに修正してください。
     
     ルール:
@@ -53,28 +82,384 @@ def clean_text_with_ai(model, text_list):
     2. 英語の重複（Chapter 1...）は削除する。
     3. 記号だけの注釈（[!][!]）は削除する。
     4. 正しい日本語タイトル（「マークII」「BGM、ON」など）は維持する。
-    5. 出力は修正後のテキストのみを、入力と同じ順序で改行区切りで出力すること。
-    6. 余計な説明は一切不要。
+    5. 結果は必ず JSON形式のリスト [{{ "id": 入力のid, "text": "修正後のテキスト" }}, ...] のみを出力すること。
+       修正の必要がない要素も、入力のテキストのまま必ず含めること。
+    6. 余計な説明やMarkdownのコードブロックは一切不要。
 
-    入力リスト:
+    入力リスト (JSON):
+    {input_json}
     """
-    
-    input_text = "\n".join(text_list)
+
+def clean_text_with_ai(model, text_list):
+    """
+    Gemini APIを使ってリスト内のテキストを一括クリーニングし、入力の位置 -> 修正後のテキスト の辞書を返す。
+    テキストには位置をIDとして付けて送り、応答はIDごとに確かめる (空・IDが不正な要素は含めない)。
+    APIのエラーや読めない応答で結果が得られなかった場合は None を返す
+    (レート制限・一時的なサーバーのエラーは呼び出し元で再試行するため送出する)
+    """
+    input_json = json.dumps([{"id": i, "text": text} for i, text in enumerate(text_list)],
+                            ensure_ascii=False, separators=(",", ":"))
     
     try:
-        response = model.generate_content(prompt + input_text)
-        cleaned_text = response.text.strip().split('\n')
-        
-        # 入力と出力の数が合わない場合の安全策
-        if len(cleaned_text) != len(text_list):
-            return text_list 
-            
-        return [t.strip() for t in cleaned_text]
+        response = model.generate_content(CLEANING_PROMPT.format(input_json=input_json),
+                                          generation_config={"response_mime_type": "application/json"})
+        data = parse_json_response(response.text)
     except Exception as e:
+        if is_quota_error(e) or is_transient_error(e):
+            raise
         print(f"API Error: {e}")
-        return text_list
+        return None
+
+    results = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        item_id, text = entry.get("id"), entry.get("text")
+        if isinstance(item_id, str) and item_id.isdigit():
+            item_id = int(item_id)
+        if isinstance(item_id, int) and 0 <= item_id < len(text_list) and isinstance(text, str) and text.strip():
+            results[item_id] = text.strip()
+    return results
+
+def clean_texts_with_ai(model, texts, workers=4, rpm=30, tpm=None, batch_size=50, retries=5, on_batch=None):
+    """
+    テキストを batch_size 件ずつ並列にクリーニングし、元のテキスト -> 修正後 の辞書を返す。
+    送信は毎分 rpm リクエスト・tpm トークンまでに抑え、レート制限のエラーでは速度を落として再試行する。
+    応答に含まれなかった要素だけを問い合わせ直し、1件も得られない場合は半分ずつに分けて1件になるまで続ける。
+    APIのエラーや読めない応答の場合は分割しても結果は変わらないため、そのバッチは諦める。
+    バッチが終わるたびにその結果で on_batch(辞書) を呼ぶので、中断しても終わったバッチの結果は残る。
+    最後まで失敗したテキストは結果に含めない (キャッシュされず、次回に再度問い合わせる)
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    limiter = QuotaLimiter(rpm, tpm, burst=workers)
+    prompt_tokens = estimate_tokens(CLEANING_PROMPT)
+
+    def request(batch):
+        # 出力は入力と同程度のトークン数になるとみなす
+        tokens = prompt_tokens + 2 * estimate_tokens("\n".join(batch))
+        try:
+            cleaned = call_with_backoff(lambda: clean_text_with_ai(model, batch), limiter, tokens, retries)
+        except Exception as e:
+            print(f"  AI Error (giving up): {e}")
+            return None
+        if cleaned is None:
+            return None
+        return {batch[i]: text for i, text in cleaned.items()}
+
+    def run(batch):
+        """バッチの結果の辞書と、使ったリクエスト数を返す"""
+        results = request(batch)
+        calls = 1
+        if results is None:
+            # 応答を得られなかったバッチは分割せずに諦める (次回の実行で再度問い合わせる)
+            return {}, calls
+        failed = [text for text in batch if text not in results]
+        if not failed or len(batch) == 1:
+            return results, calls
+        # 失敗した要素だけを問い合わせ直す。1件も得られなかった場合は半分ずつに分ける
+        if len(failed) < len(batch):
+            parts = [failed]
+        else:
+            half = (len(failed) + 1) // 2
+            parts = [failed[:half], failed[half:]]
+        for part in parts:
+            part_results, part_calls = run(part)
+            results.update(part_results)
+            calls += part_calls
+        return results, calls
+
+    results = {}
+    failed = 0
+    calls = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(run, batch): batch for batch in batches}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            batch, (batch_results, batch_calls) = futures[future], future.result()
+            failed += len(batch) - len(batch_results)
+            calls += batch_calls
+            results.update(batch_results)
+            if on_batch and batch_results:
+                on_batch(batch_results)
+    except KeyboardInterrupt:
+        print(f"\n中断しました。完了した {len(results)}件の結果は保存済みです。")
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    print(f"AIクリーニング: {calls}リクエストで {len(results)}/{len(texts)}件 "
+          f"(1件あたり {calls / max(len(results), 1):.3f}リクエスト)")
+    if failed:
+        print(f"失敗したテキスト: {failed}件 (次回の実行で再度問い合わせます)")
+    return results
+
+def mixed_jp_en_mask(series):
+    """日本語と英字の両方を含む文字列なら True となるマスクを返す (文字列以外は False)"""
+    text = series.astype(object)
+    text = text.where(text.map(lambda v: isinstance(v, str)))
+    has_jp = text.str.contains(JP_CHAR_PATTERN, regex=True, na=False)
+    has_en = text.str.contains(EN_CHAR_PATTERN, regex=True, na=False)
+    return (has_jp & has_en).astype(bool)
+
+def _as_str(series):
+    """
+    各値を str() した列を返す (欠損値は 'nan')。
+    Python の re / str と同じ結果にするため、pyarrow の文字列型ではなく object 型にする
+    (pyarrow の正規表現では \\s が全角・ノーブレークスペースに一致しない)
+    """
+    return series.astype(object).where(series.notna(), "nan").map(str).astype(object)
+
+def _plural_or_none(engine, term):
+    """複数形を返す (元の語と同じ、またはエラーの場合は None)"""
+    try:
+        plural = engine.plural(term)
+    except Exception:
+        # inflectでエラーが出ても無視して次へ進む
+        return None
+    return plural if plural and plural != term else None
+
+def _plural_chunk(terms):
+    # inflect は読み込みに数秒かかるため、キャッシュにない語がある場合だけ読み込む
+    import inflect
+    engine = inflect.engine()
+    return [_plural_or_none(engine, term) for term in terms]
+
+def load_plural_cache():
+    """複数形のキャッシュを読み込む (inflect のバージョンが異なる場合は空)"""
+    if os.path.exists(PLURAL_CACHE_FILE):
+        try:
+            with open(PLURAL_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("inflect") == version("inflect"):
+                return data.get("plurals", {})
+        except (OSError, ValueError) as e:
+            print(f"複数形キャッシュ読み込みエラー: {e}")
+    return {}
+
+def save_plural_cache(plurals):
+    tmp_path = PLURAL_CACHE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"inflect": version("inflect"), "plurals": plurals}, f, ensure_ascii=False)
+    os.replace(tmp_path, PLURAL_CACHE_FILE)
+
+def pluralize_terms(terms):
+    """
+    語 -> 複数形 (なければ None) の辞書を返す。
+    結果は実行をまたいでキャッシュし、キャッシュにない語が多い場合は複数プロセスで求める。
+    """
+    cache = load_plural_cache()
+    misses = [term for term in dict.fromkeys(terms) if term not in cache]
+    if misses:
+        if len(misses) >= PLURAL_POOL_THRESHOLD and (os.cpu_count() or 1) > 1:
+            workers = os.cpu_count()
+            size = -(-len(misses) // workers)
+            chunks = [misses[i:i + size] for i in range(0, len(misses), size)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = [plural for chunk in executor.map(_plural_chunk, chunks) for plural in chunk]
+        else:
+            results = _plural_chunk(misses)
+        cache.update(zip(misses, results))
+        save_plural_cache(cache)
+    return {term: cache[term] for term in terms}
+
+def generate_variations(df, keep_position=False):
+    """
+    各行から複数形 (英語のみ) と、タグ・カテゴリの接頭辞を除いたバリエーションの行を作る。
+    行ごとに「複数形 → 接頭辞除去」の順で並べた en, ja の DataFrame を返す。
+    keep_position=True なら、元の行の位置 (0始まり) を position 列に残す
+    """
+    en = _as_str(df['en']).str.strip()
+    ja = _as_str(df['ja']).str.strip()
+    position = pd.Series(range(len(df)), index=df.index)
+
+    # 1. 複数形の追加 (英語のみ)
+    # 空文字でない、かつ単語数が4以下の場合のみ処理
+    eligible = (en != "") & (en.str.split().str.len() <= 4)
+    plurals = pluralize_terms(en[eligible].unique().tolist())
+    plural_en = en.where(eligible).map({term: plural for term, plural in plurals.items() if plural})
+    has_plural = plural_en.notna()
+    plural_rows = pd.DataFrame({'en': plural_en[has_plural], 'ja': ja[has_plural],
+                                '_order': position[has_plural] * 2})
+
+    # 2. タグ・カテゴリ除去バージョンの追加
+    # 例: "Defensive Assist: Drifting Petalss" -> "Drifting Petalss"
+    # 例: "パリィ支援：花筏" -> "花筏"
+    cleaned_en = en.str.replace(TAG_PREFIX_PATTERN, '', regex=True).str.replace(CATEGORY_PREFIX_PATTERN, '', regex=True)
+    cleaned_ja = ja.str.replace(TAG_PREFIX_PATTERN, '', regex=True).str.replace(CATEGORY_PREFIX_PATTERN, '', regex=True)
+    stripped = ((cleaned_en != en) | (cleaned_ja != ja)) & (cleaned_en.str.len() > 1) & (cleaned_ja.str.len() > 0)
+    stripped_rows = pd.DataFrame({'en': cleaned_en[stripped], 'ja': cleaned_ja[stripped],
+                                  '_order': position[stripped] * 2 + 1})
+
+    variations = pd.concat([plural_rows, stripped_rows], ignore_index=True)
+    variations = variations.sort_values('_order', kind='stable')
+    if keep_position:
+        variations['position'] = variations['_order'] // 2
+    return variations.drop(columns='_order').reset_index(drop=True)
+
+def apply_ai_cleaning(df, config, api_key):
+    """
+    日本語と英語が混在する ja をAIでクリーニングした結果で置き換え (df を直接変更する)、
+    クリーニングできなかった行 (APIキーがない・失敗した) を True とするマスクを返す
+    """
+    target_mask = mixed_jp_en_mask(df['ja'])
+    if not api_key:
+        print("警告: GOOGLE_API_KEY が設定されていません。AIクリーニングをスキップします。")
+        return target_mask
 
-def combine_glossaries():
+    # キャッシュはテキストごとに引くため、全件は読み込まない
+    cache = open_cleaning_cache(config)
+    prompt_hash = cache.prompt_hash(CLEANING_PROMPT)
+    pending = pd.Series(False, index=df.index)
+
+    # 処理対象の抽出
+    target_indices = df.index[target_mask].tolist()
+    
+    if target_indices:
+        print(f"対象候補: {len(target_indices)}件 (日本語・英語混在)")
+        
+        indices_to_process = []
+        updates_from_cache = {}
+        cached = cache.get_many(df.loc[target_indices, 'ja'].tolist(), prompt_hash, CLEANING_MODEL,
+                                CLEANING_COMPATIBLE_PROMPTS)
+
+        # キャッシュにあるものは即適用、ないものはAPI処理リストへ
+        for idx in target_indices:
+            original_text = df.at[idx, 'ja']
+            if original_text in cached:
+                updates_from_cache[idx] = cached[original_text]
+            else:
+                indices_to_process.append(idx)
+        
+        # キャッシュ適用
+        if updates_from_cache:
+            print(f"キャッシュから {len(updates_from_cache)} 件を適用します。")
+            for idx, cleaned in updates_from_cache.items():
+                df.at[idx, 'ja'] = cleaned
+
+        # API処理が必要なものがある場合
+        if indices_to_process:
+            # 同じテキストは1度だけ問い合わせる
+            texts = list(dict.fromkeys(df.loc[indices_to_process, 'ja'].tolist()))
+            workers = config.get("gemini_workers", 4)
+            print(f"新たにAIクリーニングを実行します: {len(indices_to_process)}件 "
+                  f"(重複を除いて {len(texts)}件, 並列数 {workers})")
+            gemini_client.configure(api_key, config.get("gemini_endpoint"))
+            model = genai.GenerativeModel(CLEANING_MODEL)
+
+            # 結果はバッチが終わるたびにキャッシュに保存する
+            cleaned_texts = clean_texts_with_ai(
+                model, texts, workers=workers, rpm=config.get("gemini_rpm", 30),
+                tpm=config.get("gemini_tpm", 250000), batch_size=config.get("cleaning_batch_size", 50),
+                on_batch=lambda results: cache.put_many(results, prompt_hash, CLEANING_MODEL))
+            print(f"キャッシュに {len(cleaned_texts)} 件保存しました。")
+
+            for idx in indices_to_process:
+                original = df.at[idx, 'ja']
+                if original in cleaned_texts:
+                    df.at[idx, 'ja'] = cleaned_texts[original]
+                else:
+                    pending[idx] = True
+        else:
+            print("全ての対象データがキャッシュ済みのため、APIリクエストはスキップされました。")
+
+    else:
+        print("クリーニング対象が見つかりませんでした。")
+    cache.print_stats()
+    cache.close()
+    return pending
+
+def _cell(value):
+    """JSONに保存できる値 (欠損値は None)"""
+    return value if isinstance(value, str) else None
+
+def row_hash(en, ja):
+    data = json.dumps([_cell(en), _cell(ja)], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:20]
+
+def manifest_settings():
+    """結果が変わる設定 (プロンプト・モデル・inflect のバージョン)。変わった場合は全行を処理し直す"""
+    return {"version": MANIFEST_VERSION, "prompt_hash": AICache.prompt_hash(CLEANING_PROMPT),
+            "model": CLEANING_MODEL, "inflect": version("inflect")}
+
+def load_manifest():
+    """前回の結合のマニフェストを読み込む (設定が異なる場合は空)"""
+    empty = {"settings": manifest_settings(), "files": {}, "rows": {}}
+    if os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("settings") == empty["settings"]:
+                return manifest
+            print("プロンプト・モデルなどが変わったため、全行を処理し直します。")
+        except (OSError, ValueError) as e:
+            print(f"マニフェスト読み込みエラー: {e}")
+    return empty
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def process_rows(df, config, api_key):
+    """
+    行ごとにAIクリーニングとバリエーション生成を行い、行のハッシュ -> 結果 の辞書を返す。
+    結果は {"en", "ja", "variations": [[en, ja], ...], "pending": クリーニング待ちか} (ja はクリーニング後)
+    """
+    df = df.reset_index(drop=True)
+    hashes = [row_hash(en, ja) for en, ja in zip(df['en'], df['ja'])]
+    pending = apply_ai_cleaning(df, config, api_key)
+    variations = generate_variations(df, keep_position=True)
+    by_position = {}
+    for position, en, ja in zip(variations['position'], variations['en'], variations['ja']):
+        by_position.setdefault(position, []).append([en, ja])
+    return {h: {"en": _cell(en), "ja": _cell(ja), "variations": by_position.get(i, []), "pending": bool(p)}
+            for i, (h, en, ja, p) in enumerate(zip(hashes, df['en'], df['ja'], pending))}
+
+def assemble_glossary(manifest):
+    """
+    マニフェストから用語集の候補を組み立てる (元の行をソースの順に並べ、その後にバリエーションを続ける)。
+    en, ja, source (ソース名), variation (バリエーションか), order (並び順) の DataFrame を返す
+    """
+    rows = manifest["rows"]
+    base, variations = [], []
+    for entry in manifest["files"].values():
+        for h in entry["rows"]:
+            base.append((rows[h]["en"], rows[h]["ja"], entry["source"], False))
+            variations.extend((en, ja, entry["source"], True) for en, ja in rows[h]["variations"])
+    df = pd.DataFrame(base + variations, columns=['en', 'ja', 'source', 'variation'], dtype=object)
+    df['variation'] = df['variation'].astype(bool)
+    df['order'] = range(len(df))
+    return df
+
+def build_glossary(manifest, priority, verbose=False):
+    """マニフェストから、英語ごとに訳を1つに絞った用語集と、選ばれなかった訳の一覧を返す"""
+    candidates = assemble_glossary(manifest)
+    resolved, conflicts = resolve_conflicts(candidates, priority)
+    if verbose:
+        unique_count = len(candidates.drop_duplicates(subset=['en', 'ja']))
+        print(f"バリエーション追加: {int(candidates['variation'].sum())}件")
+        print(f"重複削除: {len(candidates)} -> {unique_count} ({len(candidates) - unique_count}件削除)")
+        print(f"競合解決: {unique_count} -> {len(resolved)} "
+              f"(訳が複数ある英語 {conflicts['en'].nunique()}件, 優先順位 {' > '.join([MANUAL_SOURCE] + priority)})")
+    return resolved, conflicts
+
+def write_delta(old_df, new_df, path):
+    """前回と今回の用語集の差分 (追加・削除された en, ja の組) を書き出し、(追加, 削除) の件数を返す"""
+    old_pairs = set(zip(old_df['en'], old_df['ja'])) if old_df is not None else set()
+    new_pairs = set(zip(new_df['en'], new_df['ja']))
+    added = [('added', en, ja) for en, ja in zip(new_df['en'], new_df['ja']) if (en, ja) not in old_pairs]
+    removed = [('removed', en, ja) for en, ja in zip(old_df['en'], old_df['ja'])
+               if (en, ja) not in new_pairs] if old_df is not None else []
+    pd.DataFrame(added + removed, columns=['change', 'en', 'ja']).to_csv(path, index=False, encoding='utf-8')
+    return len(added), len(removed)
+
+def combine_glossaries(full=False):
+    """
+    ソースの用語集を結合し、英語ごとに訳を1つに絞って OUTPUT_FILE に保存する。
+    前回の結果 (MANIFEST_FILE) から、追加・変更された行だけをクリーニングとバリエーション生成にかけ、
+    なくなったソースの行は取り除く。前回との差分は DELTA_FILE、選ばれなかった訳は CONFLICT_FILE に書き出す。
+    full=True なら全行を処理し直す
+    """
     # data.yml から設定を読み込む
     config_path = "resource/data.yml"
     if not os.path.exists(config_path):
@@ -84,155 +469,113 @@ def combine_glossaries():
     with open(config_path, "r", encoding="utf-8") as f:
         config = yaml.safe_load(f)
 
-    # 結合対象のファイルリストを作成
-    target_files = []
-    if "scraping_output" in config: target_files.append(config["scraping_output"])
-    if "xml_output" in config: target_files.append(config["xml_output"])
-    if "detail_output" in config: target_files.append(config["detail_output"])
-    if "additional_glossary" in config: target_files.append(config["additional_glossary"])
-
-    output_file = "resource/zzz_glossary.csv"
-    combined_data = []
+    # 結合対象のファイルリストを作成 (ソース名, パス)
+    target_files = [(source, config[key]) for key, source in SOURCE_KEYS.items() if key in config]
+    priority = config.get("source_priority", DEFAULT_PRIORITY)
 
     print("--- 用語集の結合処理を開始 ---")
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    old_manifest = load_manifest()
+    if full:
+        old_manifest = {"settings": old_manifest["settings"], "files": {}, "rows": {}}
+    old_rows = old_manifest["rows"]
 
-    for file_path in target_files:
+    files = {}
+    changed = []
+    for source, file_path in target_files:
         if not os.path.exists(file_path):
             print(f"スキップ (ファイルなし): {file_path}")
             continue
+        # 列指向の中間ファイルがあればそちらを読む (ハッシュも読み込むファイルのデータで求める)
+        read_path = glossary_io.input_path(file_path)
+        digest = glossary_io.content_hash(read_path)
+        previous = old_manifest["files"].get(file_path)
+        if previous and previous["hash"] == digest:
+            files[file_path] = dict(previous, source=source)
+            print(f"変更なし: {file_path} ({len(previous['rows'])}件)")
+            continue
         try:
-            df = pd.read_csv(file_path)
-            combined_data.append(df)
-            print(f"読み込み: {file_path} ({len(df)}件)")
+            df = glossary_io.read_glossary(file_path)
         except Exception as e:
             print(f"エラー: {file_path} の読み込みに失敗しました。\n{e}")
-
-    if combined_data:
-        # データを結合
-        combined_df = pd.concat(combined_data, ignore_index=True)
-        
-        # --- AIによるクリーニング処理 (日本語と英語が混在するもののみ) ---
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        
-        if not api_key:
-            print("警告: GOOGLE_API_KEY が設定されていません。AIクリーニングをスキップします。")
+            continue
+        df = df[['en', 'ja']]
+        hashes = [row_hash(en, ja) for en, ja in zip(df['en'], df['ja'])]
+        files[file_path] = {"source": source, "hash": digest, "rows": hashes}
+        changed.append(df[[h not in old_rows for h in hashes]])
+        if previous:
+            before, after = set(previous["rows"]), set(hashes)
+            print(f"読み込み: {read_path} ({len(df)}件, 追加 {len(after - before)}件 / 削除 {len(before - after)}件)")
         else:
-            # キャッシュの読み込み
-            cache = load_cache()
-            
-            def is_mixed_jp_en(text):
-                if not isinstance(text, str): return False
-                has_jp = re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]', text)
-                has_en = re.search(r'[a-zA-Z]', text)
-                return bool(has_jp and has_en)
-
-            # 処理対象の抽出
-            target_mask = combined_df['ja'].apply(is_mixed_jp_en)
-            target_indices = combined_df[target_mask].index.tolist()
-            
-            if target_indices:
-                print(f"対象候補: {len(target_indices)}件 (日本語・英語混在)")
-                
-                indices_to_process = []
-                updates_from_cache = {}
-
-                # キャッシュにあるものは即適用、ないものはAPI処理リストへ
-                for idx in target_indices:
-                    original_text = combined_df.at[idx, 'ja']
-                    if original_text in cache:
-                        updates_from_cache[idx] = cache[original_text]
-                    else:
-                        indices_to_process.append(idx)
-                
-                # キャッシュ適用
-                if updates_from_cache:
-                    print(f"キャッシュから {len(updates_from_cache)} 件を適用します。")
-                    for idx, cleaned in updates_from_cache.items():
-                        combined_df.at[idx, 'ja'] = cleaned
-
-                # API処理が必要なものがある場合
-                if indices_to_process:
-                    print(f"新たにAIクリーニングを実行します: {len(indices_to_process)}件")
-                    genai.configure(api_key=api_key)
-                    model = genai.GenerativeModel('gemini-2.5-flash')
-                    
-                    batch_size = 50
-                    new_cache_data = {}
-                    
-                    for i in tqdm(range(0, len(indices_to_process), batch_size)):
-                        batch_indices = indices_to_process[i:i+batch_size]
-                        batch_texts = combined_df.loc[batch_indices, 'ja'].tolist()
-                        
-                        cleaned_texts = clean_text_with_ai(model, batch_texts)
-                        
-                        for idx, original, cleaned in zip(batch_indices, batch_texts, cleaned_texts):
-                            combined_df.at[idx, 'ja'] = cleaned
-                            new_cache_data[original] = cleaned
-                        
-                        time.sleep(10) # レート制限回避
-
-                    # 新しい結果をキャッシュに保存
-                    save_to_cache(new_cache_data)
-                else:
-                    print("全ての対象データがキャッシュ済みのため、APIリクエストはスキップされました。")
+            print(f"読み込み: {read_path} ({len(df)}件)")
+    for file_path in old_manifest["files"]:
+        if file_path not in files:
+            print(f"取り除き: {file_path} ({len(old_manifest['files'][file_path]['rows'])}件)")
 
-            else:
-                print("クリーニング対象が見つかりませんでした。")
-        # -------------------------------------------------------
-
-        # inflectエンジンの初期化
-        p = inflect.engine()
-
-        # --- 追加処理: バリエーションの生成 ---
-        new_rows = []
-        for index, row in combined_df.iterrows():
-            en_term = str(row['en']).strip() # 空白除去を追加
-            ja_term = str(row['ja']).strip()
-
-            # 1. 複数形の追加 (英語のみ)
-            # 空文字でない、かつ単語数が4以下の場合のみ処理
-            if en_term and len(en_term.split()) <= 4:
-                try:
-                    plural_en = p.plural(en_term)
-                    if plural_en and plural_en != en_term:
-                        new_rows.append({'en': plural_en, 'ja': ja_term})
-                except Exception:
-                    # inflectでエラーが出ても無視して次へ進む
-                    pass
-
-            # 2. タグ・カテゴリ除去バージョンの追加
-            # [Tag] 形式の除去
-            cleaned_en = re.sub(r'^\[.*?\]\s*', '', en_term)
-            cleaned_ja = re.sub(r'^\[.*?\]\s*', '', ja_term)
-
-            # Category: 形式の除去 (コロン区切りの接頭辞を除去)
-            # 例: "Defensive Assist: Drifting Petalss" -> "Drifting Petalss"
-            # 例: "パリィ支援：花筏" -> "花筏"
-            cleaned_en = re.sub(r'^.+?[:：]\s*', '', cleaned_en)
-            cleaned_ja = re.sub(r'^.+?[:：]\s*', '', cleaned_ja)
-
-            if (cleaned_en != en_term or cleaned_ja != ja_term):
-                if len(cleaned_en) > 1 and len(cleaned_ja) > 0:
-                    new_rows.append({'en': cleaned_en, 'ja': cleaned_ja})
-
-        if new_rows:
-            variations_df = pd.DataFrame(new_rows)
-            combined_df = pd.concat([combined_df, variations_df], ignore_index=True)
-            print(f"バリエーション追加: {len(new_rows)}件")
-        # ------------------------------------
-
-        # 重複を削除
-        before_count = len(combined_df)
-        combined_df.drop_duplicates(subset=['en', 'ja'], inplace=True)
-        after_count = len(combined_df)
-        
-        print(f"重複削除: {before_count} -> {after_count} ({before_count - after_count}件削除)")
+    if not files:
+        print("結合するデータがありませんでした。")
+        return
 
-        # 結合したデータを保存
-        combined_df.to_csv(output_file, index=False, encoding='utf-8')
-        print(f"結合した用語集を {output_file} に保存しました。")
+    # 前回クリーニングできなかった行は、APIキーがあれば処理し直す (今回のソースにない行は除く)
+    referenced = {h for entry in files.values() for h in entry["rows"]}
+    retry = {h for h in referenced if h in old_rows and old_rows[h]["pending"]} if api_key else set()
+
+    # 追加・変更された行と、前回クリーニングできなかった行だけを処理する
+    retry_rows = pd.DataFrame([(old_rows[h]["en"], old_rows[h]["ja"]) for h in sorted(retry)], columns=['en', 'ja'])
+    new_df = pd.concat(changed + [retry_rows], ignore_index=True).drop_duplicates(subset=['en', 'ja'])
+    rows = {h: row for h, row in old_rows.items() if h not in retry}
+    if len(new_df):
+        print(f"処理対象: {len(new_df)}行 (前回から再利用 {len(rows)}行)")
+        rows.update(process_rows(new_df, config, api_key))
     else:
-        print("結合するデータがありませんでした。")
+        print("追加・変更された行はありません。")
+
+    new_manifest = {"settings": old_manifest["settings"], "priority": priority, "files": files,
+                    "rows": {h: row for h, row in rows.items() if h in referenced}}
+
+    # 英語ごとに訳を1つに絞る
+    combined_df, conflicts = build_glossary(new_manifest, priority, verbose=True)
+    conflicts.to_csv(CONFLICT_FILE, index=False, encoding='utf-8')
+    print(f"選ばれなかった訳 {len(conflicts)}件を {CONFLICT_FILE} に書き出しました。")
+
+    # 前回の用語集との差分 (初回は既存の出力ファイルと比べる)
+    if new_manifest == old_manifest:
+        old_df = combined_df
+    elif old_manifest["files"]:
+        old_df = build_glossary(old_manifest, old_manifest.get("priority", priority))[0]
+    elif os.path.exists(OUTPUT_FILE):
+        old_df = pd.read_csv(OUTPUT_FILE, dtype=object, keep_default_na=False).replace("", None)
+    else:
+        old_df = None
+    added, removed = write_delta(old_df, combined_df, DELTA_FILE)
+    print(f"前回との差分: 追加 {added}件 / 削除 {removed}件 ({DELTA_FILE})")
+
+    # 結合したデータを保存 (CSV は GCS へのアップロード用、列指向ファイルは translate_test.py などの後段用)
+    combined_df.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
+    glossary_io.write_columnar(combined_df, OUTPUT_FILE, "combined", {
+        "sources": {entry["source"]: path for path, entry in files.items()},
+        "source_priority": [MANUAL_SOURCE] + priority,
+    })
+    save_manifest(new_manifest)
+    print(f"結合した用語集を {OUTPUT_FILE} に保存しました。")
+
+def export_cleaning_cache(csv_path):
+    """現在のプロンプト・モデルのAIクリーニング結果を旧形式のCSVに書き出す"""
+    with open("resource/data.yml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    cache = AICache(config.get("ai_cache", "./resource/ai_cache.sqlite"))
+    try:
+        count = cache.export_csv(csv_path, cache.prompt_hash(CLEANING_PROMPT), CLEANING_MODEL)
+    finally:
+        cache.close()
+    print(f"AIクリーニング結果 {count}件を {csv_path} に書き出しました。")
 
 if __name__ == "__main__":
-    combine_glossaries()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="用語集の結合とAIクリーニング")
+    parser.add_argument("--full", action="store_true", help="前回の結果を使わず、全行を処理し直す")
+    parser.add_argument("--export-cache", metavar="CSV", help="結合せずに、AIクリーニング結果のキャッシュをCSVに書き出す")
+    args = parser.parse_args()
+    if args.export_cache:
+        export_cleaning_cache(args.export_cache)
+    else:
+        combine_glossaries(full=args.full)
\ No newline at end of file
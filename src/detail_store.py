@@ -0,0 +1,89 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+# レコードの形式の版 (1: 説明文のテキストのみ, 2: 説明文の HTML (html) も含む)。
+# これより古い版のデータは古くなったものとして扱い、再取得する
+RECORD_VERSION = 2
+
+class DetailStore:
+    """
+    公式HoYoWikiから抽出したレコード (MindscapeDesc / SkillDesc) を
+    エントリIDと言語ごとに保存する永続ストア (SQLite)。
+    取得時刻と内容のハッシュを持ち、再実行時は新しいものを読み直さずに使う。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                entry_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                records TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                scraped_at REAL NOT NULL,
+                record_version INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (entry_id, lang)
+            )
+        """)
+        # 版の列がない古いストアには列を追加する (既存のデータは版1)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "record_version" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN record_version INTEGER NOT NULL DEFAULT 1")
+        self._conn.commit()
+
+    @staticmethod
+    def content_hash(records):
+        data = json.dumps(records, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, entry_id, lang):
+        """保存済みのレコードのリストを返す (なければ None)"""
+        row = self._conn.execute(
+            "SELECT records FROM entries WHERE entry_id = ? AND lang = ?", (str(entry_id), lang)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, entry_id, lang, records):
+        """レコードを保存し、'new' / 'changed' / 'unchanged' のいずれかを返す"""
+        digest = self.content_hash(records)
+        row = self._conn.execute(
+            "SELECT content_hash FROM entries WHERE entry_id = ? AND lang = ?", (str(entry_id), lang)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (entry_id, lang, records, content_hash, scraped_at, record_version) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(entry_id), lang, json.dumps(records, ensure_ascii=False), digest, time.time(), RECORD_VERSION),
+        )
+        self._conn.commit()
+        if row is None:
+            return "new"
+        return "unchanged" if row[0] == digest else "changed"
+
+    def is_fresh(self, entry_id, langs, max_age):
+        """指定したすべての言語について、max_age 秒以内に現在の形式で取得したデータがあれば True"""
+        placeholders = ", ".join("?" for _ in langs)
+        count = self._conn.execute(
+            f"SELECT COUNT(*) FROM entries WHERE entry_id = ? AND lang IN ({placeholders}) AND scraped_at >= ? "
+            "AND record_version >= ?",
+            (str(entry_id), *langs, time.time() - max_age, RECORD_VERSION),
+        ).fetchone()[0]
+        return count == len(langs)
+
+    def outdated_entry_ids(self):
+        """古い形式 (RECORD_VERSION より前) のデータを含むエントリIDの集合を返す"""
+        rows = self._conn.execute(
+            "SELECT DISTINCT entry_id FROM entries WHERE record_version < ?", (RECORD_VERSION,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def entry_ids(self):
+        """保存されているエントリIDを数値順に返す"""
+        rows = self._conn.execute("SELECT DISTINCT entry_id FROM entries").fetchall()
+        return sorted((row[0] for row in rows), key=lambda i: int(i) if i.isdigit() else 0)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,132 @@
+"""
+動作確認用の Gemini API (REST の generateContent) の偽サーバー。
+data.yml の gemini_endpoint に http://127.0.0.1:<port> を指定すると、combine_glossary.py と
+get_data_detail.py は実際の API の代わりにこのサーバーへ問い合わせる (APIキーは任意の文字列でよい)。
+応答は規則による簡易なもので、毎分のリクエスト数の上限や一定の割合で 429 エラーを返したり、
+AIクリーニングの応答から要素を落としたりすることもできる。
+"""
+
+import argparse
+import json
+import random
+import re
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JP_CHAR_RE = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]')
+# 日本語の後ろに付いたローマ字読み・英語の重複と、[!] 形式の注釈
+TRAILING_LATIN_RE = re.compile(r'[\s　]*[A-Za-zÀ-ɏ][A-Za-zÀ-ɏ0-9\s.,\'!?:()\-]*$')
+NOTE_RE = re.compile(r'(\[!\])+')
+
+def clean_line(text):
+    """AIクリーニングの応答の代わり (日本語を含む行の末尾の英字と注釈を除く)"""
+    text = NOTE_RE.sub("", text).strip()
+    if JP_CHAR_RE.search(text):
+        text = TRAILING_LATIN_RE.sub("", text)
+    return text
+
+def respond_cleaning(prompt, drop_rate=0.0):
+    """AIクリーニングの応答の代わり (drop_rate の割合で要素を応答から落とす)"""
+    data = json.loads(prompt.split("入力リスト (JSON):", 1)[1])
+    return json.dumps([{"id": item["id"], "text": clean_line(item["text"])}
+                       for item in data if random.random() >= drop_rate], ensure_ascii=False)
+
+def respond_extraction(prompt):
+    """用語抽出の応答の代わり (タイトル同士を1つの用語ペアとする)"""
+    data = json.loads(prompt.split("Input Data (JSON):", 1)[1])
+    return json.dumps([{"id": item["id"],
+                        "terms": [{"en": item.get("en_title", ""), "ja": item.get("ja_title", "")}]}
+                       for item in data], ensure_ascii=False)
+
+def respond(prompt, drop_rate=0.0):
+    if "入力リスト (JSON):" in prompt:
+        return respond_cleaning(prompt, drop_rate)
+    if "Input Data (JSON):" in prompt:
+        return respond_extraction(prompt)
+    return ""
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        if not self.path.split("?")[0].endswith(":generateContent"):
+            return self._send(404, {"error": {"code": 404, "message": f"Not found: {self.path}", "status": "NOT_FOUND"}})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if server.rate_limited():
+            return self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                              "status": "RESOURCE_EXHAUSTED"}})
+        if server.latency:
+            time.sleep(server.latency)
+        prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                         for part in content.get("parts", []))
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": respond(prompt, server.drop_rate)}], "role": "model"},
+                                         "finishReason": "STOP", "index": 0}]})
+
+    def _send(self, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rpm=None, fail_rate=0.0, drop_rate=0.0, latency=0.0, verbose=False):
+        super().__init__(address, FakeGeminiHandler)
+        self.rpm = rpm
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.latency = latency
+        self.verbose = verbose
+        self.requests = 0
+        self.rejected = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def rate_limited(self):
+        """毎分のリクエスト数の上限を超えた場合と、fail_rate の割合で True (429 を返す)"""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            limited = (self.rpm and len(self._recent) >= self.rpm) or random.random() < self.fail_rate
+            if limited:
+                self.rejected += 1
+            else:
+                self._recent.append(now)
+            return bool(limited)
+
+def main():
+    parser = argparse.ArgumentParser(description="動作確認用の Gemini API の偽サーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=None, help="毎分のリクエスト数の上限 (超えると 429)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="ランダムに 429 を返す割合")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="AIクリーニングの応答から要素を落とす割合")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの秒数")
+    parser.add_argument("--verbose", action="store_true", help="リクエストごとにログを表示")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(("127.0.0.1", args.port), args.rpm, args.fail_rate, args.drop_rate, args.latency,
+                              args.verbose)
+    print(f"Fake Gemini API: http://127.0.0.1:{args.port}", flush=True)
+    # バックグラウンドで起動した場合も kill で統計を表示して終了する
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"リクエスト {server.requests}件 (429 {server.rejected}件)")
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import random
+import sqlite3
+import threading
+import time
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from rate_limit import TokenBucket
+
+# リトライ対象のステータスコード (レート制限・サーバーエラー)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+USER_AGENT = "ZZZ-Translator/1.0 (glossary builder; +https://github.com/kyobankatu/ZZZ-Translator)"
+
+class ResponseCache:
+    """
+    URLをキーにレスポンス本文と ETag / Last-Modified を保存する永続キャッシュ (SQLite)。
+    合計サイズが上限を超えると、最後に参照された時刻が古いものから削除する (LRU)。
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url):
+        """キャッシュされたエントリを辞書で返す (なければ None)。参照時刻も更新する"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, encoding, etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+        body, encoding, etag, last_modified = row
+        return {"body": body, "encoding": encoding, "etag": etag, "last_modified": last_modified}
+
+    def put(self, url, response):
+        """200 レスポンスを保存し、上限を超えた分を古いものから削除する"""
+        body = response.content
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body, response.encoding, response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"), len(body), now, now),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self._total -= row[1]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _cached_response(url, entry):
+    """キャッシュのエントリから requests.Response を組み立てる"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry["body"]
+    response.encoding = entry["encoding"]
+    if entry["etag"]:
+        response.headers["ETag"] = entry["etag"]
+    if entry["last_modified"]:
+        response.headers["Last-Modified"] = entry["last_modified"]
+    return response
+
+class OfflineCacheMiss(Exception):
+    """オフラインモードでキャッシュにないURLを要求した"""
+
+class Fetcher:
+    """
+    コネクションプール付きのセッションを共有し、複数のURLを並列に取得する。
+    ホストごとにトークンバケットでリクエスト間隔を制限し、429 / 5xx は指数バックオフで再試行する。
+    cache を指定すると条件付きリクエストで再検証し、304 ならキャッシュの本文を使う。
+    offline の場合はネットワークに接続せず、キャッシュだけで応答する。
+    """
+
+    def __init__(self, workers=8, rate=4.0, burst=4, retries=4, backoff=1.0, timeout=30,
+                 cache=None, offline=False):
+        if rate <= 0:
+            raise ValueError(f"scraping_rate は正の値を指定してください: {rate}")
+        self.workers = max(int(workers), 1)
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+        self.cache = cache
+        self.offline = offline
+        self.stats = {"fetched": 0, "revalidated": 0, "offline_hits": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+        return bucket
+
+    def _retry_wait(self, attempt, response=None):
+        """Retry-After ヘッダーがあればそれに従い、なければ指数バックオフ (ジッター付き) で待機時間を決める"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def get(self, url, **kwargs):
+        """URLを取得する。リトライしても失敗した場合は例外を送出する"""
+        entry = self.cache.get(url) if self.cache else None
+        if self.offline:
+            if entry is None:
+                raise OfflineCacheMiss(f"Not in cache: {url}")
+            self._count("offline_hits")
+            return _cached_response(url, entry)
+
+        # キャッシュがあれば条件付きリクエストにする
+        if entry:
+            headers = dict(kwargs.pop("headers", None) or {})
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+            kwargs["headers"] = headers
+
+        response = self._request(url, **kwargs)
+        if response.status_code == 304 and entry:
+            self._count("revalidated")
+            return _cached_response(url, entry)
+
+        response.raise_for_status()
+        self._count("fetched")
+        if self.cache:
+            self.cache.put(url, response)
+        return response
+
+    def _request(self, url, **kwargs):
+        bucket = self._bucket(url)
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.retries + 1):
+            bucket.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self._retry_wait(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.retries:
+                wait = self._retry_wait(attempt, response)
+                print(f"  Retry {attempt + 1}/{self.retries} after {wait:.1f}s ({response.status_code}): {url}")
+                time.sleep(wait)
+                continue
+
+            return response
+
+    def fetch_all(self, urls, handler):
+        """
+        URLリストを並列に取得し、handler(url, response) の結果を (url, 結果, 例外) で返す。
+        結果は取得の完了順ではなく、入力したURLの順序で返す。
+        実行中・未取り出しのタスクはワーカー数の2倍までに抑え、URLリスト全体を一度に投入しない。
+        """
+        def task(url):
+            try:
+                return url, handler(url, self.get(url)), None
+            except Exception as e:
+                return url, None, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for url in urls:
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(task, url))
+            while pending:
+                yield pending.popleft().result()
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def print_stats(self):
+        print(f"HTTP: 取得 {self.stats['fetched']}件 / 304再利用 {self.stats['revalidated']}件 / "
+              f"オフライン {self.stats['offline_hits']}件")
+
+def create_fetcher(config, offline=False):
+    """data.yml の設定から Fetcher を作成する (http_cache を指定するとレスポンスをキャッシュする)"""
+    cache = None
+    cache_path = config.get("http_cache")
+    if cache_path:
+        cache = ResponseCache(cache_path, config.get("http_cache_max_mb", 1024) * 1024 * 1024)
+    elif offline:
+        raise ValueError("オフラインモードには data.yml の http_cache の設定が必要です")
+
+    return Fetcher(
+        workers=config.get("scraping_workers", 8),
+        rate=config.get("scraping_rate", 4.0),
+        burst=config.get("scraping_burst", 4),
+        retries=config.get("scraping_retries", 4),
+        cache=cache,
+        offline=offline,
+    )
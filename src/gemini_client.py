@@ -0,0 +1,77 @@
+import json
+import random
+import re
+import time
+import google.generativeai as genai
+
+def configure(api_key, endpoint=None):
+    """
+    Gemini API の接続を設定する。
+    endpoint (例: http://127.0.0.1:8765) を指定すると、そのサーバー (fake_gemini.py など) に REST で接続する
+    """
+    if endpoint:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
+
+def estimate_tokens(text):
+    """トークン数の概算 (英数字は約4文字で1トークン、日本語などは1文字1トークンとみなす)"""
+    ascii_count = sum(1 for c in text if ord(c) < 128)
+    return ascii_count // 4 + (len(text) - ascii_count) + 1
+
+def is_quota_error(error):
+    """レート制限・クォータ超過のエラーなら True"""
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "resourceexhausted" in text or "quota" in text or "rate limit" in text
+
+# 一時的なサーバー・通信のエラーの例外名 (google.api_core・requests など)
+_TRANSIENT_NAMES = ("internalservererror", "badgateway", "serviceunavailable", "gatewaytimeout",
+                    "deadlineexceeded", "timeout", "connectionerror")
+_TRANSIENT_STATUS_RE = re.compile(r"^(500|502|503|504)\b")
+
+def is_transient_error(error):
+    """一時的なサーバー・通信のエラー (5xx・タイムアウト・接続の失敗) なら True"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__.lower()
+    return any(part in name for part in _TRANSIENT_NAMES) or bool(_TRANSIENT_STATUS_RE.match(str(error)))
+
+def parse_json_response(text):
+    """モデルの応答からJSONを取り出す (Markdownのコードブロックで囲まれていても読む)"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text.strip())
+
+def call_with_backoff(func, limiter, tokens=0, retries=5):
+    """
+    limiter (QuotaLimiter) の許可を待って func() を呼ぶ。
+    レート制限のエラーでは全体の送信速度を落とし、指数バックオフ (ジッター付き) で retries 回まで再試行する。
+    一時的なサーバー・通信のエラーも、速度は落とさずに同じく再試行する。
+    それ以外のエラーと、再試行を使い切ったエラーは送出する
+    """
+    for attempt in range(retries + 1):
+        limiter.acquire(tokens)
+        try:
+            result = func()
+        except Exception as e:
+            quota = is_quota_error(e)
+            if not quota and not is_transient_error(e):
+                raise
+            if quota:
+                limiter.penalize()
+            if attempt >= retries:
+                raise
+            wait = 2 ** attempt * (0.5 + random.random() / 2)
+            if quota:
+                print(f"  Rate limited, retry {attempt + 1}/{retries} after {wait:.1f}s (rate {limiter.rpm:.1f} rpm)")
+            else:
+                print(f"  Server error ({e}), retry {attempt + 1}/{retries} after {wait:.1f}s")
+            time.sleep(wait)
+            continue
+        limiter.reward()
+        return result
@@ -1,17 +1,31 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import csv
 import time
 import os
-import re
-import json
-import sys
 import yaml
 import google.generativeai as genai
-from tqdm import tqdm
+
+import gemini_client
+import glossary_io
+from ai_cache import AICache
+from rate_limit import AsyncTokenBucket
+from browser_resources import create_blocker
+from detail_store import DetailStore
+from hoyowiki_api import fixture_entry_ids, is_entry_api_response, is_entry_list_response, load_fixture, \
+    parse_entry_page_json, parse_entry_page_list, parse_entry_sections, save_fixture
+from term_aligner import align_terms, confirmed_terms, term_key
+from term_extraction import extract_terms
+from readiness import NetworkTracker, is_active, print_wait_stats, read_text, record_timing, wait_for_active, \
+    wait_for_scroll_growth, wait_for_selector, wait_for_text_change
 
 # キャラクター一覧ページ (英語版でIDを取得するのが無難)
 CHAR_LIST_URL = "https://wiki.hoyolab.com/pc/zzz/aggregate/8?lang=en-us"
+ENTRY_URL = "https://wiki.hoyolab.com/pc/zzz/entry/{entry_id}?lang={lang}"
+# ログ上の表記 -> HoYoWiki の言語コード
+LANGUAGES = {"JP": "ja-jp", "EN": "en-us"}
 
 # 設定ファイルから出力先を読み込む
 try:
@@ -20,66 +34,120 @@ try:
     OUTPUT_FILE = config.get("detail_output", "resource/zzz_glossary_detail.csv")
 except Exception as e:
     print(f"Warning: Could not load data.yml, using default path. Error: {e}")
+    config = {}
     OUTPUT_FILE = "resource/zzz_glossary_detail.csv"
 
-def get_character_entry_ids(browser):
+# ルールで対応付けた用語の確認に使う、他のソースの用語集 (data.yml のキー)。
+# この収集結果 (detail_output) は前回のルールの結果を含むため使わない
+KNOWN_GLOSSARY_KEYS = ["xml_output", "scraping_output", "additional_glossary"]
+
+# 抽出したレコードをエントリID・言語ごとに保存するストアと、再取得までの日数
+STORE_FILE = config.get("detail_store", "./resource/detail_store.sqlite")
+STORE_MAX_AGE = config.get("detail_store_max_age_days", 7) * 24 * 60 * 60
+
+# 用語抽出に使うモデルと、応答のキャッシュ・並列数・毎分のリクエスト数とトークン数・1リクエストの入力トークン数の目安
+MODEL_NAME = "gemini-2.5-flash"
+AI_CACHE_FILE = config.get("ai_cache", "./resource/ai_cache.sqlite")
+GEMINI_WORKERS = config.get("gemini_workers", 4)
+GEMINI_RPM = config.get("gemini_rpm", 30)
+GEMINI_TPM = config.get("gemini_tpm", 250000)
+# 指定するとそのURLのサーバー (fake_gemini.py など) に接続する
+GEMINI_ENDPOINT = config.get("gemini_endpoint")
+AI_BATCH_TOKENS = config.get("detail_ai_batch_tokens", 4000)
+
+# 同時に処理するブラウザコンテキスト (キャラクター) の数
+DETAIL_WORKERS = config.get("detail_workers", 4)
+# HoYoWiki へのページ読み込みの上限 (1秒あたり)
+DETAIL_RATE = config.get("detail_rate", 1.0)
+# 画面の変化を待つ際のタイムアウト (ミリ秒)
+WAIT_TIMEOUT = config.get("detail_wait_timeout", 5000)
+# 無限スクロールで追加読み込みを待つ時間 (これを過ぎても高さが変わらなければ最下部とみなす)
+SCROLL_TIMEOUT = config.get("detail_scroll_timeout", 3000)
+
+async def new_context(browser, blocker):
+    """リソースの遮断・キャッシュを設定したブラウザコンテキストを作る"""
+    context = await browser.new_context()
+    await blocker.install(context)
+    return context
+
+# キャラクターカードの一覧
+CARD_GRID_SELECTOR = "div.tw-grid.tw-gap-y-4.tw-grid-cols-2.tw-gap-x-7"
+CARD_SELECTOR = f"{CARD_GRID_SELECTOR} > div.tw-relative.tw-flex.tw-p-4.tw-rounded-2xl.tw-bg-gt-g-grey-black-2.tw-cursor-pointer"
+
+# カードの要素からエントリIDを探す (リンクの href、data-* 属性、Vue コンポーネントの props の順)
+_CARD_ENTRY_IDS_JS = """selector => Array.from(document.querySelectorAll(selector)).map(card => {
+    const fromHref = href => { const m = /\\/entry\\/(\\d+)/.exec(href || ''); return m ? m[1] : null; };
+    for (const a of [card.closest('a'), ...card.querySelectorAll('a[href]')]) {
+        const id = a && fromHref(a.getAttribute('href'));
+        if (id) return id;
+    }
+    for (const el of [card, ...card.querySelectorAll('*')]) {
+        for (const attr of el.attributes) {
+            if (attr.name.startsWith('data-') && /entry/i.test(attr.name) && /^\\d+$/.test(attr.value)) return attr.value;
+        }
+    }
+    for (let el = card; el; el = el.parentElement) {
+        const props = (el.__vueParentComponent && el.__vueParentComponent.props) || (el.__vue__ && el.__vue__.$props);
+        const data = props && (props.data || props.item || props.entry || props);
+        const id = data && (data.entry_page_id || data.entryPageId);
+        if (id) return String(id);
+    }
+    return null;
+})"""
+
+async def get_character_entry_ids(browser, blocker):
     """
-    キャラクター一覧ページから全キャラクターのEntry IDを取得する
+    キャラクター一覧ページを1回読み込むだけで、全キャラクターのEntry IDを取得する。
+    スクロールのたびに呼ばれるエントリ一覧APIのレスポンスと、カードのDOM (リンク・属性・コンポーネントのデータ) から集める。
     """
     print(f"Fetching character list from {CHAR_LIST_URL}...")
-    page = browser.new_page()
-    page.goto(CHAR_LIST_URL, wait_until="networkidle", timeout=60000)
+    t0 = time.perf_counter()
+    context = await new_context(browser, blocker)
+    page = await context.new_page()
+
+    api_ids = []
+    totals = []
+    async def on_response(response):
+        if not is_entry_list_response(response):
+            return
+        try:
+            ids, total = parse_entry_page_list(await response.json())
+        except Exception as e:
+            print(f"  Could not read entry list response: {e}")
+            return
+        api_ids.extend(ids)
+        if total is not None:
+            totals.append(total)
+    page.on("response", on_response)
+
+    await page.goto(CHAR_LIST_URL, wait_until="networkidle", timeout=60000)
     
     # 無限スクロール対応: ページ最下部までスクロール
-    last_height = page.evaluate("document.body.scrollHeight")
+    last_height = await page.evaluate("document.body.scrollHeight")
     while True:
-        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        time.sleep(2)
-        new_height = page.evaluate("document.body.scrollHeight")
-        if new_height == last_height:
+        # 一覧APIの全件数に達していれば、それ以上スクロールしない
+        if totals and len(set(api_ids)) >= totals[-1]:
             break
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        # 追加のカードが読み込まれて高さが伸びなければ最下部とみなす
+        if not await wait_for_scroll_growth(page, last_height, timeout=SCROLL_TIMEOUT):
+            break
+        new_height = await page.evaluate("document.body.scrollHeight")
         last_height = new_height
         print("  Scrolling...")
 
-    # キャラクターカードを取得
-    grid_selector = "div.tw-grid.tw-gap-y-4.tw-grid-cols-2.tw-gap-x-7"
-    item_selector = "div.tw-relative.tw-flex.tw-p-4.tw-rounded-2xl.tw-bg-gt-g-grey-black-2.tw-cursor-pointer"
-    card_selector = f"{grid_selector} > {item_selector}"
-    
-    cards = page.locator(card_selector)
-    count = cards.count()
-    print(f"  Found {count} character cards.")
-    
-    entry_ids = []
-    card_handles = cards.element_handles()
-    
-    for i, handle in enumerate(card_handles):
-        try:
-            # Ctrl(Meta)+Click で新しいタブで開き、URLからIDを取得する
-            with page.context.expect_page() as new_page_info:
-                modifier = "Meta" if os.name == 'posix' else "Control"
-                handle.click(modifiers=[modifier])
-            
-            new_page = new_page_info.value
-            new_page.wait_for_load_state("domcontentloaded")
-            
-            # URLからID抽出 (https://wiki.hoyolab.com/pc/zzz/entry/909)
-            url = new_page.url
-            match = re.search(r'/entry/(\d+)', url)
-            if match:
-                entry_id = match.group(1)
-                entry_ids.append(entry_id)
-                print(f"  [{i+1}/{count}] Found ID: {entry_id}")
-            
-            new_page.close()
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"  Error processing card {i}: {e}")
-            continue
+    card_ids = await page.evaluate(_CARD_ENTRY_IDS_JS, CARD_SELECTOR)
+    await context.close()
 
-    page.close()
-    return list(set(entry_ids))
+    print(f"  Found {len(card_ids)} character cards "
+          f"({sum(1 for i in card_ids if i)} IDs from DOM, {len(set(api_ids))} IDs from list API).")
+
+    # 一覧APIの順序を優先し、DOMからしか見つからなかったものを後ろに加える (重複は除く)
+    entry_ids = list(dict.fromkeys(api_ids + [i for i in card_ids if i]))
+    if len(entry_ids) < len(card_ids):
+        print(f"  Warning: IDs found for {len(entry_ids)} of {len(card_ids)} cards.")
+    print(f"  Discovered {len(entry_ids)} IDs in {time.perf_counter() - t0:.1f}s")
+    return entry_ids
 
 def extract_mindscape_from_html(html_content):
     """心象映画 (Mindscape Cinema) のデータを静的HTMLから抽出する"""
@@ -100,39 +168,46 @@ def extract_mindscape_from_html(html_content):
                 extracted_items.append({
                     "type": "MindscapeDesc", 
                     "title": title,
-                    "value": description
+                    "value": description,
+                    "html": desc_div.decode_contents()
                 })
 
     return extracted_items
 
-def extract_skills_interactively(page):
+async def extract_skills_interactively(page):
     """スキルセクションを操作してデータを抽出する"""
     extracted_items = []
     skill_section_selector = "[id='3_agent_talent']"
+    icon_selector = f"{skill_section_selector} .iconContainer_i31U6"
+    content_selector = f"{skill_section_selector} .tw-overflow-hidden.tw-rounded-xl"
 
     try:
-        page.wait_for_selector(skill_section_selector, state="attached", timeout=10000)
-        page.locator(skill_section_selector).scroll_into_view_if_needed()
-        time.sleep(2)
+        await page.wait_for_selector(skill_section_selector, state="attached", timeout=10000)
+        await page.locator(skill_section_selector).scroll_into_view_if_needed()
     except Exception as e:
         return extracted_items
+    # 遅延描画されるスキルアイコンが表示されるまで待つ
+    await wait_for_selector(page, icon_selector, timeout=WAIT_TIMEOUT, label="skill-icons")
 
-    icons = page.locator(f"{skill_section_selector} .iconContainer_i31U6")
-    icon_count = icons.count()
+    icons = page.locator(icon_selector)
+    icon_count = await icons.count()
     
     print(f"  Found {icon_count} skill icons.")
 
     for i in range(icon_count):
+        j = 0
         try:
             # アイコン要素を取得し、JSで直接クリックイベントを発火させる
             icon = icons.nth(i)
-            icon.scroll_into_view_if_needed()
-            icon.evaluate("el => el.click()")
-            
-            time.sleep(1.0)
+            await icon.scroll_into_view_if_needed()
+            if not await is_active(icon):
+                # 説明欄の内容が切り替わるまで待つ
+                before = await read_text(page, content_selector)
+                await icon.evaluate("el => el.click()")
+                await wait_for_text_change(page, content_selector, before, timeout=WAIT_TIMEOUT, label="skill")
 
             tabs = page.locator(f"{skill_section_selector} .home-common-module-tabs-item")
-            tab_count = tabs.count()
+            tab_count = await tabs.count()
             
             # print(f"    Skill {i+1}: Found {tab_count} tabs")
 
@@ -141,208 +216,370 @@ def extract_skills_interactively(page):
             for j in loop_range:
                 if tab_count > 0:
                     tab = tabs.nth(j)
-                    tab.scroll_into_view_if_needed()
-                    tab.evaluate("el => el.click()")
-                    time.sleep(0.5)
-
-                content_area = page.locator(f"{skill_section_selector} .tw-overflow-hidden.tw-rounded-xl")
+                    if not await is_active(tab):
+                        await tab.scroll_into_view_if_needed()
+                        before = await read_text(page, content_selector)
+                        await tab.evaluate("el => el.click()")
+                        # タブが選択状態になり、説明欄の内容が切り替わるまで待つ
+                        await wait_for_active(tab, timeout=WAIT_TIMEOUT, label="tab")
+                        await wait_for_text_change(page, content_selector, before, timeout=WAIT_TIMEOUT, label="tab-text")
+
+                content_area = page.locator(content_selector)
                 
                 title_locator = content_area.locator(".tw-text-lg-pc").first
-                if title_locator.count() > 0:
-                    title = title_locator.text_content().strip()
+                if await title_locator.count() > 0:
+                    title = (await title_locator.text_content()).strip()
                 else:
                     title = f"Skill_{i}_{j}"
 
                 desc_locator = content_area.locator(".ProseMirror").first
-                if desc_locator.count() > 0:
-                    description = desc_locator.inner_text().replace("\n", " ")
+                if await desc_locator.count() > 0:
+                    description = (await desc_locator.inner_text()).replace("\n", " ")
                     extracted_items.append({
                         "type": "SkillDesc",
                         "skill_idx": i,
                         "tab_idx": j,
                         "title": title,
-                        "value": description
+                        "value": description,
+                        "html": await desc_locator.inner_html()
                     })
         except Exception as e:
             print(f"    Error extracting skill {i}-{j}: {e}")
 
     return extracted_items
 
-def extract_terms_batch_with_ai(model, pairs_batch):
+async def capture_entry_json(page, url, label):
+    """ページを開き、SPA が取得するエントリ詳細APIのJSONを横取りして返す (取得できなければ None)"""
+    try:
+        async with page.expect_response(is_entry_api_response, timeout=30000) as response_info:
+            await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        response = await response_info.value
+        return await response.json()
+    except Exception as e:
+        print(f"  [{label}] Entry API response not captured: {e}")
+        return None
+
+async def load_language_data(context, entry_id, lang_label, limiter, mode="api", record_dir=None):
     """
-    複数の日英テキストペアから用語を一括抽出する (バッチ処理)
-    pairs_batch: [{"en_title":..., "en_desc":..., "ja_title":..., "ja_desc":...}, ...]
+    1言語分のキャラクターページを開き、心象映画とスキルのデータを抽出する (失敗時は None)
+    mode="api" ではエントリ詳細APIのレスポンスから抽出し、空だったセクションだけを DOM から抽出する
     """
-    # 入力データをJSON文字列化してプロンプトに埋め込む
-    input_json = json.dumps(pairs_batch, ensure_ascii=False, indent=2)
-    
-    prompt = f"""
-    あなたはプロのゲーム翻訳者です。以下のJSONデータは、ゲームのスキルや能力に関する日英のテキストペアのリストです。
-    これらを分析し、全てのテキストから重要な用語ペアを抽出して、単一のJSONリストにまとめてください。
-
-    抽出対象:
-    - 固有名詞 (キャラクター名、地名など)
-    - スキル名 (Basic Attack, EX Special Attackなど)
-    - ステータス・属性名 (Ice Attribute, Dazeなど)
-    - ゲーム内キーワード
-    
-    ルール:
-    1. 英語側で <strong> タグなどで強調されている単語は特に重要です。
-    2. 日本語側はカギ括弧『』や「」で囲まれていることが多いですが、囲まれていない場合もあります。
-    3. 文脈から判断して、意味が対応する最小単位の語句を抜き出してください。
-    4. 一般的な動詞や接続詞は除外してください。
-    5. 結果は必ず JSON形式のリスト [{{ "en": "...", "ja": "..." }}, ...] のみを出力してください。
-    6. Markdownのコードブロックは使用しないでください。
-
-    Input Data (JSON):
-    {input_json}
-    """
-    
+    lang = LANGUAGES[lang_label]
+    label = f"{entry_id} {lang_label}"
+    url = ENTRY_URL.format(entry_id=entry_id, lang=lang)
+    print(f"  [{label}] Loading page...")
+    page = await context.new_page()
+    network = NetworkTracker(page)
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text.strip())
+        await limiter.acquire()
+        t0 = time.perf_counter()
+        sections = {"mindscape": [], "skills": []}
+        if mode == "api":
+            payload = await capture_entry_json(page, url, label)
+            if payload is not None:
+                record_timing("entry-api", time.perf_counter() - t0)
+                if record_dir:
+                    save_fixture(record_dir, entry_id, lang, payload)
+                sections = parse_entry_sections(payload)
+                if all(sections.values()):
+                    print(f"  [{label}] Extracted {len(sections['mindscape'])} mindscapes and "
+                          f"{len(sections['skills'])} skill tabs from entry API")
+                    return sections["mindscape"] + sections["skills"]
+                missing = [name for name, records in sections.items() if not records]
+                print(f"  [{label}] No {'/'.join(missing)} data in entry API, falling back to DOM for them")
+            await page.wait_for_load_state("networkidle", timeout=30000)
+        else:
+            await page.goto(url, wait_until="networkidle", timeout=30000)
+        record_timing("page-load", time.perf_counter() - t0)
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        # スクロールで発生した遅延読み込みの通信が落ち着くまで待つ
+        await network.wait_settled(timeout=WAIT_TIMEOUT)
+        
+        # 存在チェック (404などの場合)
+        if await page.locator("text=Page Not Found").count() > 0:
+            print(f"  {label} Page not found, skipping.")
+            return None
+
+        # APIから抽出できたセクションはそのまま使い、空のセクションだけ画面から抽出する
+        mindscape = sections["mindscape"] or extract_mindscape_from_html(await page.content())
+        skills = sections["skills"] or await extract_skills_interactively(page)
+        return mindscape + skills
     except Exception as e:
-        print(f"  AI Error: {e}")
-        return []
+        print(f"  Error loading {label} page: {e}")
+        return None
+    finally:
+        await page.close()
 
-def scrape_official_wiki(target_id=None):
-    all_pairs = []
-    
-    # APIキーチェック
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        print("エラー: GOOGLE_API_KEY が設定されていません。")
-        return
+def match_language_data(entry_id, data_jp, data_en):
+    """
+    日英のデータを突き合わせて [英語タイトル, 英語説明, 日本語タイトル, 日本語説明, 英語説明のHTML, 日本語説明のHTML]
+    のリストを返す (HTMLを保存していない古いデータでは空文字)
+    """
+    pairs = []
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        
-        if target_id:
-            entry_ids = [str(target_id)]
-            print(f"Targeting specific character ID: {target_id}")
+    # Mindscape
+    m_jp = [d for d in data_jp if d["type"] == "MindscapeDesc"]
+    m_en = [d for d in data_en if d["type"] == "MindscapeDesc"]
+    count_m = min(len(m_jp), len(m_en))
+    
+    mindscape_names = []
+    for i in range(count_m):
+        pairs.append([m_en[i]["title"], m_en[i]["value"], m_jp[i]["title"], m_jp[i]["value"],
+                      m_en[i].get("html") or "", m_jp[i].get("html") or ""])
+        mindscape_names.append(m_jp[i]["title"])
+
+    # Skills (インデックスベースのマッチング)
+    # 英語版で欠損があっても、(skill_idx, tab_idx) が一致するものだけをペアにする
+    s_jp_map = {(d["skill_idx"], d["tab_idx"]): d for d in data_jp if d["type"] == "SkillDesc"}
+    s_en_map = {(d["skill_idx"], d["tab_idx"]): d for d in data_en if d["type"] == "SkillDesc"}
+    
+    skill_names = []
+    
+    # 日本語データを基準にループ
+    for key, item_jp in s_jp_map.items():
+        if key in s_en_map:
+            item_en = s_en_map[key]
+            pairs.append([item_en["title"], item_en["value"], item_jp["title"], item_jp["value"],
+                          item_en.get("html") or "", item_jp.get("html") or ""])
+            skill_names.append(f"{item_jp['title']}(S{key[0]+1}-T{key[1]+1})")
         else:
-            entry_ids = get_character_entry_ids(browser)
-            print(f"Total characters found: {len(entry_ids)}")
-        
-        # 各キャラクターの詳細ページを処理
-        for index, entry_id in enumerate(entry_ids):
-            print(f"Processing Character [{index+1}/{len(entry_ids)}] ID: {entry_id}")
-            
-            url_en = f"https://wiki.hoyolab.com/pc/zzz/entry/{entry_id}?lang=en-us"
-            url_jp = f"https://wiki.hoyolab.com/pc/zzz/entry/{entry_id}?lang=ja-jp"
-            
-            # --- 日本語版 ---
-            print("  [JP] Loading page...") # ログ追加
-            page_jp = browser.new_page()
+            # 英語版に存在しない場合はスキップし、警告を出す
+            print(f"  [{entry_id}] Warning: No matching EN skill found for JP: {item_jp['title']} (S{key[0]+1}-T{key[1]+1})")
+
+    print(f"  [{entry_id}] Collected {count_m} mindscapes: {', '.join(mindscape_names)}")
+    print(f"  [{entry_id}] Collected {len(skill_names)} skills: {', '.join(skill_names)}")
+    return pairs
+
+async def scrape_entry(context, entry_id, limiter, mode, record_dir):
+    """1キャラクターの日本語版・英語版ページを同時に読み込み、(日本語のレコード, 英語のレコード) を返す"""
+    data_jp, data_en = await asyncio.gather(
+        load_language_data(context, entry_id, "JP", limiter, mode, record_dir),
+        load_language_data(context, entry_id, "EN", limiter, mode, record_dir),
+    )
+    if data_jp is None or data_en is None:
+        return None
+    return data_jp, data_en
+
+async def scrape_worker(browser, blocker, work_queue, result_queue, limiter, mode, record_dir):
+    """
+    専用のブラウザコンテキストで、キューから取り出したキャラクターを順に処理する。
+    取り出したキャラクターは、途中で例外が起きても必ず結果 (失敗なら None) を結果キューに入れる
+    """
+    context = await new_context(browser, blocker)
+    try:
+        while True:
             try:
-                page_jp.goto(url_jp, wait_until="networkidle", timeout=30000)
-                page_jp.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(2)
-                
-                # 存在チェック (404などの場合)
-                if page_jp.locator("text=Page Not Found").count() > 0:
-                    print("  JP Page not found, skipping.")
-                    page_jp.close()
-                    continue
-
-                mindscape_jp = extract_mindscape_from_html(page_jp.content())
-                skills_jp = extract_skills_interactively(page_jp)
-                data_jp = mindscape_jp + skills_jp
-            except Exception as e:
-                print(f"  Error loading JP page: {e}")
-                page_jp.close()
-                continue
-            page_jp.close()
-
-            # --- 英語版 ---
-            print("  [EN] Loading page...") # ログ追加
-            page_en = browser.new_page()
+                entry_id = work_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            data = None
             try:
-                page_en.goto(url_en, wait_until="networkidle", timeout=30000)
-                page_en.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(2)
-                
-                if page_en.locator("text=Page Not Found").count() > 0:
-                    print("  EN Page not found, skipping.")
-                    page_en.close()
-                    continue
-
-                mindscape_en = extract_mindscape_from_html(page_en.content())
-                skills_en = extract_skills_interactively(page_en)
-                data_en = mindscape_en + skills_en
+                data = await scrape_entry(context, entry_id, limiter, mode, record_dir)
             except Exception as e:
-                print(f"  Error loading EN page: {e}")
-                page_en.close()
-                continue
-            page_en.close()
+                print(f"  [{entry_id}] Error: {e}")
+            finally:
+                result_queue.put_nowait((entry_id, data))
+    finally:
+        await context.close()
+
+async def supervise_workers(workers, result_queue):
+    """全ワーカーの終了を待ち、異常終了したものを報告してから結果キューに終了の印 (None) を入れる"""
+    for result in await asyncio.gather(*workers, return_exceptions=True):
+        if isinstance(result, BaseException):
+            print(f"  Worker stopped with an error: {result!r}")
+    result_queue.put_nowait(None)
+
+async def scrape_to_store(store, target_id=None, mode="api", record_dir=None, block_resources=True, refresh=False):
+    """
+    全キャラクター (または指定ID) のうち、ストアにないものと古くなったものだけを並列に取得してストアに保存する。
+    対象のエントリIDのリストを返す。
+    """
+    langs = list(LANGUAGES.values())
+    if target_id:
+        entry_ids = [str(target_id)]
+        print(f"Targeting specific character ID: {target_id}")
+        if not refresh and store.is_fresh(entry_ids[0], langs, STORE_MAX_AGE):
+            print("  Already in the store and fresh, skipping (use --refresh to fetch again).")
+            return entry_ids
+
+    blocker = create_blocker(config, enabled=block_resources)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        
+        if not target_id:
+            entry_ids = await get_character_entry_ids(browser, blocker)
+            print(f"Total characters found: {len(entry_ids)}")
 
-            # --- 突き合わせ ---
-            # Mindscape
-            m_jp = [d for d in data_jp if d["type"] == "MindscapeDesc"]
-            m_en = [d for d in data_en if d["type"] == "MindscapeDesc"]
-            count_m = min(len(m_jp), len(m_en))
-            
-            mindscape_names = []
-            for i in range(count_m):
-                all_pairs.append([m_en[i]["title"], m_en[i]["value"], m_jp[i]["title"], m_jp[i]["value"]])
-                mindscape_names.append(m_jp[i]["title"])
-
-            # Skills (インデックスベースのマッチング)
-            # 英語版で欠損があっても、(skill_idx, tab_idx) が一致するものだけをペアにする
-            s_jp_map = {(d["skill_idx"], d["tab_idx"]): d for d in data_jp if d["type"] == "SkillDesc"}
-            s_en_map = {(d["skill_idx"], d["tab_idx"]): d for d in data_en if d["type"] == "SkillDesc"}
-            
-            skill_names = []
-            
-            # 日本語データを基準にループ
-            for key, item_jp in s_jp_map.items():
-                if key in s_en_map:
-                    item_en = s_en_map[key]
-                    all_pairs.append([item_en["title"], item_en["value"], item_jp["title"], item_jp["value"]])
-                    skill_names.append(f"{item_jp['title']}(S{key[0]+1}-T{key[1]+1})")
-                else:
-                    # 英語版に存在しない場合はスキップし、警告を出す
-                    print(f"  Warning: No matching EN skill found for JP: {item_jp['title']} (S{key[0]+1}-T{key[1]+1})")
+        stale_ids = [entry_id for entry_id in entry_ids
+                     if refresh or not store.is_fresh(entry_id, langs, STORE_MAX_AGE)]
+        if len(stale_ids) < len(entry_ids):
+            print(f"Skipping {len(entry_ids) - len(stale_ids)} characters already in the store.")
+
+        work_queue = asyncio.Queue()
+        for entry_id in stale_ids:
+            work_queue.put_nowait(entry_id)
+        result_queue = asyncio.Queue()
+        limiter = AsyncTokenBucket(DETAIL_RATE, capacity=2)
+
+        worker_count = max(1, min(DETAIL_WORKERS, len(stale_ids)))
+        print(f"Processing {len(stale_ids)} characters with {worker_count} workers...")
+        workers = [asyncio.create_task(scrape_worker(browser, blocker, work_queue, result_queue, limiter,
+                                                     mode, record_dir))
+                   for _ in range(worker_count)]
+        supervisor = asyncio.create_task(supervise_workers(workers, result_queue))
+
+        # 結果キューから完了した順に受け取り、キャラクターごとにストアへ保存する
+        # (全ワーカーが終了すると None が届く。ワーカーが異常終了しても待ち続けない)
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0}
+        done = 0
+        while (item := await result_queue.get()) is not None:
+            entry_id, data = item
+            done += 1
+            if data is None:
+                counts["failed"] += 1
+                status = "failed"
+            else:
+                statuses = {store.put(entry_id, LANGUAGES[label], records)
+                            for label, records in zip(("JP", "EN"), data)}
+                status = next(s for s in ("new", "changed", "unchanged") if s in statuses)
+                counts[status] += 1
+            print(f"Processed Character [{done}/{len(stale_ids)}] ID: {entry_id} ({status})")
+
+        await supervisor
+        # 異常終了したワーカーが取り出さなかったキャラクターは失敗として数える
+        while not work_queue.empty():
+            entry_id = work_queue.get_nowait()
+            counts["failed"] += 1
+            print(f"Not processed: ID {entry_id} (no worker left)")
+        await browser.close()
+
+    print(f"ストア: 新規 {counts['new']}件 / 変更 {counts['changed']}件 / 変更なし {counts['unchanged']}件 / "
+          f"失敗 {counts['failed']}件 / スキップ {len(entry_ids) - len(stale_ids)}件")
+    print_wait_stats()
+    blocker.print_stats()
+    blocker.close()
+
+    return entry_ids
+
+def collect_pairs_from_store(store, entry_ids):
+    """ストアに保存した日英のレコードを突き合わせ、キャラクター順に並べたペアのリストを返す"""
+    all_pairs = []
+    # HTML を保存する前の形式のデータでは、<strong> と『』「」の対応付け (ルール抽出) ができない
+    outdated_ids = store.outdated_entry_ids()
+    outdated = [entry_id for entry_id in entry_ids if entry_id in outdated_ids]
+    if outdated:
+        print(f"  Warning: {len(outdated)} characters were stored in an old format without description HTML "
+              f"({', '.join(outdated)}); rule extraction cannot use them. "
+              f"Run without --from-store to fetch them again.")
+    for entry_id in entry_ids:
+        data_jp = store.get(entry_id, LANGUAGES["JP"])
+        data_en = store.get(entry_id, LANGUAGES["EN"])
+        if data_jp is None or data_en is None:
+            print(f"  [{entry_id}] Not in the store, skipping.")
+            continue
+        all_pairs.extend(match_language_data(entry_id, data_jp, data_en))
+    return all_pairs
 
-            print(f"  Collected {count_m} mindscapes: {', '.join(mindscape_names)}")
-            print(f"  Collected {len(skill_names)} skills: {', '.join(skill_names)}")
-            
-            # 中間保存 (万が一途中で止まった時のため)
-            if (index + 1) % 5 == 0:
-                print("  Saving intermediate results...")
-                with open("resource/zzz_pairs_temp.csv", "w", encoding="utf-8", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerows(all_pairs)
+def collect_pairs_from_fixtures(fixture_dir, target_id=None):
+    """記録済みのAPIレスポンスだけからペアを作る (ブラウザ・ネットワークを使わない)"""
+    entry_ids = [str(target_id)] if target_id else fixture_entry_ids(fixture_dir)
+    print(f"Loading {len(entry_ids)} characters from fixtures in {fixture_dir}...")
+    all_pairs = []
+    for entry_id in entry_ids:
+        payload_jp = load_fixture(fixture_dir, entry_id, LANGUAGES["JP"])
+        payload_en = load_fixture(fixture_dir, entry_id, LANGUAGES["EN"])
+        if payload_jp is None or payload_en is None:
+            print(f"  [{entry_id}] Fixture missing, skipping.")
+            continue
+        all_pairs.extend(match_language_data(
+            entry_id, parse_entry_page_json(payload_jp), parse_entry_page_json(payload_en)))
+    return all_pairs
 
-        browser.close()
+def load_known_terms(all_pairs):
+    """
+    ルールで対応付けた用語を確かめるための既知の組 (term_key の集合) を返す。
+    スキル・心象映画のタイトルの組と、他のソースの用語集の組を使う
+    """
+    known = {term_key(pair[0], pair[2]) for pair in all_pairs}
+    for key in KNOWN_GLOSSARY_KEYS:
+        path = config.get(key)
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("en") and row.get("ja"):
+                    known.add(term_key(row["en"], row["ja"]))
+    return known
+
+def scrape_official_wiki(target_id=None, mode="api", fixture_dir=None, record_dir=None, pairs_output=None,
+                         block_resources=True, from_store=False, refresh=False, use_rules=True):
+    # APIキーチェック
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key and not pairs_output:
+        print("エラー: GOOGLE_API_KEY が設定されていません。")
+        return
+
+    if fixture_dir:
+        all_pairs = collect_pairs_from_fixtures(fixture_dir, target_id)
+    else:
+        store = DetailStore(STORE_FILE)
+        try:
+            if from_store:
+                # ブラウザを使わず、ストアに保存済みのデータだけで用語抽出を行う
+                entry_ids = [str(target_id)] if target_id else store.entry_ids()
+                print(f"Loading {len(entry_ids)} characters from {STORE_FILE}...")
+            else:
+                entry_ids = asyncio.run(scrape_to_store(store, target_id, mode, record_dir,
+                                                        block_resources, refresh))
+            all_pairs = collect_pairs_from_store(store, entry_ids)
+        finally:
+            store.close()
 
     if not all_pairs:
         print("データが見つかりませんでした。")
         return
 
+    if pairs_output:
+        # AIによる抽出を行わず、収集したペアをCSVに出力する
+        with open(pairs_output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["en_title", "en_desc", "ja_title", "ja_desc", "en_html", "ja_html"])
+            writer.writerows(all_pairs)
+        print(f"保存完了: {pairs_output} ({len(all_pairs)}ペア)")
+        return
+
     # --- 3. AIによる用語抽出処理 (バッチ処理) ---
-    BATCH_SIZE = 12  # 一度に処理するペア数
-    
     # 処理対象のデータを整形
     process_items = []
     final_glossary = []
+    # 用語ごとの抽出元 (タイトル / ルール / LLM)
+    sources = []
+    skipped_by_rules = 0
+    unconfirmed_by_rules = 0
+    known_terms = load_known_terms(all_pairs) if use_rules else set()
 
     for pair in all_pairs:
-        en_title, en_desc, ja_title, ja_desc = pair
+        en_title, en_desc, ja_title, ja_desc, en_html, ja_html = pair
         
         # タイトル自体も用語として追加
         final_glossary.append({"en": en_title, "ja": ja_title})
+        sources.append("title")
         
         if len(en_desc) < 5 or len(ja_desc) < 5:
             continue
+
+        if use_rules:
+            # <strong> と『』「」を位置・順序で対応付け、タイトルや他の用語集で確かめられた組だけを採用する。
+            # すべて対応付き、かつすべて確かめられた説明文だけをLLMに送らない (それ以外はLLMで確かめる)
+            terms, complete = align_terms(en_html, ja_desc)
+            confirmed = confirmed_terms(terms, known_terms)
+            final_glossary.extend(confirmed)
+            sources.extend(["rule"] * len(confirmed))
+            if complete and len(confirmed) == len(terms):
+                skipped_by_rules += 1
+                continue
+            if complete:
+                unconfirmed_by_rules += 1
             
         process_items.append({
             "en_title": en_title,
@@ -351,19 +588,24 @@ def scrape_official_wiki(target_id=None):
             "ja_desc": ja_desc
         })
 
-    print(f"Gemini APIを使用して {len(process_items)} 件のテキストペアから用語を抽出します (Batch Size: {BATCH_SIZE})...")
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    # バッチループ
-    for i in tqdm(range(0, len(process_items), BATCH_SIZE)):
-        batch = process_items[i : i + BATCH_SIZE]
-        terms = extract_terms_batch_with_ai(model, batch)
-        if terms:
-            final_glossary.extend(terms)
+    if use_rules:
+        print(f"ルールで用語を対応付けて確かめた説明文 {skipped_by_rules}件はLLMに送りません "
+              f"(対応付いたが既知の組で確かめられなかった {unconfirmed_by_rules}件はLLMに送ります)")
+    print(f"Gemini APIを使用して {len(process_items)} 件のテキストペアから用語を抽出します "
+          f"(1リクエストあたり約 {AI_BATCH_TOKENS} トークンまで)...")
+    if process_items:
+        gemini_client.configure(api_key, GEMINI_ENDPOINT)
+        model = genai.GenerativeModel(MODEL_NAME)
         
-        # レート制限回避のための待機
-        time.sleep(2.0)
+        cache = AICache(AI_CACHE_FILE)
+        try:
+            for terms in extract_terms(model, MODEL_NAME, process_items, cache, workers=GEMINI_WORKERS,
+                                       rpm=GEMINI_RPM, tpm=GEMINI_TPM, token_budget=AI_BATCH_TOKENS):
+                final_glossary.extend(terms)
+                sources.extend(["llm"] * len(terms))
+        finally:
+            cache.print_stats()
+            cache.close()
 
     # --- 4. CSV保存 ---
     if final_glossary:
@@ -371,7 +613,8 @@ def scrape_official_wiki(target_id=None):
         
         unique_glossary = []
         seen = set()
-        for item in final_glossary:
+        source_counts = {"title": 0, "rule": 0, "llm": 0}
+        for item, source in zip(final_glossary, sources):
             en_term = item.get("en", "").strip()
             ja_term = item.get("ja", "").strip()
             
@@ -382,6 +625,12 @@ def scrape_official_wiki(target_id=None):
             if pair not in seen:
                 unique_glossary.append(pair)
                 seen.add(pair)
+                source_counts[source] += 1
+
+        total = max(len(unique_glossary), 1)
+        print("用語の抽出元: " + " / ".join(
+            f"{label} {source_counts[key]}件 ({source_counts[key] * 100 / total:.1f}%)"
+            for key, label in (("title", "タイトル"), ("rule", "ルール"), ("llm", "LLM"))))
 
         with open(OUTPUT_FILE, "w", encoding="utf-8", newline="") as f:
             writer = csv.writer(f)
@@ -389,16 +638,31 @@ def scrape_official_wiki(target_id=None):
             writer.writerows(unique_glossary)
         
         print(f"保存完了: {OUTPUT_FILE} ({len(unique_glossary)}ペア)")
+        columnar = glossary_io.write_columnar_rows(unique_glossary, OUTPUT_FILE, "detail",
+                                                   {"source_counts": source_counts})
+        if columnar:
+            print(f"列指向ファイル: {columnar}")
     else:
         print("用語が見つかりませんでした。")
 
 if __name__ == "__main__":
-    # コマンドライン引数でID
-    if len(sys.argv) > 1:
-        try:
-            target_id = int(sys.argv[1])
-            scrape_official_wiki(target_id)
-        except ValueError:
-            print("無効なIDが指定されました。")
-    else:
-        scrape_official_wiki()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="公式HoYoWikiからキャラクターの用語を抽出する")
+    parser.add_argument("entry_id", nargs="?", type=int, help="処理するキャラクターのID (省略時は全キャラクター)")
+    parser.add_argument("--extract", choices=["api", "dom"], default="api",
+                        help="api: エントリ詳細APIのレスポンスから抽出 (失敗時はDOM) / dom: 画面を操作して抽出")
+    parser.add_argument("--record", metavar="DIR", help="取得したAPIレスポンスをフィクスチャとして保存する")
+    parser.add_argument("--fixtures", metavar="DIR", help="ブラウザを使わず、保存したフィクスチャから抽出する")
+    parser.add_argument("--pairs-only", metavar="CSV",
+                        help="AIによる用語抽出を行わず、収集した日英ペアを指定したCSVに出力する")
+    parser.add_argument("--no-block", action="store_true",
+                        help="画像・フォント・外部ホストの遮断とJS/CSSのキャッシュを行わない (転送量の比較用)")
+    parser.add_argument("--from-store", action="store_true",
+                        help="ページを取得せず、ストアに保存済みのデータだけで用語抽出を行う")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ストアのデータが新しくても取得し直す")
+    parser.add_argument("--no-rules", action="store_true",
+                        help="<strong> と『』「」の対応付けによる事前抽出を行わず、すべての説明文をLLMに送る")
+    args = parser.parse_args()
+    scrape_official_wiki(args.entry_id, args.extract, args.fixtures, args.record, args.pairs_only,
+                         block_resources=not args.no_block, from_store=args.from_store, refresh=args.refresh,
+                         use_rules=not args.no_rules)
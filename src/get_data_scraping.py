@@ -1,43 +1,38 @@
-import time
+import argparse
 import csv
-import requests
+import json
 import yaml
 import os
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlencode
 
-# ベースURL
+import glossary_io
+from fetcher import create_fetcher
+from html_parsers import extract_allpages, extract_language_rows, resolve_backend
+from get_data_xml import find_templates, clean_wikitext, expand_templates
+
+# ベースURL (data.yml の scraping_base_url で変更可。ローカルのテスト用サーバーを指定する場合など)
 BASE_URL = "https://zenless-zone-zero.fandom.com"
 
 # WebからAllPagesのURLリストを取得する (全ページ対応版)
-def get_page_urls_from_web():
+def get_page_urls_from_web(fetcher, base_url=BASE_URL, parser="html.parser"):
     # 最初のページ
-    current_url = "https://zenless-zone-zero.fandom.com/wiki/Special:AllPages"
+    current_url = urljoin(base_url, "/wiki/Special:AllPages")
     all_urls = []
     
     while current_url:
         try:
             print(f"Fetching AllPages list from: {current_url}")
-            response = requests.get(current_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 1. 現在のページのリストから記事URLを抽出
-            chunk_ul = soup.find('ul', class_='mw-allpages-chunk')
-            if chunk_ul:
-                links = chunk_ul.find_all('a')
-                for link in links:
-                    href = link.get('href')
-                    if href:
-                        full_url = urljoin(BASE_URL, href)
-                        all_urls.append(full_url)
-            
+            response = fetcher.get(current_url)
+
+            # 1. 現在のページのリスト (ul.mw-allpages-chunk) から記事URLを抽出
             # 2. "Next page" のリンクを探して次へ遷移する
-            next_link = soup.find('a', string=lambda text: text and "Next page" in text)
+            hrefs, next_href = extract_allpages(response.text, parser)
+            for href in hrefs:
+                full_url = urljoin(base_url, href)
+                all_urls.append(full_url)
 
-            if next_link:
-                next_href = next_link.get('href')
-                current_url = urljoin(BASE_URL, next_href)
+            if next_href:
+                current_url = urljoin(base_url, next_href)
             else:
                 print("No 'Next page' link found. Reached the last page.")
                 current_url = None
@@ -48,53 +43,279 @@ def get_page_urls_from_web():
 
     return all_urls
 
-# 個別のページから日英の名称を抽出する
-def extract_names_from_url(url):
-    try:
-        print(f"Fetching: {url}")
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+# 個別のページのHTMLから日英の名称を抽出する
+def extract_names_from_html(html, parser="html.parser"):
+    english_name = None
+    japanese_name = None
+
+    # <table class="article-table alternating-colors-table"> の各行 (言語, 名称) を調べる
+    tables = extract_language_rows(html, parser)
+    
+    for rows in tables:
+        for lang, name in rows:
+            if lang == "English":
+                english_name = name
+            elif lang == "Japanese":
+                japanese_name = name
         
+        # 両方見つかったらループを抜ける
+        if english_name and japanese_name:
+            break
+    
+    # テーブルでEnglishが見つかり、Japaneseが見つからない場合 -> 日本語に英語名を適用
+    if english_name and not japanese_name:
+        japanese_name = english_name
+
+    # Englishが見つからない場合（テーブルがない、またはテーブルに情報がない） -> ページタイトルを両方に適用
+    if not english_name:
         english_name = None
         japanese_name = None
 
-        # <table class="article-table alternating-colors-table"> を探す
-        tables = soup.find_all('table', class_='article-table alternating-colors-table')
-        
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows:
-                cols = row.find_all(['th', 'td'])
-                if len(cols) >= 2:
-                    lang = cols[0].get_text(strip=True)
-                    name = cols[1].get_text(strip=True)
-                    
-                    if lang == "English":
-                        english_name = name
-                    elif lang == "Japanese":
-                        japanese_name = name
-            
-            # 両方見つかったらループを抜ける
-            if english_name and japanese_name:
-                break
-        
-        # テーブルでEnglishが見つかり、Japaneseが見つからない場合 -> 日本語に英語名を適用
-        if english_name and not japanese_name:
-            japanese_name = english_name
+    return english_name, japanese_name
+
+# MediaWiki API で一度に取得するタイトル数 (匿名ユーザーの上限は50)
+API_BATCH_SIZE = 50
 
-        # Englishが見つからない場合（テーブルがない、またはテーブルに情報がない） -> ページタイトルを両方に適用
-        if not english_name:
-            english_name = None
-            japanese_name = None
+def _api_url(api_url, params):
+    query = dict(params, format="json", formatversion="2")
+    return f"{api_url}?{urlencode(query)}"
 
-        return english_name, japanese_name
+# MediaWiki API (list=allpages) から記事タイトルの一覧を取得する
+def get_page_titles_from_api(fetcher, api_url):
+    titles = []
+    params = {
+        "action": "query",
+        "list": "allpages",
+        "apnamespace": "0",
+        "apfilterredir": "nonredirects",
+        "aplimit": "max",
+    }
 
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
+    while True:
+        try:
+            print(f"Fetching allpages from API ({len(titles)} titles so far)")
+            data = fetcher.get(_api_url(api_url, params)).json()
+        except Exception as e:
+            print(f"Error fetching allpages: {e}")
+            break
+
+        titles.extend(page["title"] for page in data.get("query", {}).get("allpages", []))
+
+        # continue パラメータがあれば続きを取得する
+        if "continue" not in data:
+            break
+        params.update(data["continue"])
+
+    return titles
+
+def parse_revisions_response(data):
+    """prop=revisions のレスポンスから {タイトル: ウィキテキスト} を作る"""
+    texts = {}
+    query = data.get("query", {})
+    for page in query.get("pages", []):
+        revisions = page.get("revisions") or []
+        if revisions:
+            texts[page["title"]] = revisions[0].get("slots", {}).get("main", {}).get("content")
+
+    # 正規化されたタイトルは元のタイトルでも引けるようにする
+    for item in query.get("normalized", []):
+        if item["to"] in texts:
+            texts[item["from"]] = texts[item["to"]]
+    return texts
+
+def fetch_revisions(fetcher, api_url, params, data):
+    """
+    prop=revisions の最初のレスポンス data から continue をたどって残りを取得し、{タイトル: ウィキテキスト} を返す。
+    本文が長いと一部のページの revisions は続きのレスポンスで返るため、すべてのレスポンスをまとめてから解析する
+    """
+    pages = []
+    normalized = []
+    seen = set()
+    while True:
+        query = data.get("query", {})
+        pages.extend(query.get("pages", []))
+        normalized.extend(query.get("normalized", []))
+        if "continue" not in data:
+            break
+        key = json.dumps(data["continue"], sort_keys=True)
+        if key in seen:
+            raise ValueError(f"continue が進みません: {data['continue']}")
+        seen.add(key)
+        data = fetcher.get(_api_url(api_url, dict(params, **data["continue"]))).json()
+    return parse_revisions_response({"query": {"pages": pages, "normalized": normalized}})
+
+# ウィキテキストの Other Languages テンプレートから日英の名称を抽出する
+def extract_names_from_wikitext(title, text):
+    if not text:
+        return None, None
+
+    template = find_templates(text, ["Other Languages"]).get("Other Languages")
+    if template is None:
         return None, None
 
+    # 記事の言語表と同じく、English が未指定ならページタイトル、Japanese が未指定なら英語名を使う
+    # (ルビなどのネストしたテンプレートは、言語表に表示される文字列に展開する)
+    english_name = clean_wikitext(expand_templates(template.params.get("en"))) or title
+    japanese_name = clean_wikitext(expand_templates(template.params.get("ja"))) or english_name
+    return english_name, japanese_name
+
+def iter_names_html(fetcher, urls, parser="html.parser"):
+    """記事のHTMLを1ページずつ取得し、(URL, (英語名, 日本語名), 例外) をURLリストの順序で返す"""
+    yield from fetcher.fetch_all(urls, lambda url, response: extract_names_from_html(response.text, parser))
+
+def iter_names_api(fetcher, api_url, titles):
+    """
+    MediaWiki API で複数記事のウィキテキストをまとめて取得し、
+    (タイトル, (英語名, 日本語名), 例外) をタイトル一覧の順序で返す。
+    続き (continue) の取得に失敗したバッチは、全ページを例外付きで返す (次回に再試行される)。
+    """
+    batches = [titles[i:i + API_BATCH_SIZE] for i in range(0, len(titles), API_BATCH_SIZE)]
+    batch_params = [{
+        "action": "query",
+        "prop": "revisions",
+        "rvprop": "content",
+        "rvslots": "main",
+        "titles": "|".join(batch),
+    } for batch in batches]
+    urls = [_api_url(api_url, params) for params in batch_params]
+    params_by_url = dict(zip(urls, batch_params))
+
+    def handler(url, response):
+        return fetch_revisions(fetcher, api_url, params_by_url[url], response.json())
+
+    results = fetcher.fetch_all(urls, handler)
+    for batch, (_, texts, error) in zip(batches, results):
+        for title in batch:
+            if error is not None:
+                yield title, None, error
+            else:
+                yield title, extract_names_from_wikitext(title, texts.get(title)), None
+
+# ジャーナルの形式を変更した場合は上げる (古い形式のジャーナルからは再開しない)
+# 2: done のページに CSV に書き込んだ行を記録する
+JOURNAL_VERSION = 2
+
+class CrawlJournal:
+    """
+    クロールの進捗を JSON Lines で記録するジャーナル。
+    1行目に列挙したページ一覧 (plan)、以降に各ページの処理結果 (done / no-translation / error) と
+    done のページが CSV に書き込んだ行を追記し、全ページの処理が終わると complete を書き込む。
+    中断後の再実行では未処理とエラーのページだけを処理する。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = None
+        self.backend = None
+        self.pages = []
+        self.status = {}
+        self.rows = {}
+        self.complete = False
+
+    def load(self):
+        """既存のジャーナルを読み込む (途中で切れた最終行は無視する)"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record["type"] == "plan":
+                    self.version = record.get("version")
+                    self.backend = record["backend"]
+                    self.pages = record["pages"]
+                    self.status = {}
+                    self.rows = {}
+                    self.complete = False
+                elif record["type"] == "page":
+                    self.status[record["page"]] = record["status"]
+                    if record.get("row"):
+                        self.rows[record["page"]] = tuple(record["row"])
+                elif record["type"] == "complete":
+                    self.complete = True
+        return bool(self.pages)
+
+    def can_resume(self, backend):
+        return bool(self.pages) and not self.complete and self.backend == backend \
+            and self.version == JOURNAL_VERSION
+
+    def saved_rows(self):
+        """記録済みのページが CSV に書き込んだ (en, ja) を、書き込んだ順に返す"""
+        return list(self.rows.values())
+
+    def pending_pages(self):
+        """未処理またはエラーになったページを元の順序で返す"""
+        return [p for p in self.pages if self.status.get(p) not in ("done", "no-translation")]
+
+    def start(self, backend, pages):
+        self.version = JOURNAL_VERSION
+        self.backend = backend
+        self.pages = pages
+        self.status = {}
+        self.rows = {}
+        self.complete = False
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"type": "plan", "version": JOURNAL_VERSION, "backend": backend, "pages": pages},
+                               ensure_ascii=False) + "\n")
+
+    def record(self, entries):
+        """(ページ, 状態, CSV に書き込んだ行または None) のリストを追記する"""
+        if not entries:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for page, status, row in entries:
+                self.status[page] = status
+                record = {"type": "page", "page": page, "status": status}
+                if row:
+                    self.rows[page] = tuple(row)
+                    record["row"] = list(row)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def finish(self):
+        """エラーのページが残っていなければ完了を記録する (次回は新しくクロールする)"""
+        if any(status == "error" for status in self.status.values()):
+            return False
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"type": "complete"}) + "\n")
+        self.complete = True
+        return True
+
+def read_existing_rows(path):
+    """出力済みCSVの (en, ja) をファイルの順に読み込む"""
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 2:
+                rows.append((row[0], row[1]))
+    return rows
+
+def write_rows(path, rows):
+    """(en, ja) の行で CSV を書き直す (一時ファイルに書いてから置き換える)"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['en', 'ja'])
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
 def main():
+    parser = argparse.ArgumentParser(description="Fandom Wikiから日英の名称をスクレイピングする")
+    parser.add_argument("--backend", choices=["html", "api"], default="html",
+                        help="html: 記事HTMLを1ページずつ取得 / api: MediaWiki APIでまとめて取得")
+    parser.add_argument("--offline", action="store_true",
+                        help="ネットワークに接続せず、HTTPキャッシュ (http_cache) の内容だけで処理する")
+    parser.add_argument("--restart", action="store_true",
+                        help="中断したクロールを再開せず、ページ一覧の取得からやり直す")
+    parser.add_argument("--parser", default=None,
+                        help="HTMLパーサー (auto / html.parser / lxml / selectolax。省略時は data.yml の html_parser)")
+    args = parser.parse_args()
+
     # data.yml から設定を読み込む
     config = {}
     if os.path.exists("resource/data.yml"):
@@ -106,9 +327,28 @@ def main():
         print("エラー: data.yml に scraping_output の設定がありません。")
         return
 
-    # WebからURLリストを取得
-    urls = get_page_urls_from_web()
-    print(f"Found {len(urls)} pages.")
+    # セッション共有・並列取得・ホスト単位のレート制限を行うフェッチャー
+    # http_cache を設定している場合は、前回のレスポンスを条件付きリクエストで再利用する
+    try:
+        fetcher = create_fetcher(config, offline=args.offline)
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return
+    try:
+        crawl(fetcher, config, args, output_file)
+    finally:
+        fetcher.close()
+
+def crawl(fetcher, config, args, output_file):
+    """ページ一覧を取得 (または中断したクロールを再開) し、各ページの名称を CSV に保存する"""
+    base_url = config.get("scraping_base_url", BASE_URL)
+    try:
+        html_parser = resolve_backend(args.parser or config.get("html_parser", "auto"))
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return
+    print(f"HTML parser: {html_parser}")
+    api_url = config.get("scraping_api_url", urljoin(base_url, "/api.php"))
 
     # 出力パスの調整: 設定値にディレクトリが含まれていない場合は resource/ を付与
     if os.path.dirname(output_file):
@@ -118,42 +358,95 @@ def main():
 
     print(f"Output file: {save_path}")
 
-    # CSVファイルを書き込みモードで開き、ヘッダーを書き込む
-    with open(save_path, 'w', encoding='utf-8', newline='') as f:
+    # 前回のクロールが途中で終わっていれば、ジャーナルから再開する
+    journal = CrawlJournal(config.get("scraping_journal", "resource/scraping_journal.jsonl"))
+    resume = not args.restart and journal.load() and journal.can_resume(args.backend) \
+        and os.path.exists(save_path)
+
+    if resume:
+        pages = journal.pending_pages()
+        saved_rows = journal.saved_rows()
+        print(f"Resuming crawl: {len(pages)} of {len(journal.pages)} pages remaining "
+              f"({len(saved_rows)} rows already saved).")
+        # ジャーナルに記録する前に中断したバッチの行は、そのページを取得し直すため CSV から除く
+        # (行の内容で重複を除くと、別のページの同じ行まで失われる)
+        on_disk = read_existing_rows(save_path)
+        if on_disk != saved_rows:
+            write_rows(save_path, saved_rows)
+            print(f"Rewrote {save_path} from the journal ({len(on_disk)} -> {len(saved_rows)} rows).")
+    else:
+        if args.backend == "api":
+            pages = get_page_titles_from_api(fetcher, api_url)
+        else:
+            pages = get_page_urls_from_web(fetcher, base_url, html_parser)
+        print(f"Found {len(pages)} pages.")
+        journal.start(args.backend, pages)
+        saved_rows = []
+
+    # 新規クロールは書き込みモード、再開時は追記モードで開く
+    with open(save_path, 'a' if resume else 'w', encoding='utf-8', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['en', 'ja'])
+        if not resume:
+            writer.writerow(['en', 'ja'])
         
         buffer = []
+        journal_buffer = []
         total_saved = 0
         BATCH_SIZE = 30
 
-        for url in urls:
-            en, ja = extract_names_from_url(url)
+        # 並列に取得・解析し、結果はページ一覧の順序で受け取る
+        if args.backend == "api":
+            results = iter_names_api(fetcher, api_url, pages)
+        else:
+            results = iter_names_html(fetcher, pages, html_parser)
+
+        for page, names, error in results:
+            print(f"Fetched: {page}")
+            if error is not None:
+                print(f"Error fetching {page}: {error}")
+                journal_buffer.append((page, "error", None))
+                names = (None, None)
+            en, ja = names
             
             if en and ja:
                 print(f"  Found: EN={en}, JA={ja}")
                 buffer.append([en, ja])
+                journal_buffer.append((page, "done", (en, ja)))
             else:
                 print("  Skipping: Translation not found.")
+                if error is None:
+                    journal_buffer.append((page, "no-translation", None))
             
-            # バッファが溜まったら書き込む
+            # バッファが溜まったら書き込む (CSVに書き込んでからジャーナルに記録する)
             if len(buffer) >= BATCH_SIZE:
                 writer.writerows(buffer)
+                saved_rows.extend(map(tuple, buffer))
                 total_saved += len(buffer)
                 print(f"  -> Saved batch of {len(buffer)} items (Total: {total_saved})")
                 buffer = [] # バッファをクリア
                 f.flush()   # ディスクへの書き込みを確実にする
-
-            # サーバー負荷軽減のため待機
-            #time.sleep(0.5)
+                journal.record(journal_buffer)
+                journal_buffer = []
 
         # ループ終了後、残りのデータを書き込む
         if buffer:
             writer.writerows(buffer)
+            saved_rows.extend(map(tuple, buffer))
             total_saved += len(buffer)
             print(f"  -> Saved remaining {len(buffer)} items")
+        f.flush()
+        journal.record(journal_buffer)
     
+    fetcher.print_stats()
     print(f"Saved total {total_saved} items to {save_path}")
+    # 後段 (combine_glossary.py) が読む列指向ファイル (CSV は再開と手での編集用に残す)
+    columnar = glossary_io.write_columnar_rows(saved_rows, save_path, "scraping", {"backend": args.backend})
+    if columnar:
+        print(f"Saved columnar copy to {columnar}")
+
+    if not journal.finish():
+        failed = sum(1 for status in journal.status.values() if status == "error")
+        print(f"{failed} pages failed. Run again to retry only those pages.")
 
 if __name__== "__main__":
-    main()
\ No newline at end of file
+    main()
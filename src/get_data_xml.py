@@ -1,54 +1,163 @@
 import xml.etree.ElementTree as ET
+import argparse
+import bz2
 import csv
+import gzip
+import io
+import json
 import re
 import os
+import time
 import yaml
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import glossary_io
 
-def get_template_content(text, template_name):
+# テンプレート・内部リンクの区切りとなるトークン
+_WIKITEXT_TOKEN_RE = re.compile(r'\{\{|\}\}|\[\[|\]\]|\|')
+
+Template = namedtuple('Template', ['name', 'params', 'start', 'end'])
+
+def _normalize_template_name(name):
+    """テンプレート名を比較用に正規化する (大文字小文字・空白・アンダースコアの揺れを吸収)"""
+    return ' '.join(name.replace('_', ' ').split()).lower()
+
+@lru_cache(maxsize=64)
+def _template_name_pattern(template_names):
+    """指定テンプレートの開始位置 {{名前| / {{名前}} を探す正規表現を作る"""
+    alternatives = ['[\\s_]+'.join(re.escape(w) for w in name.split()) for name in template_names]
+    return re.compile(r'\{\{\s*(' + '|'.join(alternatives) + r')\s*[|}]', re.IGNORECASE)
+
+def _split_params(text, start, end, pipes):
+    """テンプレート本体を最上位の | 位置で分割し、(名前, パラメータ辞書) を返す"""
+    bounds = [start + 2] + [p + 1 for p in pipes]
+    stops = pipes + [end - 2]
+
+    name = text[bounds[0]:stops[0]].strip()
+    params = {}
+    position = 0
+    for seg_start, seg_end in zip(bounds[1:], stops[1:]):
+        part = text[seg_start:seg_end]
+        eq = part.find('=')
+        # ネストしたテンプレートやリンクの中の = はキーの区切りとみなさない
+        if eq >= 0 and '{{' not in part[:eq] and '[[' not in part[:eq]:
+            params[part[:eq].strip()] = part[eq + 1:].strip()
+        else:
+            position += 1
+            params[str(position)] = part
+    return name, params
+
+def _scan_templates(text, pos=0, first_only=False):
     """
-    テキストから指定されたテンプレートの中身を抽出する。
-    ネストされた {{ }} に対応するため、単純な正規表現ではなく括弧のバランスをカウントします。
+    pos 以降を1回走査し、最上位のテンプレートの (開始位置, 終了位置, 最上位の|の位置) を返す。
+    {{ }} と [[ ]] の対応をスタックで追跡するため、ネストしたテンプレートや
+    [[リンク|表示名]] 内の | はパラメータの区切りとして扱わない。
+    first_only の場合は最初のテンプレートが閉じた時点で走査を打ち切る。
     """
-    pattern = re.compile(r'\{\{\s*' + re.escape(template_name) + r'\s*[|}]', re.IGNORECASE)
-    match = pattern.search(text)
-    if not match:
-        return None
-    
-    start_pos = match.start()
-    balance = 0
-    i = start_pos
-    length = len(text)
-    
-    while i < length:
-        if text[i:i+2] == '{{':
-            balance += 1
-            i += 2
+    stack = []
+    found = []
+    for m in _WIKITEXT_TOKEN_RE.finditer(text, pos):
+        token = m.group()
+        if token == '|':
+            if len(stack) == 1 and stack[0][0] == '{':
+                stack[0][2].append(m.start())
+        elif token == '{{':
+            stack.append(('{', m.start(), []))
+        elif token == '[[':
+            stack.append(('[', m.start(), None))
+        elif token == '}}':
+            # テンプレート内で閉じられていないリンクは破棄する
+            while stack and stack[-1][0] != '{':
+                stack.pop()
+            if stack:
+                _, start, pipes = stack.pop()
+                if not stack:
+                    found.append((start, m.end(), pipes))
+                    if first_only:
+                        break
+        elif stack and stack[-1][0] == '[':
+            stack.pop()
+    return found
+
+def tokenize_templates(text):
+    """
+    ページ本文を1回走査し、最上位のテンプレートを出現順に Template のリストで返す。
+    ネストしたテンプレートは親テンプレートのパラメータ値にそのまま含まれる。
+    """
+    templates = []
+    for start, end, pipes in _scan_templates(text):
+        name, params = _split_params(text, start, end, pipes)
+        templates.append(Template(name, params, start, end))
+    return templates
+
+def find_templates(text, template_names):
+    """
+    指定された複数のテンプレートを1回の走査でまとめて取得する。
+    例: find_templates(text, ["Other Languages", "Infobox Agent"])
+        -> {"Other Languages": Template(...), "Infobox Agent": Template(...)}
+    各テンプレートは最初に出現したものを返し、見つからないものはキーに含めない。
+    対象テンプレートの開始位置へは正規表現で直接移動し、
+    トークンの走査はそのテンプレートが閉じるまでに限定する。
+    """
+    wanted = {_normalize_template_name(n): n for n in template_names}
+    pattern = _template_name_pattern(tuple(template_names))
+    result = {}
+    pos = 0
+    while len(result) < len(wanted):
+        m = pattern.search(text, pos)
+        if not m:
+            break
+        pos = m.end()
+        key = wanted[_normalize_template_name(m.group(1))]
+        if key in result:
             continue
-        elif text[i:i+2] == '}}':
-            balance -= 1
-            i += 2
-            if balance == 0:
-                return text[start_pos:i]
+        spans = _scan_templates(text, m.start(), first_only=True)
+        if not spans:
             continue
-        i += 1
-    return None
+        start, end, pipes = spans[0]
+        name, params = _split_params(text, start, end, pipes)
+        result[key] = Template(name, params, start, end)
+    return result
+
+# 親文字 (1番目の引数) だけを表示上の文字列とするルビのテンプレート
+RUBY_TEMPLATES = {'ruby', 'rubi', 'furigana'}
+
+def expand_templates(text):
+    """
+    パラメータ値に含まれるテンプレートを表示上の文字列に展開する。
+    ルビは親文字だけを残し、{{!}} は | にし、それ以外のテンプレートは取り除く
+    """
+    if not text or '{{' not in text:
+        return text
+    parts = []
+    pos = 0
+    for template in tokenize_templates(text):
+        parts.append(text[pos:template.start])
+        name = _normalize_template_name(template.name)
+        if name == '!':
+            parts.append('|')
+        elif name in RUBY_TEMPLATES:
+            parts.append(expand_templates(template.params.get('1', '')))
+        pos = template.end
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+def get_template_content(text, template_name):
+    """テキストから指定されたテンプレートを {{ }} を含む文字列として抽出する"""
+    template = find_templates(text, [template_name]).get(template_name)
+    if template is None:
+        return None
+    return text[template.start:template.end]
 
 def parse_template_params(template_text):
     """
     テンプレート文字列からパラメータを辞書形式で抽出する
     例: {{Other Languages|en=Name|ja=名前}} -> {'en': 'Name', 'ja': '名前'}
+    名前のない引数は MediaWiki と同様に '1', '2', ... のキーで格納する。
     """
-    content = template_text[2:-2]
-    
-    params = {}
-    parts = content.split('|')
-    
-    for part in parts:
-        if '=' in part:
-            key, val = part.split('=', 1)
-            params[key.strip()] = val.strip()
-            
-    return params
+    templates = tokenize_templates(template_text)
+    return templates[0].params if templates else {}
 
 def clean_wikitext(text):
     """Wiki記法を除去してプレーンテキストにする"""
@@ -60,7 +169,355 @@ def clean_wikitext(text):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
+def _local_name(tag):
+    """名前空間付きのタグ名 ({uri}page) からローカル名 (page) を取り出す"""
+    return tag.rsplit('}', 1)[-1]
+
+def iter_pages(source):
+    """
+    XMLダンプを逐次解析し、記事名前空間 (ns=0) のページを1件ずつ辞書で返す。
+    返す辞書: {'id': ページID, 'title': タイトル, 'revision': 版ID, 'sha1': 版のSHA1, 'text': 本文}
+    ダンプ全体をElementTreeとして保持せず、処理済みのページ要素は都度破棄するため、
+    ダンプのサイズに関わらずメモリ使用量はほぼ一定になる。
+    """
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+
+    in_page = False
+    in_revision = False
+    in_contributor = False
+    skip = False
+    page = None
+
+    for event, elem in context:
+        tag = _local_name(elem.tag)
+
+        if event == 'start':
+            if tag == 'page':
+                in_page = True
+                skip = False
+                page = {'id': None, 'title': None, 'revision': None, 'sha1': None, 'text': None}
+            elif tag == 'revision':
+                in_revision = True
+            elif tag == 'contributor':
+                in_contributor = True
+            continue
+
+        if not in_page:
+            continue
+
+        if tag == 'title':
+            page['title'] = elem.text
+        elif tag == 'ns':
+            # 記事以外の名前空間は本文を保持せずに読み飛ばす
+            skip = elem.text != '0'
+        elif tag == 'id':
+            if not in_revision:
+                page['id'] = elem.text
+            elif not in_contributor and page['revision'] is None:
+                page['revision'] = elem.text
+        elif tag == 'contributor':
+            in_contributor = False
+        elif tag == 'sha1':
+            if in_revision and page['sha1'] is None:
+                page['sha1'] = elem.text
+        elif tag == 'text':
+            if not skip and page['text'] is None:
+                page['text'] = elem.text
+            elem.clear()
+        elif tag == 'revision':
+            in_revision = False
+        elif tag == 'page':
+            in_page = False
+            if not skip and page['title'] is not None and page['text'] is not None:
+                yield page
+            # 処理済みのページをルートから切り離してメモリを解放する
+            root.clear()
+
+def extract_terms(title, text):
+    """ページ本文の Other Languages テンプレートから日英の用語ペアを抽出する"""
+    templates = find_templates(text, ["Other Languages"])
+    if "Other Languages" not in templates:
+        return []
+
+    params = templates["Other Languages"].params
+
+    # ルビなどのネストしたテンプレートは、言語表に表示される文字列に展開する
+    # (展開して英語が空になる場合は、未指定と同じくページタイトルを使う)
+    clean_ja = clean_wikitext(expand_templates(params.get('ja')))
+    clean_en = clean_wikitext(expand_templates(params.get('en'))) or clean_wikitext(title)
+
+    if clean_ja and clean_en and clean_ja != clean_en:
+        return [{'en': clean_en, 'ja': clean_ja}]
+    return []
+
+# チェックポイントの形式や抽出ロジックを変更した場合は上げる (古い抽出結果を再利用しないため)
+# 2: ネストしたテンプレートを展開するようにした
+CHECKPOINT_VERSION = 2
+
+# 前回抽出時の各ページの版 {ページキー: (版ID, SHA1)}。プロセスプールのワーカーへは initializer で渡す
+_known_revisions = {}
+
+def set_known_revisions(known):
+    global _known_revisions
+    _known_revisions = known
+
+def process_page(page):
+    """
+    1ページを処理して (ページキー, (版ID, SHA1), 抽出結果) を返す。
+    前回の抽出時から版が変わっていないページはテンプレート解析を省略し、抽出結果に None を返す。
+    """
+    key = page['id'] or page['title']
+    signature = (page['revision'], page['sha1'])
+    if signature != (None, None) and _known_revisions.get(key) == signature:
+        return key, signature, None
+    return key, signature, extract_terms(page['title'], page['text'])
+
+def load_checkpoint(checkpoint_file):
+    """前回の抽出結果 {ページキー: {'revision', 'sha1', 'rows'}} を読み込む"""
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return {}
+    try:
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"チェックポイント読み込みエラー: {e}")
+        return {}
+    if data.get('version') != CHECKPOINT_VERSION:
+        print("チェックポイントの形式が古いため、全ページを再抽出します。")
+        return {}
+    return data.get('pages', {})
+
+def save_checkpoint(checkpoint_file, pages):
+    """抽出結果をチェックポイントとして保存する (書き込み途中で壊れないよう一時ファイル経由で置き換える)"""
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': CHECKPOINT_VERSION, 'pages': pages}, f, ensure_ascii=False)
+    os.replace(tmp_file, checkpoint_file)
+
+PAGE_OPEN_TAG = b'<page>'
+PAGE_CLOSE_TAG = b'</page>'
+ROOT_CLOSE_TAG = b'</mediawiki>'
+SHARD_TARGET_BYTES = 32 * 1024 * 1024
+SCAN_CHUNK_BYTES = 1024 * 1024
+
+def _find_bytes(f, pattern, start):
+    """ファイル内で start 以降に最初に現れる pattern の位置を返す (見つからなければ -1)"""
+    overlap = len(pattern) - 1
+    pos = start
+    f.seek(pos)
+    tail = b''
+    while True:
+        chunk = f.read(SCAN_CHUNK_BYTES)
+        if not chunk:
+            return -1
+        data = tail + chunk
+        idx = data.find(pattern)
+        if idx >= 0:
+            return pos - len(tail) + idx
+        tail = data[-overlap:] if overlap else b''
+        pos += len(chunk)
+
+def split_into_shards(xml_file, shard_count):
+    """
+    XMLダンプを <page> 境界で区切ったバイト範囲 (start, end) のリストに分割する。
+    各範囲は完結したページ要素のみを含み、先頭の siteinfo と末尾の閉じタグは含まない。
+    """
+    size = os.path.getsize(xml_file)
+    with open(xml_file, 'rb') as f:
+        first = _find_bytes(f, PAGE_OPEN_TAG, 0)
+        if first < 0:
+            return []
+
+        tail_start = max(first, size - 4096)
+        f.seek(tail_start)
+        close_idx = f.read().rfind(ROOT_CLOSE_TAG)
+        end = tail_start + close_idx if close_idx >= 0 else size
+
+        offsets = [first]
+        for k in range(1, shard_count):
+            approx = first + (end - first) * k // shard_count
+            if approx <= offsets[-1]:
+                continue
+            offset = _find_bytes(f, PAGE_OPEN_TAG, approx)
+            if offset < 0 or offset >= end:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+        offsets.append(end)
+
+    return list(zip(offsets[:-1], offsets[1:]))
+
+def open_dump(xml_file):
+    """拡張子に応じて XML / .xml.gz / .xml.bz2 のダンプをストリームとして開く"""
+    if xml_file.endswith('.gz'):
+        return gzip.open(xml_file, 'rb')
+    if xml_file.endswith('.bz2'):
+        return bz2.open(xml_file, 'rb')
+    return open(xml_file, 'rb')
+
+def find_multistream_index(xml_file, index_file=None):
+    """bz2 multistream ダンプに対応するインデックスファイルを探す"""
+    if index_file:
+        return index_file if os.path.exists(index_file) else None
+    if not xml_file.endswith('.xml.bz2'):
+        return None
+    base = xml_file[:-len('.xml.bz2')]
+    for candidate in (base + '-index.txt.bz2', base + '-index.txt'):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def read_stream_offsets(index_file):
+    """インデックス (offset:page_id:title 形式) から各bz2ストリームの開始位置を読み込む"""
+    opener = bz2.open if index_file.endswith('.bz2') else open
+    offsets = set()
+    with opener(index_file, 'rt', encoding='utf-8') as f:
+        for line in f:
+            offset, _, _ = line.partition(':')
+            if offset.strip():
+                offsets.add(int(offset))
+    return sorted(offsets)
+
+def split_into_stream_groups(xml_file, offsets, group_count):
+    """bz2ストリームの境界を保ったまま、連続するストリームを group_count 個程度のバイト範囲にまとめる"""
+    size = os.path.getsize(xml_file)
+    bounds = offsets + [size]
+    target = max((size - offsets[0]) // max(group_count, 1), 1)
+
+    groups = []
+    start = bounds[0]
+    for offset in bounds[1:]:
+        if offset - start >= target or offset == size:
+            groups.append((start, offset))
+            start = offset
+    return groups
+
+def extract_shard(task):
+    """1つのバイト範囲を解析し、ページごとの処理結果のリストを返す (プロセスプールのワーカー用)"""
+    xml_file, start, end, codec = task
+    with open(xml_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    if codec == 'bz2':
+        # 範囲内の複数のbz2ストリームを連結して展開する
+        data = bz2.decompress(data)
+
+    # 先頭の siteinfo や末尾の閉じタグを除き、ページ要素だけを残す
+    first = data.find(PAGE_OPEN_TAG)
+    last = data.rfind(PAGE_CLOSE_TAG)
+    if first < 0 or last < 0:
+        return []
+    data = data[first:last + len(PAGE_CLOSE_TAG)]
+
+    # ページ要素だけでは整形式にならないため、ダミーのルート要素で包む
+    source = io.BytesIO(b'<mediawiki>' + data + b'</mediawiki>')
+    return [process_page(page) for page in iter_pages(source)]
+
+def plan_parallel_tasks(xml_file, workers, index_file=None):
+    """
+    並列解析用のタスク (xml_file, start, end, codec) のリストを作る。
+    非圧縮のXMLは <page> 境界で、インデックス付きのbz2 multistreamはストリーム境界で分割する。
+    分割できない形式 (gzip やインデックスなしのbz2) の場合は None を返す。
+    """
+    size = os.path.getsize(xml_file)
+    group_count = max(workers * 4, size // SHARD_TARGET_BYTES + 1)
+
+    if xml_file.endswith('.bz2'):
+        index_file = find_multistream_index(xml_file, index_file)
+        if not index_file:
+            return None
+        offsets = read_stream_offsets(index_file)
+        if not offsets:
+            return None
+        groups = split_into_stream_groups(xml_file, offsets, group_count)
+        print(f"bz2ストリームグループ数: {len(groups)} / ワーカー数: {workers}")
+        return [(xml_file, start, end, 'bz2') for start, end in groups]
+
+    if xml_file.endswith('.gz'):
+        return None
+
+    shards = split_into_shards(xml_file, group_count)
+    print(f"シャード数: {len(shards)} / ワーカー数: {workers}")
+    return [(xml_file, start, end, 'xml') for start, end in shards]
+
+def iter_results_serial(xml_file):
+    """ダンプを単一プロセスで逐次解析し、ページごとに処理結果のリストを返す"""
+    with open_dump(xml_file) as f:
+        for page in iter_pages(f):
+            yield [process_page(page)]
+
+def iter_results_parallel(tasks, workers):
+    """
+    タスクをプロセスプールで解析し、タスクごとに処理結果のリストを返す。
+    結果はタスクの並び順 (= ファイル内の出現順) で返すため、逐次実行と同じ順序になる。
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_known_revisions,
+                             initargs=(_known_revisions,)) as executor:
+        for records in executor.map(extract_shard, tasks):
+            yield records
+
+def iter_results(xml_file, workers, index_file=None):
+    if workers > 1:
+        tasks = plan_parallel_tasks(xml_file, workers, index_file)
+        if tasks is not None:
+            return iter_results_parallel(tasks, workers)
+        print("この形式のダンプは分割できないため、逐次解析します。")
+    return iter_results_serial(xml_file)
+
+def collect_rows(results):
+    """処理結果のイテレータを集計し、(総ページ数, 全抽出結果) を返す"""
+    page_count = 0
+    all_rows = []
+    for records in results:
+        for _, _, rows in records:
+            page_count += 1
+            all_rows.extend(rows or [])
+    return page_count, all_rows
+
+def verify_parallel(xml_file, workers, index_file=None):
+    """並列実行の結果が逐次実行の結果と完全に一致するかを検証する"""
+    tasks = plan_parallel_tasks(xml_file, workers, index_file)
+    if tasks is None:
+        print("この形式のダンプは並列解析に対応していないため、検証できません。")
+        return False
+
+    print("逐次実行中...")
+    t0 = time.perf_counter()
+    serial_pages, serial_rows = collect_rows(iter_results_serial(xml_file))
+    serial_time = time.perf_counter() - t0
+
+    print("並列実行中...")
+    t0 = time.perf_counter()
+    parallel_pages, parallel_rows = collect_rows(iter_results_parallel(tasks, workers))
+    parallel_time = time.perf_counter() - t0
+
+    print(f"逐次: {serial_pages}ページ / {len(serial_rows)}件 ({serial_time:.2f}秒)")
+    print(f"並列: {parallel_pages}ページ / {len(parallel_rows)}件 ({parallel_time:.2f}秒)")
+
+    if serial_pages == parallel_pages and serial_rows == parallel_rows:
+        print(f"検証成功: 出力は完全に一致しました (速度比 x{serial_time / parallel_time:.2f})")
+        return True
+
+    for i, (a, b) in enumerate(zip(serial_rows, parallel_rows)):
+        if a != b:
+            print(f"検証失敗: {i}行目が不一致です\n  逐次: {a}\n  並列: {b}")
+            break
+    else:
+        print("検証失敗: ページ数または行数が一致しません")
+    return False
+
 def main():
+    parser = argparse.ArgumentParser(description="Fandom WikiのXMLダンプから日英の用語ペアを抽出する")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="解析に使うプロセス数 (1: 逐次, 0: CPUコア数)")
+    parser.add_argument("--verify", action="store_true",
+                        help="並列実行と逐次実行の出力が一致するかを検証する (CSVは書き出さない)")
+    parser.add_argument("--full", action="store_true",
+                        help="チェックポイントを使わずに全ページを再抽出する")
+    args = parser.parse_args()
+
     config = {}
     if os.path.exists("resource/data.yml"):
         with open("resource/data.yml", "r") as f:
@@ -80,64 +537,91 @@ def main():
         print("data.yml の xml_file の設定を確認してください。")
         return
 
-    print(f"XMLファイルを解析中: {xml_file} ...")
-    
-    try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-    except Exception as e:
-        print(f"XML解析エラー: {e}")
+    # bz2 multistream ダンプのインデックス (省略時は <名前>-index.txt.bz2 を自動検出)
+    index_file = config.get("xml_index")
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    if args.verify:
+        verify_parallel(xml_file, max(workers, 2), index_file)
         return
 
-    m = re.match(r'\{(.*)\}', root.tag)
-    ns = {'mw': m.group(1)} if m else {}
-    
-    pages = root.findall('mw:page', ns) if ns else root.findall('page')
-    print(f"ページ数: {len(pages)}")
+    mode = f"{workers}プロセスで並列解析" if workers > 1 else "逐次解析"
+    print(f"XMLファイルを{mode}中: {xml_file} ...")
 
-    results = []
-    
-    for page in pages:
-        title_elem = page.find('mw:title', ns) if ns else page.find('title')
-        if title_elem is None: continue
-        title = title_elem.text
+    # 前回から版が変わっていないページは、チェックポイントの抽出結果を再利用する
+    checkpoint_file = config.get("xml_checkpoint", "resource/xml_checkpoint.json")
+    checkpoint = {} if args.full else load_checkpoint(checkpoint_file)
+    if checkpoint:
+        print(f"チェックポイントを読み込みました: {len(checkpoint)}ページ")
+    set_known_revisions({key: (entry['revision'], entry['sha1']) for key, entry in checkpoint.items()})
+    new_checkpoint = {}
+    stats = {'new': 0, 'changed': 0, 'unchanged': 0}
 
-        ns_elem = page.find('mw:ns', ns) if ns else page.find('ns')
-        if ns_elem is not None and ns_elem.text != '0':
-            continue
+    FLUSH_INTERVAL = 500
+    page_count = 0
+    term_count = 0
+    flushed_at = 0
+
+    # 解析と並行して抽出結果を一時ファイルへ書き出し、最後まで解析できた場合だけ置き換える
+    # (途中で失敗した場合や用語がなかった場合は前回のCSVを残す)
+    tmp_csv = output_csv + '.tmp'
+    with open(tmp_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['en', 'ja'])
+        writer.writeheader()
+
+        try:
+            for records in iter_results(xml_file, workers, index_file):
+                rows = []
+                for key, (revision, sha1), page_rows in records:
+                    previous = checkpoint.get(key)
+                    if page_rows is None:
+                        stats['unchanged'] += 1
+                        page_rows = [{'en': en, 'ja': ja} for en, ja in previous['rows']]
+                    elif previous is None:
+                        stats['new'] += 1
+                    else:
+                        stats['changed'] += 1
+                    new_checkpoint[key] = {
+                        'revision': revision,
+                        'sha1': sha1,
+                        'rows': [[row['en'], row['ja']] for row in page_rows],
+                    }
+                    rows.extend(page_rows)
+
+                page_count += len(records)
+                if rows:
+                    writer.writerows(rows)
+                    term_count += len(rows)
+                    if term_count - flushed_at >= FLUSH_INTERVAL:
+                        flushed_at = term_count
+                        f.flush()
+                        print(f"  -> {page_count}ページ処理 / {term_count}件抽出")
+        except (ET.ParseError, OSError, EOFError) as e:
+            print(f"XML解析エラー: {e}")
+            failed = True
+        else:
+            failed = False
+
+    if failed or not term_count:
+        os.remove(tmp_csv)
+    else:
+        os.replace(tmp_csv, output_csv)
+    if failed:
+        return
+
+    save_checkpoint(checkpoint_file, new_checkpoint)
+    deleted = sum(1 for key in checkpoint if key not in new_checkpoint)
 
-        revision = page.find('mw:revision', ns) if ns else page.find('revision')
-        if revision is None: continue
-        text_elem = revision.find('mw:text', ns) if ns else revision.find('text')
-        if text_elem is None or text_elem.text is None: continue
-        
-        text = text_elem.text
-
-        ol_template = get_template_content(text, "Other Languages")
-        
-        if ol_template:
-            params = parse_template_params(ol_template)
-            
-            ja_text = params.get('ja')
-            en_text = params.get('en')
-            
-            if not en_text:
-                en_text = title
-            
-            if ja_text and en_text:
-                clean_ja = clean_wikitext(ja_text)
-                clean_en = clean_wikitext(en_text)
-                
-                if clean_ja and clean_ja != clean_en:
-                    results.append({'en': clean_en, 'ja': clean_ja})
-
-    if results:
-        print(f"抽出された用語数: {len(results)}")
-        with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['en', 'ja'])
-            writer.writeheader()
-            writer.writerows(results)
+    print(f"ページ数 (ns=0): {page_count}")
+    print(f"  新規: {stats['new']} / 更新: {stats['changed']} / 削除: {deleted} / 変更なし: {stats['unchanged']}")
+    if term_count:
+        print(f"抽出された用語数: {term_count}")
         print(f"保存完了: {output_csv}")
+        columnar = glossary_io.write_columnar_rows(
+            (row for entry in new_checkpoint.values() for row in entry['rows']), output_csv, "xml",
+            {"xml_file": xml_file})
+        if columnar:
+            print(f"列指向ファイル: {columnar}")
     else:
         print("用語が見つかりませんでした。")
 
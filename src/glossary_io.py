@@ -0,0 +1,169 @@
+"""
+用語集 (en, ja) の段階間の受け渡しに使う列指向の中間ファイル (Arrow IPC / Feather v2) の読み書き。
+CSV と同じ名前で拡張子を .arrow にしたファイルに、スキーマとソースのメタデータを付けて保存する。
+非圧縮・64ビットのオフセット (large_string) で書き出すため、読み込み時はメモリマップでそのまま参照でき、
+pandas の pyarrow を使う文字列型にもコピーせずに変換できる。
+pyarrow がない場合や、CSV の方が新しい (手で編集した) 場合は CSV を読む。
+"""
+
+import csv
+import hashlib
+import json
+import os
+import random
+import time
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+# 2: 文字列の列を large_string にした
+SCHEMA_VERSION = 2
+COLUMNS = ["en", "ja"]
+# メタデータを保存するスキーマのキー
+METADATA_KEY = b"glossary"
+# pandas.read_csv が既定で欠損値とみなす文字列 (行から書き出す場合もこれらは欠損値にし、CSV を読んだ場合と同じ結果にする)
+NULL_VALUES = frozenset(["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                         "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"])
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+def _schema(source, metadata, rows):
+    meta = {"schema_version": SCHEMA_VERSION, "source": source, "rows": rows,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+    meta.update(metadata or {})
+    return pa.schema([pa.field(name, pa.large_string()) for name in COLUMNS],
+                     metadata={METADATA_KEY: json.dumps(meta, ensure_ascii=False)})
+
+def _write_table(table, csv_path, source, metadata):
+    path = columnar_path(csv_path)
+    table = table.select(COLUMNS).cast(_schema(source, metadata, table.num_rows))
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+def write_columnar(df, csv_path, source, metadata=None):
+    """en, ja の DataFrame を列指向ファイルに書き出し、そのパスを返す (pyarrow がなければ None)"""
+    if pa is None:
+        return None
+    table = pa.Table.from_pandas(df[COLUMNS].astype(object), preserve_index=False)
+    return _write_table(table, csv_path, source, metadata)
+
+def write_columnar_rows(rows, csv_path, source, metadata=None):
+    """
+    (en, ja) の行のリストを列指向ファイルに書き出し、そのパスを返す (pyarrow がなければ None)。
+    CSV と同じ行を渡す (CSV を読み直さずに、書き出した行からそのまま作る)
+    """
+    if pa is None:
+        return None
+    columns = {name: [] for name in COLUMNS}
+    for row in rows:
+        for name, value in zip(COLUMNS, row):
+            columns[name].append(None if value is None or value in NULL_VALUES else value)
+    table = pa.table({name: pa.array(values, pa.large_string()) for name, values in columns.items()})
+    return _write_table(table, csv_path, source, metadata)
+
+def input_path(csv_path):
+    """読み込むファイル (列指向ファイルがあり CSV より新しければそちら、それ以外は CSV)"""
+    path = columnar_path(csv_path)
+    if pa is not None and os.path.exists(path) and \
+            (not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        return path
+    return csv_path
+
+def read_table(csv_path):
+    """
+    列指向ファイルをメモリマップで開いた pyarrow.Table を返す (使えない場合は None)。
+    ファイルを閉じても、Table が参照している間はマップされた領域は残る
+    """
+    path = input_path(csv_path)
+    if path == csv_path:
+        return None
+    with pa.memory_map(path, "r") as source:
+        return pa_ipc.open_file(source).read_all()
+
+def _string_dtype():
+    """pyarrow の配列をそのまま使う pandas の文字列型 (欠損値は NaN)。古い pandas で使えなければ None"""
+    try:
+        return pd.StringDtype("pyarrow", na_value=float("nan"))
+    except TypeError:
+        return None
+
+def read_glossary(csv_path):
+    """
+    用語集を en, ja の DataFrame で返す (列指向ファイルを優先し、なければ CSV)。
+    列指向ファイルの文字列はメモリマップした領域を参照したまま pandas の文字列型にする
+    """
+    table = read_table(csv_path)
+    if table is None:
+        return pd.read_csv(csv_path)
+    dtype = _string_dtype()
+    if dtype is None:
+        return table.to_pandas()
+    return table.to_pandas(types_mapper={pa.string(): dtype, pa.large_string(): dtype}.get)
+
+def read_metadata(csv_path):
+    """列指向ファイルのメタデータ (ソース・件数・作成日時など) を返す (なければ None)"""
+    path = input_path(csv_path)
+    if path == csv_path:
+        return None
+    with pa.memory_map(path, "r") as source:
+        metadata = pa_ipc.open_file(source).schema.metadata
+    if not metadata or METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+def content_hash(path):
+    """
+    ファイルの内容のハッシュ。列指向ファイルは列のデータだけから求めるため、
+    作成日時などのメタデータだけが変わった場合は同じ値になる
+    """
+    digest = hashlib.sha256()
+    if pa is None or not path.endswith(".arrow"):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    with pa.memory_map(path, "r") as source:
+        reader = pa_ipc.open_file(source)
+        digest.update(json.dumps([str(field.type) for field in reader.schema]).encode("utf-8"))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            digest.update(batch.num_rows.to_bytes(8, "little"))
+            for column in batch.columns:
+                for buffer in column.buffers():
+                    # 欠損値のない列はビットマップがない。バッファはコピーせずにそのまま渡す
+                    if buffer is None:
+                        digest.update(b"-")
+                        continue
+                    digest.update(len(buffer).to_bytes(8, "little"))
+                    digest.update(buffer)
+    return digest.hexdigest()
+
+def sample_glossary(csv_path, n):
+    """
+    用語集から n 行を無作為に選び、{"en", "ja"} のリストで返す。
+    列指向ファイルでは選んだ行だけを、CSV では1行ずつ読みながら (全体を読み込まずに) 選ぶ
+    """
+    table = read_table(csv_path)
+    if table is not None:
+        indices = sorted(random.sample(range(table.num_rows), min(n, table.num_rows)))
+        return table.take(indices).to_pylist()
+
+    samples = []
+    with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i < n:
+                samples.append(row)
+            else:
+                j = random.randint(0, i)
+                if j < n:
+                    samples[j] = row
+    return [{"en": row["en"], "ja": row["ja"]} for row in samples]
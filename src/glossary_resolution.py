@@ -0,0 +1,72 @@
+import re
+import unicodedata
+
+# 手動追加の用語集のソース名 (元の行は常に優先する)
+MANUAL_SOURCE = "manual"
+# 既定のソースの優先順位 (手動追加以外)
+DEFAULT_PRIORITY = ["detail", "xml", "scraping"]
+
+_SPACE_RE = re.compile(r"\s+")
+
+def clean_spaces(value):
+    """空白の連続を1つにまとめ、前後の空白を除く。文字列以外は空文字"""
+    if not isinstance(value, str):
+        return ""
+    return _SPACE_RE.sub(" ", value).strip()
+
+def normalize_term(value):
+    """比較用に正規化した語 (NFKC で全角英数字などを揃え、空白をまとめる)"""
+    return clean_spaces(unicodedata.normalize("NFKC", value) if isinstance(value, str) else value)
+
+def source_ranks(priority):
+    """ソース名 -> 順位 (小さいほど優先) の辞書。手動追加は常に先頭"""
+    order = [MANUAL_SOURCE] + [name for name in priority if name != MANUAL_SOURCE]
+    return {name: rank for rank, name in enumerate(order)}
+
+def resolve_conflicts(candidates, priority=None):
+    """
+    候補の行 (en, ja, source, variation, order) を正規化した en をキーにまとめ、キーごとに1つの訳を選ぶ。
+    優先順位は「手動追加の元の行 → 元の行 → バリエーション」、その中ではソースの優先順位・
+    同じソース内で多い訳・先に出現した行の順。
+    同じキーになる en の表記はすべて、選ばれた訳を付けて残す。
+    (選ばれた en, ja の DataFrame, 選ばれなかった訳の一覧の DataFrame) を返す
+    """
+    ranks = source_ranks(priority or DEFAULT_PRIORITY)
+    df = candidates.copy()
+    df['key'] = df['en'].map(normalize_term).astype(object)
+    df['en'] = df['en'].map(clean_spaces).astype(object)
+    df['ja'] = df['ja'].map(clean_spaces).astype(object)
+    df = df[(df['key'] != "") & (df['ja'] != "")]
+
+    df['not_manual_base'] = ~((df['source'] == MANUAL_SOURCE) & ~df['variation'])
+    df['source_rank'] = df['source'].map(ranks).fillna(len(ranks))
+    df['count'] = df.groupby(['key', 'source', 'ja'], sort=False)['order'].transform('size')
+    df = df.sort_values(['key', 'not_manual_base', 'variation', 'source_rank', 'count', 'order'],
+                        ascending=[True, True, True, True, False, True], kind='stable')
+
+    winners = df.drop_duplicates('key', keep='first')
+    chosen = winners.set_index('key')
+    # 同じキーになる表記 (全角・半角などの違い) はすべて残し、選ばれた訳を付ける。
+    # 並びは選ばれた行の順で、同じキーの表記は選ばれた行の表記・先に出現した表記の順
+    resolved = df[['en', 'key', 'order']].copy()
+    resolved['winner_order'] = chosen['order'].reindex(resolved['key']).values
+    resolved['is_winner'] = resolved['en'].values == chosen['en'].reindex(resolved['key']).values
+    resolved = (resolved.sort_values(['winner_order', 'is_winner', 'order'], ascending=[True, False, True],
+                                     kind='stable')
+                .drop_duplicates('en'))
+    resolved['ja'] = chosen['ja'].reindex(resolved['key']).values
+    resolved = resolved[['en', 'ja']]
+
+    # 選ばれた訳と異なる訳を、キー・訳・ソースごとに1行で報告する
+    losers = df[df['ja'].values != chosen['ja'].reindex(df['key']).values]
+    conflicts = (losers.groupby(['key', 'ja', 'source', 'variation'], sort=False)
+                 .agg(count=('order', 'size'), first=('order', 'min')).reset_index())
+    conflicts['chosen_ja'] = chosen['ja'].reindex(conflicts['key']).values
+    conflicts['chosen_source'] = chosen['source'].reindex(conflicts['key']).values
+    conflicts['reason'] = ["variant" if variation and not chosen_variation else "priority"
+                           for variation, chosen_variation in
+                           zip(conflicts['variation'], chosen['variation'].reindex(conflicts['key']).values)]
+    conflicts = conflicts.sort_values(['key', 'first'], kind='stable')
+    conflicts = conflicts[['key', 'chosen_ja', 'chosen_source', 'ja', 'source', 'variation', 'count', 'reason']]
+    conflicts = conflicts.rename(columns={'key': 'en', 'ja': 'rejected_ja', 'source': 'rejected_source'})
+    return resolved.reset_index(drop=True), conflicts.reset_index(drop=True)
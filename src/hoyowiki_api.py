@@ -0,0 +1,159 @@
+import json
+import os
+import re
+from bs4 import BeautifulSoup
+
+# SPA がキャラクターページの表示時に呼び出すエントリ詳細API
+# (例: https://sg-wiki-api-static.hoyolab.com/hoyowiki/zzz/wapi/entry_page?entry_page_id=909)
+ENTRY_API_URL = "https://sg-wiki-api-static.hoyolab.com/hoyowiki/zzz/wapi/entry_page"
+ENTRY_API_PATTERN = re.compile(r"/wapi/entry_page\?(?:.*&)?entry_page_id=(\d+)")
+# 一覧ページ (aggregate) がスクロールのたびに呼び出すエントリ一覧API
+ENTRY_LIST_API_PATTERN = re.compile(r"/wapi/get_entry_page_list(?:\?|$)")
+
+# ページ上のセクションID (モジュールの位置_コンポーネントID) と対応するコンポーネント
+MINDSCAPE_SECTION = "4_summaryList"
+SKILL_SECTION = "3_agent_talent"
+
+def is_entry_api_response(response):
+    """エントリ詳細APIへのレスポンスなら True (page.expect_response の判定用)"""
+    return response.request.method == "GET" and ENTRY_API_PATTERN.search(response.url) is not None
+
+def is_entry_list_response(response):
+    """エントリ一覧APIへのレスポンスなら True"""
+    return ENTRY_LIST_API_PATTERN.search(response.url) is not None
+
+def parse_entry_page_list(payload):
+    """エントリ一覧APIのレスポンスから (エントリIDのリスト, 全件数) を返す (全件数が不明なら None)"""
+    if not isinstance(payload, dict) or payload.get("retcode", 0) != 0:
+        return [], None
+    data = payload.get("data") or {}
+    entry_ids = []
+    for item in data.get("list") or []:
+        entry_id = item.get("entry_page_id") or item.get("id")
+        if entry_id is not None and str(entry_id).isdigit():
+            entry_ids.append(str(entry_id))
+    total = data.get("total")
+    return entry_ids, int(total) if str(total).isdigit() else None
+
+def _component_data(component):
+    """コンポーネントの data (JSON文字列の場合はデコード) を返す"""
+    data = component.get("data")
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+def _find_component(modules, section_id):
+    """
+    セクションID に対応するコンポーネントの data を返す。
+    位置が一致するものがなければ、同じコンポーネントIDを持つ最初のものを使う。
+    """
+    position, component_id = section_id.split("_", 1)
+    candidates = []
+    for index, module in enumerate(modules):
+        for component in module.get("components") or []:
+            if component.get("component_id") == component_id:
+                candidates.append((index, component))
+    for index, component in candidates:
+        if str(index) == position:
+            return _component_data(component)
+    return _component_data(candidates[0][1]) if candidates else None
+
+def _html_text(html):
+    """説明文のHTMLを、DOMから取得した場合と同じく空白区切りのテキストにする"""
+    if not html:
+        return ""
+    return BeautifulSoup(html, "html.parser").get_text(separator=" ", strip=True)
+
+def _talent_tabs(skill):
+    """
+    スキルのタブ (段階) のリストを返す。タブは children に入り、ないスキルはスキル自体を1つのタブとみなす
+    (attributes は倍率の表でタブではない)
+    """
+    children = skill.get("children")
+    if isinstance(children, list) and children:
+        return [child for child in children if isinstance(child, dict)]
+    return [skill]
+
+def _mindscape_records(component):
+    """summaryList の list[] (name, desc) から MindscapeDesc のレコードを作る"""
+    records = []
+    for item in (component or {}).get("list") or []:
+        description = _html_text(item.get("desc"))
+        if description:
+            records.append({
+                "type": "MindscapeDesc",
+                "title": (item.get("name") or "Unknown").strip(),
+                "value": description,
+                "html": item.get("desc")
+            })
+    return records
+
+def _skill_records(component):
+    """agent_talent の list[] (title, children[] の title, desc) から SkillDesc のレコードを作る"""
+    records = []
+    for i, skill in enumerate((component or {}).get("list") or []):
+        for j, tab in enumerate(_talent_tabs(skill)):
+            desc_html = tab.get("desc")
+            description = _html_text(desc_html)
+            if not description:
+                continue
+            title = tab.get("title") or skill.get("title")
+            records.append({
+                "type": "SkillDesc",
+                "skill_idx": i,
+                "tab_idx": j,
+                "title": title.strip() if title else f"Skill_{i}_{j}",
+                "value": description,
+                "html": desc_html
+            })
+    return records
+
+def parse_entry_sections(payload):
+    """
+    エントリ詳細APIのレスポンスから、DOM から抽出する場合と同じ形式のレコードをセクションごとに作る。
+    {"mindscape": MindscapeDesc のリスト, "skills": SkillDesc のリスト} を返す (該当データがなければ空リスト)
+    """
+    sections = {"mindscape": [], "skills": []}
+    if not isinstance(payload, dict) or payload.get("retcode", 0) != 0:
+        return sections
+    page = (payload.get("data") or {}).get("page") or {}
+    modules = page.get("modules") or []
+    sections["mindscape"] = _mindscape_records(_find_component(modules, MINDSCAPE_SECTION))
+    sections["skills"] = _skill_records(_find_component(modules, SKILL_SECTION))
+    return sections
+
+def parse_entry_page_json(payload):
+    """エントリ詳細APIのレスポンスから MindscapeDesc / SkillDesc のレコードを作る (該当データがなければ空リスト)"""
+    sections = parse_entry_sections(payload)
+    return sections["mindscape"] + sections["skills"]
+
+# --- 記録したレスポンス (フィクスチャ) ---
+# <ディレクトリ>/<entry_id>_<言語>.json (言語は ja-jp / en-us)
+
+def fixture_path(fixture_dir, entry_id, lang):
+    return os.path.join(fixture_dir, f"{entry_id}_{lang}.json")
+
+def save_fixture(fixture_dir, entry_id, lang, payload):
+    os.makedirs(fixture_dir, exist_ok=True)
+    with open(fixture_path(fixture_dir, entry_id, lang), "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+def load_fixture(fixture_dir, entry_id, lang):
+    """記録したレスポンスを読み込む (なければ None)"""
+    path = fixture_path(fixture_dir, entry_id, lang)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def fixture_entry_ids(fixture_dir):
+    """フィクスチャのあるエントリIDを数値順に返す"""
+    ids = set()
+    for name in os.listdir(fixture_dir):
+        match = re.fullmatch(r"(\d+)_[a-z]{2}-[a-z]{2}\.json", name)
+        if match:
+            ids.add(match.group(1))
+    return sorted(ids, key=int)
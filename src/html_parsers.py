@@ -0,0 +1,151 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+# 言語表 (Other Languages) のテーブル
+LANGUAGE_TABLE_CLASS = "article-table alternating-colors-table"
+# Special:AllPages の記事リスト
+ALLPAGES_CHUNK_CLASS = "mw-allpages-chunk"
+# 名称に含めないルビの読み・括弧 (API の expand_templates と同じく親文字だけを残す)
+RUBY_TAGS = ["rt", "rp"]
+
+# --- html.parser (BeautifulSoup + SoupStrainer) ---
+# 対象の要素だけを木として組み立て、それ以外のタグは読み飛ばす
+
+_LANGUAGE_TABLE_STRAINER = SoupStrainer("table", class_=LANGUAGE_TABLE_CLASS)
+_ALLPAGES_STRAINER = SoupStrainer(["ul", "a"])
+
+def _language_rows_bs4(html, features):
+    soup = BeautifulSoup(html, features, parse_only=_LANGUAGE_TABLE_STRAINER)
+    rows = []
+    for table in soup.find_all("table", class_=LANGUAGE_TABLE_CLASS):
+        for ruby in table.find_all(RUBY_TAGS):
+            ruby.decompose()
+        table_rows = []
+        for row in table.find_all("tr"):
+            cols = row.find_all(["th", "td"])
+            if len(cols) >= 2:
+                table_rows.append((cols[0].get_text(strip=True), cols[1].get_text(strip=True)))
+        rows.append(table_rows)
+    return rows
+
+def _allpages_bs4(html, features):
+    soup = BeautifulSoup(html, features, parse_only=_ALLPAGES_STRAINER)
+    hrefs = []
+    chunk_ul = soup.find("ul", class_=ALLPAGES_CHUNK_CLASS)
+    if chunk_ul:
+        hrefs = [link.get("href") for link in chunk_ul.find_all("a") if link.get("href")]
+    next_link = soup.find("a", string=lambda text: text and "Next page" in text)
+    return hrefs, next_link.get("href") if next_link else None
+
+# --- lxml (libxml2 の HTML パーサー + XPath) ---
+
+def _stripped_text(element):
+    """BeautifulSoup の get_text(strip=True) と同じく、各テキスト片を strip して連結する"""
+    return "".join(t.strip() for t in element.itertext())
+
+def _language_rows_lxml(html):
+    doc = lxml.html.fromstring(html)
+    rows = []
+    for table in doc.xpath(f'//table[@class="{LANGUAGE_TABLE_CLASS}"]'):
+        for ruby in table.xpath(" | ".join(f".//{tag}" for tag in RUBY_TAGS)):
+            ruby.drop_tree()
+        table_rows = []
+        for row in table.iter("tr"):
+            cols = list(row.iter("th", "td"))
+            if len(cols) >= 2:
+                table_rows.append((_stripped_text(cols[0]), _stripped_text(cols[1])))
+        rows.append(table_rows)
+    return rows
+
+def _allpages_lxml(html):
+    doc = lxml.html.fromstring(html)
+    hrefs = []
+    chunks = doc.xpath(f'//ul[contains(concat(" ", normalize-space(@class), " "), " {ALLPAGES_CHUNK_CLASS} ")]')
+    if chunks:
+        hrefs = [href for href in chunks[0].xpath(".//a/@href") if href]
+    next_href = None
+    for link in doc.iter("a"):
+        if "Next page" in link.text_content():
+            next_href = link.get("href")
+            break
+    return hrefs, next_href
+
+# --- selectolax (lexbor の C 実装パーサー。古いバージョンでは modest) ---
+
+def _language_rows_selectolax(html):
+    tree = HTMLParser(html)
+    rows = []
+    for table in tree.css("table"):
+        if table.attributes.get("class") != LANGUAGE_TABLE_CLASS:
+            continue
+        for ruby in table.css(", ".join(RUBY_TAGS)):
+            ruby.decompose()
+        table_rows = []
+        for row in table.css("tr"):
+            cols = row.css("th, td")
+            if len(cols) >= 2:
+                table_rows.append((cols[0].text(strip=True), cols[1].text(strip=True)))
+        rows.append(table_rows)
+    return rows
+
+def _allpages_selectolax(html):
+    tree = HTMLParser(html)
+    hrefs = []
+    chunk_ul = tree.css_first(f"ul.{ALLPAGES_CHUNK_CLASS}")
+    if chunk_ul:
+        hrefs = [a.attributes.get("href") for a in chunk_ul.css("a") if a.attributes.get("href")]
+    next_href = None
+    for link in tree.css("a"):
+        if "Next page" in link.text():
+            next_href = link.attributes.get("href")
+            break
+    return hrefs, next_href
+
+BACKENDS = {
+    "html.parser": (lambda html: _language_rows_bs4(html, "html.parser"),
+                    lambda html: _allpages_bs4(html, "html.parser")),
+    "lxml": (_language_rows_lxml, _allpages_lxml),
+    "selectolax": (_language_rows_selectolax, _allpages_selectolax),
+}
+
+def available_backends():
+    """インストール済みのライブラリで使えるバックエンド名を返す"""
+    names = ["html.parser"]
+    if lxml is not None:
+        names.append("lxml")
+    if HTMLParser is not None:
+        names.append("selectolax")
+    return names
+
+def resolve_backend(name="auto"):
+    """バックエンド名を決める (auto の場合は速いものから順に、使えるものを選ぶ)"""
+    available = available_backends()
+    if name in (None, "auto"):
+        for candidate in ("selectolax", "lxml", "html.parser"):
+            if candidate in available:
+                return candidate
+    if name not in BACKENDS:
+        raise ValueError(f"未知のHTMLパーサーです: {name}")
+    if name not in available:
+        raise ValueError(f"HTMLパーサー {name} はインストールされていません")
+    return name
+
+def extract_language_rows(html, backend):
+    """言語表ごとに (言語, 名称) のリストを返す"""
+    return BACKENDS[backend][0](html)
+
+def extract_allpages(html, backend):
+    """AllPages のHTMLから (記事リンクのhrefリスト, 次ページのhref) を返す"""
+    return BACKENDS[backend][1](html)
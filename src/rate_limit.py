@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    トークンバケット方式のレート制限 (スレッドセーフ)
+    rate: 1秒あたりに補充されるトークン数, capacity: バースト時に連続で消費できる上限
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError(f"レート制限の速度は正の値を指定してください: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self, tokens):
+        """補充した上で tokens を消費できれば 0 を、できなければ貯まるまでの秒数を返す (呼び出し側で排他する)"""
+        self._refill(time.monotonic())
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """トークンが貯まるまで待ってから消費する"""
+        # 上限を超える要求は永久に満たされないため、上限まで貯まった時点で通す
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                wait = self._try_take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+class AsyncTokenBucket(TokenBucket):
+    """asyncio 用のトークンバケット (同一イベントループ内のコルーチン間で共有する)"""
+
+    def __init__(self, rate, capacity=1):
+        super().__init__(rate, capacity)
+        self._async_lock = None
+
+    async def acquire(self, tokens=1):
+        """トークンが貯まるまで待ってから消費する"""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        tokens = min(tokens, self.capacity)
+        # ロックを保持したまま待つことで、待機中のコルーチンを到着順に通す
+        async with self._async_lock:
+            while True:
+                wait = self._try_take(tokens)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    レート制限エラーに応じて速度を変えるトークンバケット (スレッドセーフ)
+    penalize() で速度を半分に落とし、reward() のたびに元の速度まで少しずつ戻す
+    """
+
+    def __init__(self, rate, capacity=1, min_rate=None, recovery=0.05):
+        super().__init__(rate, capacity)
+        self.max_rate = self.rate
+        self.min_rate = float(min_rate) if min_rate else self.rate / 16
+        self.recovery = recovery
+
+    def penalize(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            # 貯まっていた分もすぐには使わせない
+            self._tokens = min(self._tokens, 0)
+
+    def reward(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+class QuotaLimiter:
+    """
+    毎分のリクエスト数 (RPM) とトークン数 (TPM) の両方の上限を守るリミッター (スレッドセーフ)
+    リクエスト数の側はレート制限エラーに応じて速度を変える (penalize / reward)
+    """
+
+    def __init__(self, rpm, tpm=None, burst=1):
+        self.requests = AdaptiveTokenBucket(rpm / 60, capacity=burst)
+        # トークン数は10秒分までのバーストを許す
+        self.tokens = TokenBucket(tpm / 60, capacity=tpm / 6) if tpm else None
+
+    @property
+    def rpm(self):
+        return self.requests.rate * 60
+
+    def acquire(self, tokens=0):
+        """1リクエスト (推定 tokens トークン) を送ってよくなるまで待つ"""
+        if self.tokens is not None and tokens:
+            self.tokens.acquire(tokens)
+        self.requests.acquire()
+
+    def penalize(self):
+        self.requests.penalize()
+
+    def reward(self):
+        self.requests.reward()
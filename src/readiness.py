@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+# 待機のデフォルトのタイムアウト (ミリ秒)
+DEFAULT_TIMEOUT_MS = 5000
+# 通信が途絶えてから「落ち着いた」とみなすまでの時間 (ミリ秒)
+NETWORK_QUIET_MS = 300
+
+# 待機の種類ごとの統計: label -> {"count", "total", "max", "timeouts"}
+WAIT_STATS = {}
+
+def record_timing(label, elapsed, ok=True, context=""):
+    """待機・読み込みの所要時間を記録し、ログに出力する"""
+    stats = WAIT_STATS.setdefault(label, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+    stats["count"] += 1
+    stats["total"] += elapsed
+    stats["max"] = max(stats["max"], elapsed)
+    if not ok:
+        stats["timeouts"] += 1
+    status = "ok" if ok else "timeout"
+    print(f"    wait[{label}] {elapsed * 1000:.0f}ms {status}{' ' + context if context else ''}")
+
+async def _timed(label, awaitable, context=""):
+    """awaitable を待ち、所要時間を記録する。タイムアウトした場合は False を返す"""
+    t0 = time.perf_counter()
+    try:
+        result = await awaitable
+        ok = result is not False
+    except asyncio.TimeoutError:
+        ok = False
+    except Exception as e:
+        # Playwright の TimeoutError は asyncio.TimeoutError を継承していない
+        if type(e).__name__ != "TimeoutError":
+            raise
+        ok = False
+    record_timing(label, time.perf_counter() - t0, ok, context)
+    return ok
+
+# 要素のテキストが指定した値から変わるまで待つ (要素がなければ現れるまで待つ)
+_TEXT_CHANGED_JS = """([selector, before]) => {
+    const el = document.querySelector(selector);
+    return !!el && el.innerText !== before;
+}"""
+
+# タブやアイコンが選択状態かどうか。aria-selected="true"、選択状態を表すクラス名そのもの、
+# または要素自身のクラスの BEM 修飾子 (例: tabs-item と tabs-item--active) だけを選択状態とみなす
+# (active-hover や inactive のような、名前に active を含むだけのクラスは選択状態ではない)
+_IS_ACTIVE_JS = """el => {
+    if (el.getAttribute('aria-selected') === 'true') return true;
+    const classes = el.classList;
+    return ['active', 'selected', 'is-active', 'is-selected'].some(name => classes.contains(name))
+        || ['--active', '--selected'].some(modifier => Array.from(classes).some(
+            name => name.endsWith(modifier) && classes.contains(name.slice(0, -modifier.length))));
+}"""
+
+_SCROLL_GREW_JS = "height => document.body.scrollHeight > height"
+
+async def read_text(page, selector):
+    """selector に一致する最初の要素の innerText を返す (なければ None)"""
+    return await page.evaluate(
+        "selector => { const el = document.querySelector(selector); return el ? el.innerText : null; }",
+        selector,
+    )
+
+async def wait_for_selector(page, selector, timeout=DEFAULT_TIMEOUT_MS, label="selector"):
+    """selector に一致する要素が表示されるまで待つ"""
+    return await _timed(label, page.wait_for_selector(selector, state="visible", timeout=timeout))
+
+async def wait_for_text_change(page, selector, before, timeout=DEFAULT_TIMEOUT_MS, label="text"):
+    """selector の要素のテキストが before から変わるまで待つ"""
+    return await _timed(label, page.wait_for_function(
+        _TEXT_CHANGED_JS, arg=[selector, before], timeout=timeout, polling="raf",
+    ))
+
+async def is_active(locator):
+    """タブやアイコンが選択状態なら True"""
+    return await locator.evaluate(_IS_ACTIVE_JS)
+
+async def wait_for_active(locator, timeout=DEFAULT_TIMEOUT_MS, label="active"):
+    """タブやアイコンが選択状態になるまで待つ"""
+    handle = await locator.element_handle(timeout=timeout)
+    return await _timed(label, locator.page.wait_for_function(
+        _IS_ACTIVE_JS, arg=handle, timeout=timeout, polling="raf",
+    ))
+
+async def wait_for_scroll_growth(page, last_height, timeout=DEFAULT_TIMEOUT_MS, label="scroll"):
+    """ページの高さが last_height より伸びるまで待つ (無限スクロールの追加読み込み)"""
+    return await _timed(label, page.wait_for_function(
+        _SCROLL_GREW_JS, arg=last_height, timeout=timeout, polling="raf",
+    ))
+
+class NetworkTracker:
+    """ページの通信を監視し、実行中のリクエストがなくなって一定時間たつまで待てるようにする"""
+
+    def __init__(self, page):
+        self._pending = set()
+        self._last_activity = time.perf_counter()
+        page.on("request", self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed", self._on_end)
+
+    def _on_start(self, request):
+        self._pending.add(request)
+        self._last_activity = time.perf_counter()
+
+    def _on_end(self, request):
+        self._pending.discard(request)
+        self._last_activity = time.perf_counter()
+
+    async def _settled(self, quiet):
+        while self._pending or time.perf_counter() - self._last_activity < quiet:
+            await asyncio.sleep(0.05)
+
+    async def wait_settled(self, quiet_ms=NETWORK_QUIET_MS, timeout=DEFAULT_TIMEOUT_MS, label="network"):
+        """実行中のリクエストがなく、quiet_ms の間新しい通信もない状態になるまで待つ"""
+        pending = len(self._pending)
+        return await _timed(label, asyncio.wait_for(self._settled(quiet_ms / 1000), timeout / 1000),
+                            context=f"(開始時 {pending}件実行中)" if pending else "")
+
+def print_wait_stats():
+    """待機の種類ごとの回数・平均・最大・タイムアウト数を表示する"""
+    if not WAIT_STATS:
+        return
+    print("待機時間の統計:")
+    for label, stats in sorted(WAIT_STATS.items()):
+        average = stats["total"] / stats["count"] * 1000
+        print(f"  {label:<12}: {stats['count']:5d}回  平均 {average:7.0f}ms  最大 {stats['max'] * 1000:7.0f}ms  "
+              f"タイムアウト {stats['timeouts']}回")
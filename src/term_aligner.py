@@ -0,0 +1,99 @@
+import html as html_lib
+import re
+
+# 英語側で用語を強調しているタグ
+_EN_MARKER_RE = re.compile(r"<(strong|b)\b[^>]*>(.*?)</\1>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+# 日本語側で用語を囲むカギ括弧
+_JA_MARKER_RE = re.compile(r"『([^』]+)』|「([^」]+)」")
+_HAS_WORD_RE = re.compile(r"[^\W\d_]")
+
+# 位置で対応付ける場合に許容する、説明文中の相対位置 (0〜1) の差
+POSITION_TOLERANCE = 0.15
+
+def _clean(text):
+    return " ".join(html_lib.unescape(_TAG_RE.sub("", text)).split())
+
+def _relative_positions(text, matches):
+    """
+    マッチの開始位置を、タグを除き空白をまとめたテキスト上の相対位置 (0〜1) にする。
+    英語 (HTML) と日本語 (テキスト) で同じ基準の位置を比べるため
+    """
+    def plain(part):
+        # 前の部分の末尾の空白は区切りとして残す
+        return re.sub(r"\s+", " ", html_lib.unescape(_TAG_RE.sub("", part))).lstrip()
+    length = len(_clean(text)) or 1
+    return [len(plain(text[:match.start()])) / length for match in matches]
+
+def en_markers(html):
+    """英語の説明文のHTMLから、強調された語句を (相対位置, 語句) のリストで返す (数値だけのものは除く)"""
+    if not html:
+        return []
+    matches = [m for m in _EN_MARKER_RE.finditer(html) if _HAS_WORD_RE.search(_clean(m.group(2)))]
+    return [(position, _clean(m.group(2))) for position, m in zip(_relative_positions(html, matches), matches)]
+
+def ja_markers(text):
+    """日本語の説明文から、『』「」で囲まれた語句を (相対位置, 語句) のリストで返す (数値だけのものは除く)"""
+    if not text:
+        return []
+    matches = [m for m in _JA_MARKER_RE.finditer(text) if _HAS_WORD_RE.search(_clean(m.group(1) or m.group(2)))]
+    return [(position, _clean(m.group(1) or m.group(2)))
+            for position, m in zip(_relative_positions(text, matches), matches)]
+
+def _align_by_position(en, ja):
+    """
+    順序を保ったまま相対位置の差が最小になるように対応付ける (編集距離と同様の動的計画法)。
+    対応付けなかった語句は POSITION_TOLERANCE 分のコストとして扱い、位置の差が許容範囲を超える組は対応付けない。
+    """
+    n, m = len(en), len(ja)
+    gap = POSITION_TOLERANCE
+    cost = [[0.0] * (m + 1) for _ in range(n + 1)]
+    # 各マスの最小コストをどの操作で得たか ("match" / "skip_en" / "skip_ja")
+    back = [[None] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        cost[i][0], back[i][0] = i * gap, "skip_en"
+    for j in range(1, m + 1):
+        cost[0][j], back[0][j] = j * gap, "skip_ja"
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            options = [(cost[i - 1][j] + gap, "skip_en"), (cost[i][j - 1] + gap, "skip_ja")]
+            diff = abs(en[i - 1][0] - ja[j - 1][0])
+            if diff <= POSITION_TOLERANCE:
+                options.insert(0, (cost[i - 1][j - 1] + diff, "match"))
+            cost[i][j], back[i][j] = min(options, key=lambda option: option[0])
+
+    pairs = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        step = back[i][j]
+        if step == "match":
+            pairs.append((en[i - 1][1], ja[j - 1][1]))
+            i, j = i - 1, j - 1
+        elif step == "skip_en":
+            i -= 1
+        else:
+            j -= 1
+    pairs.reverse()
+    return pairs
+
+def align_terms(en_html, ja_text):
+    """
+    英語の強調語句と日本語のカギ括弧の語句を対応付け、({"en", "ja"} のリスト, すべて対応付いたか) を返す。
+    数が同じ場合も含め、説明文中の位置が近いもの同士を順序を保って対応付ける
+    (日本語は語順が入れ替わることが多いため、位置が離れた組は数が同じでも対応付けない)。
+    """
+    en = en_markers(en_html)
+    ja = ja_markers(ja_text)
+    if not en or not ja:
+        return [], False
+    pairs = _align_by_position(en, ja)
+    complete = len(pairs) == len(en) == len(ja)
+    return [{"en": e, "ja": j} for e, j in pairs], complete
+
+def term_key(en, ja):
+    """既知の用語と照合するためのキー (英語は大文字小文字を区別せず、空白をまとめる)"""
+    return " ".join(en.split()).casefold(), " ".join(ja.split())
+
+def confirmed_terms(terms, known):
+    """対応付けた用語のうち、既知の組 (term_key の集合) に含まれるものだけを返す"""
+    return [term for term in terms if term_key(term["en"], term["ja"]) in known]
@@ -0,0 +1,134 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+from gemini_client import call_with_backoff, estimate_tokens, is_quota_error, is_transient_error, parse_json_response
+from rate_limit import QuotaLimiter
+
+EXTRACT_PROMPT = """
+    あなたはプロのゲーム翻訳者です。以下のJSONデータは、ゲームのスキルや能力に関する日英のテキストペアのリストで、各要素に "id" が付いています。
+    要素ごとにテキストを分析し、重要な用語ペアを抽出してください。
+
+    抽出対象:
+    - 固有名詞 (キャラクター名、地名など)
+    - スキル名 (Basic Attack, EX Special Attackなど)
+    - ステータス・属性名 (Ice Attribute, Dazeなど)
+    - ゲーム内キーワード
+
+    ルール:
+    1. 英語側で <strong> タグなどで強調されている単語は特に重要です。
+    2. 日本語側はカギ括弧『』や「」で囲まれていることが多いですが、囲まれていない場合もあります。
+    3. 文脈から判断して、意味が対応する最小単位の語句を抜き出してください。
+    4. 一般的な動詞や接続詞は除外してください。
+    5. 結果は必ず JSON形式のリスト [{{ "id": 入力のid, "terms": [{{ "en": "...", "ja": "..." }}, ...] }}, ...] のみを出力してください。
+       用語がない要素も "terms": [] として必ず含めてください。
+    6. Markdownのコードブロックは使用しないでください。
+
+    Input Data (JSON):
+    {input_json}
+    """
+
+def item_input(item):
+    """キャッシュのキーにするペアの内容 (キーの順序を固定したJSON)"""
+    return json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def pack_batches(items, token_budget, max_items):
+    """
+    (id, ペア) のリストを、入力の推定トークン数が token_budget を超えないようにまとめる。
+    単独で上限を超えるペアはそれだけで1つのバッチにする。
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for item_id, item in items:
+        tokens = estimate_tokens(item_input(item))
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append((item_id, item))
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def extract_terms_batch_with_ai(model, batch):
+    """
+    複数の日英テキストペアから用語を一括抽出し、id -> 用語リスト の辞書を返す
+    batch: [(id, {"en_title":..., "en_desc":..., "ja_title":..., "ja_desc":...}), ...]
+    レート制限・一時的なサーバーのエラーは呼び出し元で再試行するため送出する
+    """
+    # 入力データをJSON文字列化してプロンプトに埋め込む (空白を省いてトークンを節約する)
+    input_json = json.dumps([dict(item, id=item_id) for item_id, item in batch],
+                            ensure_ascii=False, separators=(",", ":"))
+    prompt = EXTRACT_PROMPT.format(input_json=input_json)
+
+    try:
+        response = model.generate_content(prompt)
+        data = parse_json_response(response.text)
+    except Exception as e:
+        if is_quota_error(e) or is_transient_error(e):
+            raise
+        print(f"  AI Error: {e}")
+        return {}
+
+    results = {}
+    for entry in data if isinstance(data, list) else []:
+        if isinstance(entry, dict) and isinstance(entry.get("terms"), list):
+            item_id = entry.get("id")
+            if isinstance(item_id, str) and item_id.isdigit():
+                item_id = int(item_id)
+            results[item_id] = [t for t in entry["terms"] if isinstance(t, dict)]
+    return results
+
+def extract_terms(model, model_name, items, cache, workers=4, rpm=30, tpm=None, token_budget=4000, max_items=40,
+                  retries=5):
+    """
+    ペアのリストから用語を抽出し、ペアごとの用語リストを入力と同じ順序で返す。
+    キャッシュにあるペアは問い合わせず、残りをトークン数の上限までまとめて並列に問い合わせる。
+    結果はバッチが終わった順にキャッシュへ保存するため、中断・失敗しても終わった分は次回に再利用される。
+    レート制限のエラーを受けると、全体の送信速度を落としてから再試行する。
+    """
+    prompt_hash = cache.prompt_hash(EXTRACT_PROMPT)
+    results = [None] * len(items)
+    pending = []
+    cached = cache.get_many([item_input(item) for item in items], prompt_hash, model_name)
+    for i, item in enumerate(items):
+        if item_input(item) in cached:
+            results[i] = cached[item_input(item)]
+        else:
+            pending.append((i, item))
+
+    batches = pack_batches(pending, token_budget, max_items)
+    print(f"用語抽出: キャッシュ利用 {len(items) - len(pending)}件 / 問い合わせ {len(pending)}件 "
+          f"({len(batches)}リクエスト, 並列数 {workers})")
+    limiter = QuotaLimiter(rpm, tpm, burst=workers)
+
+    def run(batch):
+        # 出力は入力と同程度のトークン数になるとみなす
+        tokens = estimate_tokens(EXTRACT_PROMPT) + 2 * sum(estimate_tokens(item_input(item)) for _, item in batch)
+        try:
+            return batch, call_with_backoff(lambda: extract_terms_batch_with_ai(model, batch), limiter, tokens,
+                                            retries)
+        except Exception as e:
+            print(f"  AI Error (rate limit, giving up): {e}")
+            return batch, {}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = [executor.submit(run, batch) for batch in batches]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            batch, terms_by_id = future.result()
+            # 応答に含まれなかったペアはキャッシュせず、次回に再度問い合わせる
+            outputs = {}
+            for item_id, item in batch:
+                if item_id in terms_by_id:
+                    results[item_id] = terms_by_id[item_id]
+                    outputs[item_input(item)] = terms_by_id[item_id]
+            if outputs:
+                cache.put_many(outputs, prompt_hash, model_name)
+    except KeyboardInterrupt:
+        print("\n中断しました。完了したバッチの結果は保存済みです。")
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return [terms or [] for terms in results]
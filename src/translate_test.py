@@ -1,8 +1,8 @@
-import pandas as pd
 import html
 import yaml
 import sys
 from google.cloud import translate_v3 as translate
+import glossary_io
 
 def translate_text(text, project_id, glossary_id, location, source_lang="en", target_lang="ja"):
     """指定されたテキストを用語集を使って翻訳する"""
@@ -46,9 +46,9 @@ def run_glossary_test(
     )
 
     try:
-        df = pd.read_csv("resource/zzz_glossary.csv")
-        sample_size = min(10, len(df))
-        samples = df.sample(n=sample_size)
+        # 全体を読み込まずに10件だけ取り出す (列指向ファイルがあればそちらから)
+        samples = glossary_io.sample_glossary("resource/zzz_glossary.csv", 10)
+        sample_size = len(samples)
     except Exception as e:
         print(f"エラー: CSVファイルの読み込みに失敗しました。\n{e}")
         return
@@ -56,7 +56,7 @@ def run_glossary_test(
     print(f"--- 用語集テスト開始 ({sample_size}件) ---\n")
     success_count = 0
 
-    for index, row in samples.iterrows():
+    for row in samples:
         source_text = row['en']
         expected_text = row['ja']
 
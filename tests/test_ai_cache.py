@@ -0,0 +1,72 @@
+import csv
+import sqlite3
+
+import ai_cache
+
+from ai_cache import LEGACY_PROMPT_HASH, AICache
+
+def write_legacy_csv(path, rows):
+    with open(path, mode='w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+def test_legacy_csv_is_imported_once_under_fixed_hash(tmp_path):
+    csv_path = tmp_path / "ai_cleaning_cache.csv"
+    write_legacy_csv(csv_path, [["用語 Yōgo", "用語"], ["注釈[!]", "注釈"]])
+    cache = AICache(str(tmp_path / "ai_cache.sqlite"))
+    try:
+        assert cache.import_csv(str(csv_path), LEGACY_PROMPT_HASH, "model") == 2
+        # プロンプトが変わっても同じファイルは取り込み直さない
+        assert cache.import_csv(str(csv_path), LEGACY_PROMPT_HASH, "model") == 0
+        assert cache.get_many(["用語 Yōgo"], "new-prompt", "model") == {}
+        assert [group[0] for group in cache.stats()["groups"]] == [LEGACY_PROMPT_HASH]
+    finally:
+        cache.close()
+
+def test_fallback_hashes_carry_results_forward(tmp_path):
+    cache = AICache(str(tmp_path / "ai_cache.sqlite"))
+    try:
+        cache.put_many({"a": "A", "b": "B-legacy"}, LEGACY_PROMPT_HASH, "model")
+        cache.put_many({"b": "B"}, "current", "model")
+        cache.put_many({"c": "C"}, "other", "model")
+
+        results = cache.get_many(["a", "b", "c"], "current", "model", [LEGACY_PROMPT_HASH])
+        # 現在のプロンプトの結果を優先し、互換として指定していないプロンプトの結果は使わない
+        assert results == {"a": "A", "b": "B"}
+        # 引き継いだ結果は現在のプロンプトの結果として保存される
+        assert cache.get_many(["a"], "current", "model") == {"a": "A"}
+    finally:
+        cache.close()
+
+def test_evict_uses_last_use_and_scope(tmp_path, monkeypatch):
+    cache = AICache(str(tmp_path / "ai_cache.sqlite"))
+    try:
+        monkeypatch.setattr(ai_cache.time, "time", lambda: 0.0)
+        cache.put_many({"used": "U", "unused": "N"}, "current", "model")
+        cache.put_many({"other": "O"}, "other", "model")
+        monkeypatch.setattr(ai_cache.time, "time", lambda: 100.0)
+        assert cache.get_many(["used"], "current", "model") == {"used": "U"}
+
+        # 最後に使ってから max_age 秒より経ったもののうち、指定したプロンプト・モデルのものだけを削除する
+        assert cache.evict(50, prompt_hash="current", model="model") == 1
+        assert cache.get_many(["used", "unused"], "current", "model") == {"used": "U"}
+        assert cache.get_many(["other"], "other", "model") == {"other": "O"}
+    finally:
+        cache.close()
+
+def test_old_schema_is_migrated(tmp_path):
+    path = str(tmp_path / "ai_cache.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE ai_cache (input TEXT NOT NULL, prompt_hash TEXT NOT NULL, model TEXT NOT NULL, "
+                 "output TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (input, prompt_hash, model))")
+    conn.execute("INSERT INTO ai_cache VALUES ('a', 'p', 'm', '\"A\"', 10.0)")
+    conn.commit()
+    conn.close()
+
+    cache = AICache(path)
+    try:
+        assert cache.evict(0, prompt_hash="other") == 0
+        assert cache.get_many(["a"], "p", "m") == {"a": "A"}
+        cache.put_many({"b": "B"}, "p", "m")
+        assert cache.stats()["entries"] == 2
+    finally:
+        cache.close()
@@ -0,0 +1,46 @@
+import asyncio
+import types
+
+from browser_resources import AssetCache, ResourceBlocker
+
+class FailingRoute:
+    """fetch が失敗するルート。continue_ も失敗させる場合は continue_error を指定する"""
+
+    def __init__(self, continue_error=None):
+        self.request = types.SimpleNamespace(url="https://example.com/app.js", method="GET", resource_type="script")
+        self.continue_error = continue_error
+        self.calls = []
+
+    async def fetch(self):
+        self.calls.append("fetch")
+        raise ConnectionError("net::ERR_CONNECTION_RESET")
+
+    async def continue_(self):
+        self.calls.append("continue")
+        if self.continue_error:
+            raise self.continue_error
+
+    async def abort(self, error_code=None):
+        self.calls.append("abort")
+
+    async def fulfill(self, **kwargs):
+        self.calls.append("fulfill")
+
+def handle(route, tmp_path):
+    blocker = ResourceBlocker(block_types=[], allowed_hosts=[], cache=AssetCache(str(tmp_path / "assets.sqlite"), 60))
+    try:
+        asyncio.run(blocker._handle(route))
+    finally:
+        blocker.close()
+    return blocker
+
+def test_fetch_error_falls_back_to_continue(tmp_path):
+    route = FailingRoute()
+    blocker = handle(route, tmp_path)
+    assert route.calls == ["fetch", "continue"]
+    assert blocker.stats["fetch_errors"] == 1
+
+def test_fetch_error_aborts_when_continue_fails(tmp_path):
+    route = FailingRoute(continue_error=RuntimeError("Target page, context or browser has been closed"))
+    handle(route, tmp_path)
+    assert route.calls == ["fetch", "continue", "abort"]
@@ -0,0 +1,86 @@
+import random
+import threading
+import types
+
+import google.generativeai as genai
+
+import gemini_client
+from combine_glossary import CLEANING_MODEL, clean_texts_with_ai
+from fake_gemini import FakeGeminiServer, clean_line
+
+TEXTS = [f"用語{i} Yōgo {i}" for i in range(20)] + [f"注釈{i}[!][!]" for i in range(10)] + ["マークII", "BGM、ON"]
+
+def start_server(monkeypatch, **options):
+    """偽の Gemini API を起動し、そこへ接続する (停止は stop_server)"""
+    random.seed(0)
+    server = FakeGeminiServer(("127.0.0.1", 0), **options)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    gemini_client.configure("dummy", f"http://127.0.0.1:{server.server_address[1]}")
+    # 再試行の待ち時間を省く
+    monkeypatch.setattr(gemini_client, "time", types.SimpleNamespace(sleep=lambda seconds: None))
+    return server
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+def clean(batch_size, on_batch):
+    return clean_texts_with_ai(genai.GenerativeModel(CLEANING_MODEL), TEXTS, workers=4, rpm=6000,
+                               batch_size=batch_size, retries=20, on_batch=on_batch)
+
+def test_clean_texts_recovers_from_429(monkeypatch):
+    server = start_server(monkeypatch, fail_rate=0.5)
+    saved = {}
+    try:
+        results = clean(2, saved.update)
+    finally:
+        stop_server(server)
+
+    assert results == {text: clean_line(text) for text in TEXTS}
+    assert results["用語3 Yōgo 3"] == "用語3"
+    # 終わったバッチの結果はすべて on_batch に渡される
+    assert saved == results
+    assert server.rejected > 0
+
+def test_clean_texts_requests_dropped_items_again(monkeypatch):
+    server = start_server(monkeypatch, drop_rate=0.3)
+    saved = {}
+    try:
+        results = clean(8, saved.update)
+    finally:
+        stop_server(server)
+
+    # 1件にしても応答に含まれなかったテキストは結果に含めない (次回に再度問い合わせる)
+    assert results.items() <= {text: clean_line(text) for text in TEXTS}.items()
+    assert saved == results
+    # 欠落した要素は問い合わせ直している
+    assert server.requests > -(-len(TEXTS) // 8)
+
+class ErrorModel:
+    """generate_content のたびに error を送出し、呼ばれた回数を数えるモデル"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        raise self.error
+
+def test_api_error_gives_batch_up_without_bisecting(monkeypatch):
+    monkeypatch.setattr(gemini_client, "time", types.SimpleNamespace(sleep=lambda seconds: None))
+    model = ErrorModel(PermissionError("403 API key not valid"))
+    results = clean_texts_with_ai(model, TEXTS, workers=1, rpm=6000, batch_size=8, retries=3)
+
+    assert results == {}
+    # バッチごとに1回だけ問い合わせる (分割して問い合わせ直さない)
+    assert model.calls == -(-len(TEXTS) // 8)
+
+def test_server_error_retries_whole_batch(monkeypatch):
+    monkeypatch.setattr(gemini_client, "time", types.SimpleNamespace(sleep=lambda seconds: None))
+    model = ErrorModel(RuntimeError("503 Service Unavailable"))
+    results = clean_texts_with_ai(model, TEXTS[:8], workers=1, rpm=6000, batch_size=8, retries=3)
+
+    assert results == {}
+    assert model.calls == 4
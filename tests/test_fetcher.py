@@ -0,0 +1,94 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fetcher import Fetcher, ResponseCache
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """パスごとに最初の fail 回は 429 (Retry-After: 0) を返し、その後は ETag 付きで本文を返す"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            count = server.hits[self.path]
+        if self.path.startswith("/down"):
+            return self._send(503, b"down")
+        if count <= server.fail:
+            return self._send(429, b"slow down", {"Retry-After": "0"})
+        etag = f'"{self.path}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", {"ETag": etag})
+        self._send(200, f"body of {self.path}".encode(), {"ETag": etag})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.hits = {}
+    httpd.fail = 2
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def base_url(httpd):
+    return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+def test_retries_429_then_succeeds(server):
+    fetcher = Fetcher(workers=2, rate=1000, burst=10, retries=3, backoff=0.01)
+    try:
+        response = fetcher.get(base_url(server) + "/page")
+    finally:
+        fetcher.close()
+    assert response.text == "body of /page"
+    assert server.hits["/page"] == 3
+
+def test_gives_up_after_retries(server):
+    fetcher = Fetcher(workers=1, rate=1000, burst=10, retries=2, backoff=0.01)
+    try:
+        with pytest.raises(requests.HTTPError):
+            fetcher.get(base_url(server) + "/down")
+    finally:
+        fetcher.close()
+    assert server.hits["/down"] == 3
+
+def test_fetch_all_keeps_input_order_and_reports_errors(server):
+    fetcher = Fetcher(workers=4, rate=1000, burst=10, retries=3, backoff=0.01)
+    urls = [base_url(server) + f"/p{i}" for i in range(20)] + [base_url(server) + "/down"]
+    try:
+        results = list(fetcher.fetch_all(urls, lambda url, response: response.text))
+    finally:
+        fetcher.close()
+    assert [url for url, _, _ in results] == urls
+    assert [text for _, text, _ in results[:-1]] == [f"body of /p{i}" for i in range(20)]
+    assert isinstance(results[-1][2], requests.HTTPError)
+
+def test_cache_revalidates_with_etag(server, tmp_path):
+    server.fail = 0
+    fetcher = Fetcher(workers=1, rate=1000, burst=10, cache=ResponseCache(str(tmp_path / "cache.sqlite"), 1024 * 1024))
+    try:
+        first = fetcher.get(base_url(server) + "/cached")
+        second = fetcher.get(base_url(server) + "/cached")
+    finally:
+        fetcher.close()
+    assert first.text == second.text == "body of /cached"
+    assert fetcher.stats == {"fetched": 1, "revalidated": 1, "offline_hits": 0}
+
+def test_rejects_zero_rate():
+    with pytest.raises(ValueError):
+        Fetcher(rate=0)
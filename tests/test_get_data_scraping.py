@@ -0,0 +1,135 @@
+import argparse
+import csv
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from fetcher import Fetcher
+from get_data_scraping import (JOURNAL_VERSION, crawl, extract_names_from_html, extract_names_from_wikitext,
+                               iter_names_api, read_existing_rows)
+from html_parsers import available_backends
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "fandom_pages.json")
+
+with open(FIXTURE, encoding="utf-8") as f:
+    PAGES = json.load(f)
+
+@pytest.mark.parametrize("parser", available_backends())
+@pytest.mark.parametrize("page", PAGES, ids=[page["title"] for page in PAGES])
+def test_api_backend_matches_html_backend(page, parser):
+    """同じページの記事HTML (言語表) とウィキテキスト (Other Languages) から同じ行が得られる"""
+    assert extract_names_from_wikitext(page["title"], page["wikitext"]) == \
+        extract_names_from_html(page["html"], parser)
+
+def test_nested_ruby_template_is_expanded():
+    wikitext = next(page["wikitext"] for page in PAGES if page["title"] == "Hoshimi Miyabi")
+    assert extract_names_from_wikitext("Hoshimi Miyabi", wikitext) == ("Hoshimi Miyabi", "星見雅")
+
+def revision(title, content):
+    return {"title": title, "revisions": [{"slots": {"main": {"content": content}}}]}
+
+class RevisionsHandler(BaseHTTPRequestHandler):
+    """
+    prop=revisions の応答の代わり。最初の応答では本文が長すぎたとして一部のページの revisions を省き、
+    continue (rvcontinue) の続きの応答でそれらを返す
+    """
+
+    def do_GET(self):
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(query)
+        if "rvcontinue" not in query:
+            data = {"continue": {"rvcontinue": "2|100", "continue": "||"}, "query": {
+                "normalized": [{"from": "hoshimi Miyabi", "to": "Hoshimi Miyabi"}],
+                "pages": [
+                    revision("Ellen Joe", "{{Other Languages|en=Ellen Joe|ja=エレン・ジョー}}"),
+                    {"title": "Hoshimi Miyabi"},
+                    {"title": "Missing Page", "missing": True},
+                ]}}
+        else:
+            data = {"query": {"pages": [
+                {"title": "Ellen Joe"},
+                revision("Hoshimi Miyabi", "{{Other Languages|en=Hoshimi Miyabi|ja={{Ruby|星見雅|ほしみみやび}}}}"),
+            ]}}
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_api_batch_follows_continue_and_normalized_titles():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RevisionsHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    fetcher = Fetcher(workers=2, rate=1000, burst=10, retries=1, backoff=0.01)
+    try:
+        api_url = f"http://127.0.0.1:{httpd.server_address[1]}/api.php"
+        results = list(iter_names_api(fetcher, api_url, ["Ellen Joe", "hoshimi Miyabi", "Missing Page"]))
+    finally:
+        fetcher.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert results == [
+        ("Ellen Joe", ("Ellen Joe", "エレン・ジョー"), None),
+        ("hoshimi Miyabi", ("Hoshimi Miyabi", "星見雅"), None),
+        ("Missing Page", (None, None), None),
+    ]
+    # 続きの取得は元のパラメータに continue の値を加えて問い合わせる
+    assert len(httpd.requests) == 2
+    assert httpd.requests[1]["titles"] == "Ellen Joe|hoshimi Miyabi|Missing Page"
+    assert httpd.requests[1]["rvcontinue"] == "2|100"
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    """どのパスにも同じ記事のHTMLを返す (別々のページが同じ行になる場合)"""
+
+    def do_GET(self):
+        body = self.server.html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_resume_keeps_repeated_rows_from_other_pages(tmp_path):
+    page = PAGES[0]
+    row = extract_names_from_html(page["html"], "html.parser")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ArticleHandler)
+    httpd.html = page["html"]
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    pages = [f"{base}/wiki/Page_{i}" for i in range(4)]
+
+    # Page_0, Page_1 は記録済み。Page_2 の行は CSV に書き込んだがジャーナルに記録する前に中断した
+    journal_path = tmp_path / "journal.jsonl"
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "plan", "version": JOURNAL_VERSION, "backend": "html", "pages": pages}) + "\n")
+        for url in pages[:2]:
+            f.write(json.dumps({"type": "page", "page": url, "status": "done", "row": list(row)}) + "\n")
+    csv_path = tmp_path / "scraping.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows([["en", "ja"], row, row, row])
+
+    fetcher = Fetcher(workers=2, rate=1000, burst=10, retries=1, backoff=0.01)
+    args = argparse.Namespace(backend="html", restart=False, parser="html.parser")
+    try:
+        crawl(fetcher, {"scraping_base_url": base, "scraping_journal": str(journal_path)}, args, str(csv_path))
+    finally:
+        fetcher.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+    # 中断しなかった場合と同じく、4ページ分の同じ行が残る
+    assert read_existing_rows(str(csv_path)) == [row] * 4
@@ -0,0 +1,36 @@
+import get_data_xml
+
+def write_dump(path, count):
+    """Other Languages テンプレートを含むページ (一部は記事以外の名前空間) を持つダンプを書き出す"""
+    pages = []
+    for i in range(count):
+        ns = 0 if i % 7 else 1
+        text = f"{{{{Other Languages|en=[[Term {i}|Term {i}]]|ja=用語{i}}}}} &lt;b&gt;text&lt;/b&gt;"
+        pages.append(f"<page><title>Page {i}</title><ns>{ns}</ns><id>{i}</id>"
+                     f"<revision><id>{1000 + i}</id><sha1>sha{i}</sha1><text>{text}</text></revision></page>\n")
+    path.write_text('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/">\n<siteinfo/>\n'
+                    + "".join(pages) + "</mediawiki>\n", encoding="utf-8")
+
+def test_sharded_parse_matches_serial(tmp_path, monkeypatch):
+    xml_file = tmp_path / "dump.xml"
+    write_dump(xml_file, 200)
+    # 小さなダンプでも複数のシャードに分かれるようにする
+    monkeypatch.setattr(get_data_xml, "SHARD_TARGET_BYTES", 2048)
+    get_data_xml.set_known_revisions({})
+
+    tasks = get_data_xml.plan_parallel_tasks(str(xml_file), 2)
+    assert len(tasks) > 2
+    serial = get_data_xml.collect_rows(get_data_xml.iter_results_serial(str(xml_file)))
+    parallel = get_data_xml.collect_rows(get_data_xml.iter_results_parallel(tasks, 2))
+
+    assert serial == parallel
+    assert serial[0] == 200 - len(range(0, 200, 7))
+    assert serial[1][0] == {'en': 'Term 1', 'ja': '用語1'}
+
+def test_extract_terms_expands_nested_templates():
+    text = '{{Other Languages|en = Hoshimi Miyabi|ja = {{Ruby|星見雅|ほしみみやび}}}}'
+    assert get_data_xml.extract_terms('Hoshimi Miyabi', text) == [{'en': 'Hoshimi Miyabi', 'ja': '星見雅'}]
+    # 取り除くテンプレートだけの英語はページタイトルにし、日本語だけの場合は抽出しない
+    assert get_data_xml.extract_terms('Proxy', '{{Other Languages|en = {{MC}}|ja = プロキシ}}') == \
+        [{'en': 'Proxy', 'ja': 'プロキシ'}]
+    assert get_data_xml.extract_terms('Proxy', '{{Other Languages|en = Proxy|ja = {{MC}}}}') == []
@@ -0,0 +1,36 @@
+import csv
+
+import pandas as pd
+
+import glossary_io
+
+ROWS = [("Ether", "エーテル"), ("NA", "エヌエー"), ("Blank", ""), ("Bangboo", "ボンプ")]
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["en", "ja"])
+        writer.writerows(rows)
+
+def test_rows_read_back_like_csv(tmp_path):
+    csv_path = str(tmp_path / "glossary.csv")
+    write_csv(csv_path, ROWS)
+    expected = pd.read_csv(csv_path)
+
+    path = glossary_io.write_columnar_rows(ROWS, csv_path, "test", {"note": "x"})
+    assert glossary_io.input_path(csv_path) == path
+    pd.testing.assert_frame_equal(glossary_io.read_glossary(csv_path), expected, check_dtype=False)
+    assert glossary_io.read_metadata(csv_path)["note"] == "x"
+
+def test_content_hash_ignores_metadata(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "glossary.csv")
+    monkeypatch.setattr(glossary_io.time, "strftime", lambda fmt: "2024-01-01T00:00:00")
+    path = glossary_io.write_columnar_rows(ROWS, csv_path, "test")
+    first = glossary_io.content_hash(path)
+
+    monkeypatch.setattr(glossary_io.time, "strftime", lambda fmt: "2025-01-01T00:00:00")
+    glossary_io.write_columnar_rows(ROWS, csv_path, "test", {"backend": "api"})
+    assert glossary_io.content_hash(path) == first
+
+    glossary_io.write_columnar_rows(ROWS[:-1], csv_path, "test")
+    assert glossary_io.content_hash(path) != first
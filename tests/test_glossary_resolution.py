@@ -0,0 +1,19 @@
+import pandas as pd
+
+from glossary_resolution import resolve_conflicts
+
+def candidates(rows):
+    return pd.DataFrame([(*row, i) for i, row in enumerate(rows)],
+                        columns=['en', 'ja', 'source', 'variation', 'order'])
+
+def test_surface_forms_of_same_key_share_chosen_translation():
+    resolved, conflicts = resolve_conflicts(candidates([
+        ("Ｅther", "エーテルA", "xml", False),
+        ("Ether", "エーテル", "detail", False),
+        ("Ether  ", "エーテル", "xml", False),
+        ("Bangboo", "ボンプ", "xml", False),
+    ]), ["detail", "xml"])
+
+    assert resolved.values.tolist() == [["Ether", "エーテル"], ["Ｅther", "エーテル"], ["Bangboo", "ボンプ"]]
+    assert conflicts[['en', 'chosen_ja', 'rejected_ja', 'rejected_source']].values.tolist() == [
+        ["Ether", "エーテル", "エーテルA", "xml"]]
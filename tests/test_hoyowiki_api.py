@@ -0,0 +1,46 @@
+import json
+import os
+
+from hoyowiki_api import fixture_entry_ids, load_fixture, parse_entry_page_json, parse_entry_sections
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "hoyowiki")
+
+def test_parses_mindscapes_and_skill_tabs():
+    records = parse_entry_page_json(load_fixture(FIXTURE_DIR, "909", "en-us"))
+    assert [(r["type"], r["title"]) for r in records] == [
+        ("MindscapeDesc", "Mindscape 1"),
+        ("MindscapeDesc", "Mindscape 2"),
+        ("SkillDesc", "Basic Attack: Saw Teeth Trimming"),
+        ("SkillDesc", "Basic Attack: Whirlwind"),
+        ("SkillDesc", "Core Passive"),
+    ]
+    assert [(r["skill_idx"], r["tab_idx"]) for r in records if r["type"] == "SkillDesc"] == [(0, 0), (0, 1), (1, 0)]
+    assert records[2]["value"] == "Press to deal Ice DMG ."
+    assert "<strong>Ice DMG</strong>" in records[2]["html"]
+
+def test_languages_line_up():
+    jp = parse_entry_page_json(load_fixture(FIXTURE_DIR, "909", "ja-jp"))
+    en = parse_entry_page_json(load_fixture(FIXTURE_DIR, "909", "en-us"))
+    key = lambda r: (r["type"], r.get("skill_idx"), r.get("tab_idx"))
+    assert [key(r) for r in jp] == [key(r) for r in en]
+    assert fixture_entry_ids(FIXTURE_DIR) == ["909"]
+
+def test_attributes_are_not_taken_as_tabs():
+    """倍率の表 (attributes) しかないスキルはスキル自体を1つのタブとする"""
+    payload = load_fixture(FIXTURE_DIR, "909", "en-us")
+    skills = parse_entry_sections(payload)["skills"]
+    assert all(not r["title"].startswith("Lv") for r in skills)
+
+def test_empty_section_is_reported_separately():
+    """スキルのセクションが空なら、心象映画が取れていても skills は空 (そのセクションだけ DOM から取る)"""
+    payload = load_fixture(FIXTURE_DIR, "909", "en-us")
+    for module in payload["data"]["page"]["modules"]:
+        for component in module["components"]:
+            if component["component_id"] == "agent_talent":
+                component["data"] = json.dumps({"list": []})
+    sections = parse_entry_sections(payload)
+    assert len(sections["mindscape"]) == 2
+    assert sections["skills"] == []
+
+def test_error_response_yields_nothing():
+    assert parse_entry_sections({"retcode": -1, "message": "not found", "data": None}) == {"mindscape": [], "skills": []}
@@ -0,0 +1,26 @@
+from term_aligner import align_terms, confirmed_terms, en_markers, term_key
+
+def test_positions_ignore_markup():
+    """英語のタグや属性の長さで位置がずれない"""
+    html = '<p><span style="color:#98EFF0;font-weight:bold">Deals</span> <strong>Ice DMG</strong> now</p>'
+    [(position, term)] = en_markers(html)
+    assert term == "Ice DMG"
+    assert position == len("Deals ") / len("Deals Ice DMG now")
+
+def test_reordered_clauses_are_not_paired_in_order():
+    en = "<p>Deals <strong>Ice DMG</strong> and then, much later in the sentence, applies <strong>Freeze</strong>.</p>"
+    ja = "『凍結』を付与し、その後に長い説明が続いてから『氷属性ダメージ』を与える。"
+    terms, complete = align_terms(en, ja)
+    assert not complete
+    assert {"en": "Freeze", "ja": "氷属性ダメージ"} not in terms
+
+def test_matching_positions_are_complete():
+    terms, complete = align_terms("<p><strong>Daze</strong> builds up, then <strong>Stun</strong>.</p>",
+                                  "『ブレイク値』が溜まって満タンになり『ブレイク』。")
+    assert complete
+    assert terms == [{"en": "Daze", "ja": "ブレイク値"}, {"en": "Stun", "ja": "ブレイク"}]
+
+def test_only_known_terms_are_confirmed():
+    terms = [{"en": "Daze", "ja": "ブレイク値"}, {"en": "Stun", "ja": "ブレイク"}]
+    known = {term_key("daze", "ブレイク値")}
+    assert confirmed_terms(terms, known) == [{"en": "Daze", "ja": "ブレイク値"}]